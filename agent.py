@@ -1,15 +1,24 @@
 # agent.py
 from __future__ import annotations
-import os
 import time
 import base64
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
-import winapi
-from llm_client import post_to_lm
-from agent_utils import parse_coords, parse_text, prune_old_screenshots
+import imaging
+from capture import FramePrefetcher
+from settle import SettleDetector
+from tracing import NULL_SPAN, NULL_TRACER, Tracer
+from session import SessionRecorder, SessionReplay, json_safe
+from response_cache import ResponseCache, CachingClient
+from dumps import DirectorySink, DumpWriter, FrameArchive
+from llm_client import LMClient, EndpointPool, ImageData, dumps_payload
+from inputs import norm_rect_to_screen_px
+from agent_utils import parse_coords, parse_region, parse_text, compact_history, common_prefix_len, region_to_norm, FULL_FRAME_TEXT
 
-def run_agent(system_prompt: str, task_prompt: str, tools_schema: List[Dict[str, Any]], cfg: Dict[str, Any]) -> None:
+BATCH_ACTIONS = ("move_mouse", "click_mouse", "type_text", "scroll_down")
+ZOOM_REGION_TOOL = {"type": "function", "function": {"name": "zoom_region", "description": "Capture a full-resolution crop of a screen rectangle given in normalized coordinates 0..1000 (same system as move_mouse). Use it to read small text or to aim precisely.", "parameters": {"type": "object", "properties": {"x0": {"type": "number"}, "y0": {"type": "number"}, "x1": {"type": "number"}, "y1": {"type": "number"}}, "required": ["x0", "y0", "x1", "y1"]}}}
+
+def run_agent(system_prompt: str, task_prompt: str, tools_schema: List[Dict[str, Any]], cfg: Dict[str, Any]) -> Dict[str, Any]:
     endpoint = cfg["endpoint"]
     model_id = cfg["model_id"]
     timeout = cfg["timeout"]
@@ -24,8 +33,57 @@ def run_agent(system_prompt: str, task_prompt: str, tools_schema: List[Dict[str,
     keep_last_screenshots = cfg["keep_last_screenshots"]
     max_steps = cfg["max_steps"]
     step_delay = cfg["step_delay"]
+    png_preset = cfg.get("png_preset", "default")
+    image_mode = cfg.get("image_mode", "rgb")
+    quantizer = cfg.get("quantizer", "median_cut")
+    frame_delta = cfg.get("frame_delta", False)
+    delta_block = cfg.get("delta_block", 32)
+    dirty_crop = cfg.get("dirty_crop", False)
+    dirty_crop_max_area = cfg.get("dirty_crop_max_area", 0.25)
+    prefetch = cfg.get("prefetch", False)
+    http_retries = cfg.get("http_retries", 2)
+    http_gzip = cfg.get("http_gzip", False)
+    stream = cfg.get("stream", False)
+    stream_early_stop = cfg.get("stream_early_stop", False)
+    incremental_body = cfg.get("incremental_body", False)
+    history_high_watermark = cfg.get("history_high_watermark", 0)
+    measure_prefix = cfg.get("measure_prefix", False)
+    type_chunk = cfg.get("type_chunk", 64)
+    type_pacing = cfg.get("type_pacing", 0.01)
+    batch_actions = cfg.get("batch_actions", False)
+    max_batch_actions = cfg.get("max_batch_actions", 8)
+    batch_screenshot = cfg.get("batch_screenshot", False)
+    settle_enabled = cfg.get("settle", False)
+    settle_probe_w = cfg.get("settle_probe_w", 64)
+    settle_probe_h = cfg.get("settle_probe_h", 36)
+    settle_policies = cfg.get("settle_policies")
+    trace_path = cfg.get("trace_path")
+    record_path = cfg.get("record_path")
+    replay_path = cfg.get("replay_path")
+    action_delay = cfg.get("action_delay", 0.06)
+    response_cache = cfg.get("response_cache")
+    cache_max_entries = cfg.get("cache_max_entries", 512)
+    cache_max_mb = cfg.get("cache_max_mb", 64)
+    cache_tolerance = cfg.get("cache_tolerance", 4)
+    endpoints = cfg.get("endpoints") or ([endpoint] if isinstance(endpoint, str) else list(endpoint))
+    hedge = cfg.get("hedge", False)
+    multires = cfg.get("multires", False)
+    zoom_max_w = cfg.get("zoom_max_w", target_w)
+    zoom_max_h = cfg.get("zoom_max_h", target_h)
+    zoom_min_px = cfg.get("zoom_min_px", 64)
+    dump_archive = cfg.get("dump_archive")
+    dump_delta = cfg.get("dump_delta", False)
+    dump_keyframe_interval = cfg.get("dump_keyframe_interval", 30)
+    dump_queue = cfg.get("dump_queue", 32)
+    dump_policy = cfg.get("dump_policy", "block")
+    if multires:
+        target_w = cfg.get("overview_w", target_w // 2)
+        target_h = cfg.get("overview_h", target_h // 2)
+        if not any(t["function"]["name"] == "zoom_region" for t in tools_schema):
+            tools_schema = tools_schema + [ZOOM_REGION_TOOL]
 
-    os.makedirs(dump_dir, exist_ok=True)
+    if batch_actions and stream and stream_early_stop:
+        raise ValueError("batch_actions cannot be combined with stream_early_stop: the truncated stream keeps only the first tool call")
 
     messages: List[Dict[str, Any]] = [
         {"role": "system", "content": system_prompt},
@@ -33,87 +91,369 @@ def run_agent(system_prompt: str, task_prompt: str, tools_schema: List[Dict[str,
     ]
 
     dump_idx = dump_start
-    last_screen_w, last_screen_h = winapi.get_screen_size()
-
-    for _ in range(max_steps):
-        resp = post_to_lm({
-            "model": model_id,
-            "messages": messages,
-            "tools": tools_schema,
-            "tool_choice": "auto",
-            "temperature": temperature,
-            "max_tokens": max_tokens,
-        }, endpoint, timeout)
-
-        msg = resp["choices"][0]["message"]
-        messages.append(msg)
-
-        tool_calls = msg.get("tool_calls") or []
-        if not tool_calls:
-            break
-
-        if len(tool_calls) > 1:
-            for extra_tc in tool_calls[1:]:
-                messages.append({
-                    "role": "tool",
-                    "tool_call_id": extra_tc["id"],
-                    "name": extra_tc["function"]["name"],
-                    "content": "error: only one tool call per response allowed"
-                })
-            tool_calls = tool_calls[:1]
-
-        for tc in tool_calls:
-            name = tc["function"]["name"]
-            arg_str = tc["function"].get("arguments", "{}")
-            call_id = tc["id"]
-
-            if name == "take_screenshot":
-                png_bytes, screen_w, screen_h = winapi.capture_screenshot_png(target_w, target_h)
-                last_screen_w, last_screen_h = screen_w, screen_h
-
-                fn = None
-                if dump_screenshots:
-                    fn = os.path.join(dump_dir, f"{dump_prefix}{dump_idx:04d}.png")
-                    with open(fn, "wb") as f:
-                        f.write(png_bytes)
-                    dump_idx += 1
-
-                tool_text = "Screenshot image captured."
-                b64 = base64.b64encode(png_bytes).decode("ascii")
-
-                messages.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": tool_text})
-                messages.append({
-                    "role": "user",
-                    "content": [
-                        {"type": "text", "text": "captured image data"},
-                        {"type": "image_url", "image_url": {"url": "data:image/png;base64," + b64}},
-                    ],
-                })
-                messages = prune_old_screenshots(messages, keep_last_screenshots)
-
-            elif name == "move_mouse":
-                xn, yn = parse_coords(arg_str)
-                winapi.move_mouse_norm(xn, yn)
-                time.sleep(0.06)
-                messages.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Mouse device position changed."})
-
-            elif name == "click_mouse":
-                winapi.click_mouse()
-                time.sleep(0.06)
-                messages.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Left mouse button clicked."})
-
-            elif name == "type_text":
-                text = parse_text(arg_str)
-                winapi.type_text(text)
-                time.sleep(0.06)
-                messages.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Keyboard was used to type text."})
-
-            elif name == "scroll_down":
-                winapi.scroll_down()
-                time.sleep(0.06)
-                messages.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Mouse wheel action completed."})
+    replay = SessionReplay(replay_path) if replay_path else None
+    capture = cfg.get("capture_backend") or (replay.capture if replay is not None else None)
+    owns_capture = capture is None
+    inputs = cfg.get("input_backend") or (replay.inputs if replay is not None else None)
+    if owns_capture or inputs is None:
+        import winapi
+    if owns_capture:
+        capture = winapi.CaptureSession()
+    if inputs is None:
+        inputs = winapi.SendInputBackend(type_chunk, type_pacing)
+    settle = None
+    settle_capture = cfg.get("settle_capture")
+    owns_settle_capture = settle_enabled and settle_capture is None and owns_capture
+    if settle_enabled:
+        if settle_capture is None:
+            if owns_capture:
+                settle_capture = winapi.CaptureSession()
+            elif replay is not None and capture is replay.capture:
+                settle_capture = replay.probe
+            else:
+                settle_capture = capture
+        settle = SettleDetector(settle_capture, settle_probe_w, settle_probe_h, settle_policies)
+    recorder = None
+    if record_path:
+        recorder = SessionRecorder(record_path, system_prompt=system_prompt, task_prompt=task_prompt, tools_schema=tools_schema, cfg=json_safe(cfg))
+        capture = recorder.wrap_capture(capture)
+        inputs = recorder.wrap_inputs(inputs)
+    zoom_capture = capture
+    owns_zoom_capture = owns_capture and any(t["function"]["name"] == "zoom_region" for t in tools_schema)
+    if owns_zoom_capture:
+        zoom_capture = winapi.CaptureSession()
+        if recorder is not None:
+            zoom_capture = recorder.wrap_capture(zoom_capture)
+    tracer = cfg.get("tracer")
+    owns_tracer = tracer is None and bool(trace_path)
+    if tracer is None:
+        tracer = Tracer(trace_path, model=model_id, task=task_prompt[:80]) if trace_path else NULL_TRACER
+    if tracer.enabled:
+        capture.tracer = tracer
+        zoom_capture.tracer = tracer
+    last_screen_w, last_screen_h = capture.get_screen_size()
+    last_hashes = None
+    prefetcher = FramePrefetcher() if prefetch else None
+    client = cfg.get("llm_client") or (replay.client if replay is not None else None)
+    owns_client = client is None
+    if owns_client:
+        if len(endpoints) > 1:
+            client = EndpointPool(endpoints, timeout, hedge=hedge, hedge_percentile=cfg.get("hedge_percentile", 90.0), hedge_min_s=cfg.get("hedge_min_s", 0.05), hedge_initial_s=cfg.get("hedge_initial_s", 2.0), ewma_alpha=cfg.get("ewma_alpha", 0.3), breaker_failures=cfg.get("breaker_failures", 3), breaker_cooldown_s=cfg.get("breaker_cooldown_s", 30.0), retries=0, gzip_body=http_gzip, incremental_body=incremental_body)
+        else:
+            client = LMClient(endpoints[0], timeout, retries=http_retries, gzip_body=http_gzip, incremental_body=incremental_body)
+    cache = None
+    if response_cache and replay is None:
+        cache = ResponseCache(response_cache, max_entries=cache_max_entries, max_bytes=int(cache_max_mb * (1 << 20)), tolerance=cache_tolerance)
+        client = CachingClient(client, cache)
+    if recorder is not None:
+        client = recorder.wrap_client(client)
+    steps = 0
+
+    def grab_frame(encode_full: bool = True) -> Dict[str, Any]:
+        frame: Dict[str, Any] = {}
+        if frame_delta:
+            bgra, screen_w, screen_h = capture.capture_bgra(target_w, target_h)
+            frame["bgra"] = bgra
+            with tracer.span("delta_hash"):
+                frame["hashes"] = imaging.block_hashes(bgra, target_w, target_h, delta_block)
+            if encode_full:
+                frame["png"] = capture.encode(bgra, target_w, target_h, png_preset, image_mode, quantizer)
+        else:
+            frame["png"], screen_w, screen_h = capture.capture_png(target_w, target_h, png_preset, image_mode, quantizer)
+        if "png" in frame and not incremental_body:
+            with tracer.span("base64", bytes=len(frame["png"])) if tracer.enabled else NULL_SPAN:
+                frame["b64"] = base64.b64encode(frame["png"]).decode("ascii")
+        frame["screen_w"], frame["screen_h"] = screen_w, screen_h
+        return frame
+
+    def settle_after(action: str) -> None:
+        with tracer.span("sleep", after=action, adaptive=settle is not None) if tracer.enabled else NULL_SPAN:
+            if settle is not None:
+                settle.wait(action)
+            else:
+                time.sleep(action_delay)
+
+    def compact(messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        with tracer.span("history", messages=len(messages)) if tracer.enabled else NULL_SPAN:
+            return compact_history(messages, keep_last_screenshots, history_high_watermark)
+
+    def image_message(png_bytes: bytes, b64: Any, image_text: str) -> Dict[str, Any]:
+        nonlocal dump_idx
+        if dump_writer is not None:
+            with tracer.span("dump", bytes=len(png_bytes)) if tracer.enabled else NULL_SPAN:
+                dump_writer.put(f"{dump_prefix}{dump_idx:04d}.png", png_bytes)
+            dump_idx += 1
+        if incremental_body:
+            image_url = ImageData(png_bytes)
+        else:
+            if b64 is None:
+                with tracer.span("base64", bytes=len(png_bytes)) if tracer.enabled else NULL_SPAN:
+                    b64 = base64.b64encode(png_bytes).decode("ascii")
+            image_url = "data:image/png;base64," + b64
+        return {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": image_text},
+                {"type": "image_url", "image_url": {"url": image_url}},
+            ],
+        }
+
+    def dispatch_tool(tc: Dict[str, Any]) -> List[Dict[str, Any]]:
+        nonlocal last_screen_w, last_screen_h, last_hashes, acted
+        out: List[Dict[str, Any]] = []
+        name = tc["function"]["name"]
+        arg_str = tc["function"].get("arguments", "{}")
+        call_id = tc["id"]
+
+        if name == "take_screenshot":
+            frame = prefetcher.take(lambda: grab_frame(not frame_delta)) if prefetcher is not None else grab_frame(not frame_delta)
+            screen_w, screen_h = frame["screen_w"], frame["screen_h"]
+            last_screen_w, last_screen_h = screen_w, screen_h
+            png_bytes = frame.get("png")
+            b64 = frame.get("b64")
+            image_text = FULL_FRAME_TEXT
+            if frame_delta:
+                bgra = frame["bgra"]
+                hashes = frame["hashes"]
+                dirty = imaging.dirty_rect(last_hashes, hashes, target_w, target_h, delta_block) if last_hashes is not None else (0, 0, target_w, target_h)
+                last_hashes = hashes
+                if dirty is None:
+                    out.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Screen unchanged since previous screenshot."})
+                    return out
+                x0, y0, x1, y1 = dirty
+                if dirty_crop and (x1 - x0) * (y1 - y0) <= dirty_crop_max_area * target_w * target_h:
+                    png_bytes = capture.encode(imaging.crop_bgra(bgra, target_w, target_h, x0, y0, x1, y1), x1 - x0, y1 - y0, png_preset, image_mode, quantizer)
+                    b64 = None
+                    image_text = (FULL_FRAME_TEXT + ": changed region only, x {0}..{2} y {1}..{3} (0..1000)").format(*region_to_norm(x0, y0, x1, y1, target_w, target_h))
+                elif png_bytes is None:
+                    png_bytes = capture.encode(bgra, target_w, target_h, png_preset, image_mode, quantizer)
+
+            out.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Screenshot image captured."})
+            out.append(image_message(png_bytes, b64, image_text))
+
+        elif name == "zoom_region":
+            screen_w, screen_h = capture.get_screen_size()
+            x0n, y0n, x1n, y1n = parse_region(arg_str)
+            x0, y0, x1, y1 = norm_rect_to_screen_px(x0n, y0n, x1n, y1n, screen_w, screen_h, zoom_min_px)
+
+            def zoom() -> Tuple[bytes, int, int]:
+                return zoom_capture.capture_region_png(x0, y0, x1, y1, zoom_max_w, zoom_max_h, png_preset, image_mode, quantizer)
+
+            png_bytes, zw, zh = prefetcher.run(zoom) if prefetcher is not None and zoom_capture is capture else zoom()
+            nx0, ny0, nx1, ny1 = region_to_norm(x0, y0, x1, y1, screen_w, screen_h)
+            out.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Zoomed image captured."})
+            out.append(image_message(png_bytes, None, f"zoomed image of screen region x {nx0}..{nx1} y {ny0}..{ny1} (0..1000), {zw}x{zh} px at {(x1 - x0) / zw:.2f} screen px per image px"))
+
+        elif name == "move_mouse":
+            acted = True
+            if prefetcher is not None:
+                prefetcher.invalidate()
+            xn, yn = parse_coords(arg_str)
+            with tracer.span("action", action="move_mouse") if tracer.enabled else NULL_SPAN:
+                inputs.move_mouse_norm(xn, yn)
+            settle_after("move_mouse")
+            out.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Mouse device position changed."})
 
+        elif name == "click_mouse":
+            acted = True
+            if prefetcher is not None:
+                prefetcher.invalidate()
+            with tracer.span("action", action="click_mouse") if tracer.enabled else NULL_SPAN:
+                inputs.click_mouse()
+            settle_after("click_mouse")
+            out.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Left mouse button clicked."})
+
+        elif name == "type_text":
+            acted = True
+            if prefetcher is not None:
+                prefetcher.invalidate()
+            text = parse_text(arg_str)
+            try:
+                with tracer.span("action", action="type_text", chars=len(text)) if tracer.enabled else NULL_SPAN:
+                    inputs.type_text(text)
+                content = "Keyboard was used to type text."
+            except OSError as e:
+                content = f"error: {e}"
+            settle_after("type_text")
+            out.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": content})
+
+        elif name == "scroll_down":
+            acted = True
+            if prefetcher is not None:
+                prefetcher.invalidate()
+            with tracer.span("action", action="scroll_down") if tracer.enabled else NULL_SPAN:
+                inputs.scroll_down()
+            settle_after("scroll_down")
+            out.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "Mouse wheel action completed."})
+
+        else:
+            out.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "error unknown_tool"})
+        return out
+
+    batch_stats = {"batches": 0, "actions": 0, "stopped_on_error": 0, "skipped": 0, "follow_ups": 0, "auto_screenshots": 0, "round_trips_saved": 0}
+
+    def run_batch(tool_calls: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], bool]:
+        results: List[Dict[str, Any]] = []
+        lines: List[str] = []
+        tail: List[Dict[str, Any]] = []
+        after: List[Dict[str, Any]] = []
+        error = None
+        executed = 0
+        planned = 0
+        follow = None
+        for i, tc in enumerate(tool_calls):
+            name = tc["function"]["name"]
+            content = None
+            if follow is not None:
+                after.append({"role": "tool", "tool_call_id": tc["id"], "name": name, "content": "error: only one tool call per response allowed"})
+                continue
+            if name not in BATCH_ACTIONS:
+                follow = tc
+                continue
+            planned += 1
+            if error is not None:
+                content = "error: skipped after earlier batch error"
+            elif i >= max_batch_actions:
+                content = f"error: batch limit of {max_batch_actions} actions exceeded"
             else:
-                messages.append({"role": "tool", "tool_call_id": call_id, "name": name, "content": "error unknown_tool"})
+                try:
+                    out = early.pop(tc["id"], None) or dispatch_tool(tc)
+                    text = out[0]["content"]
+                except Exception as e:
+                    text = f"error: {e}"
+                if text.startswith("error"):
+                    error = text
+                else:
+                    executed += 1
+                lines.append(f"{i + 1}. {name}: {text}")
+            if content is not None:
+                batch_stats["skipped"] += 1
+            results.append({"role": "tool", "tool_call_id": tc["id"], "name": name, "content": content or "Included in combined batch result."})
+        shot = False
+        if follow is not None and error is None:
+            tail = dispatch_tool(follow)
+            shot = follow["function"]["name"] == "take_screenshot"
+            batch_stats["follow_ups"] += 1
+        elif follow is not None:
+            after.insert(0, {"role": "tool", "tool_call_id": follow["id"], "name": follow["function"]["name"], "content": "error: skipped after earlier batch error"})
+            batch_stats["skipped"] += 1
+        elif error is None and batch_screenshot:
+            auto = dispatch_tool({"id": tool_calls[0]["id"], "type": "function", "function": {"name": "take_screenshot", "arguments": "{}"}})
+            lines.append("Screenshot after batch: " + auto[0]["content"])
+            tail = auto[1:]
+            shot = True
+            batch_stats["auto_screenshots"] += 1
+        header = f"Batch executed {executed} of {planned} actions."
+        if error is not None:
+            header += " Stopped at first error; remaining calls skipped."
+            batch_stats["stopped_on_error"] += 1
+        results[0] = dict(results[0], content="\n".join([header] + lines))
+        batch_stats["batches"] += 1
+        batch_stats["actions"] += executed
+        batch_stats["round_trips_saved"] += max(0, executed + bool(tail) - 1)
+        return results + tail + after, shot
+
+    acted = False
+    last_body = None
+    prefix_stats = {"requests": 0, "common_bytes": 0, "body_bytes": 0}
+    early: Dict[str, List[Dict[str, Any]]] = {}
+    early_s = {"dispatch": 0.0}
+
+    def on_tool_call(tc: Dict[str, Any]) -> None:
+        if not early:
+            t0 = time.perf_counter()
+            early[tc["id"]] = dispatch_tool(tc)
+            early_s["dispatch"] += time.perf_counter() - t0
+
+    dump_writer = None
+    if dump_screenshots:
+        dump_writer = DumpWriter(FrameArchive(dump_archive, delta=dump_delta, keyframe_interval=dump_keyframe_interval) if dump_archive else DirectorySink(dump_dir), dump_queue, dump_policy)
+    try:
+        for _ in range(max_steps):
+            steps += 1
+            if tracer.enabled:
+                tracer.step = steps
+            acted = False
+            early.clear()
+            early_s["dispatch"] = 0.0
+            payload = {
+                "model": model_id,
+                "messages": messages,
+                "tools": tools_schema,
+                "tool_choice": "auto",
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            }
+            if measure_prefix:
+                body = dumps_payload(payload)
+                if last_body is not None:
+                    prefix_stats["requests"] += 1
+                    prefix_stats["common_bytes"] += common_prefix_len(last_body, body)
+                    prefix_stats["body_bytes"] += len(body)
+                last_body = body
+            with tracer.span("llm", stream=stream) as span:
+                if stream:
+                    resp = client.post_stream(payload, on_tool_call, stream_early_stop)
+                else:
+                    resp = client.post(payload)
+                if tracer.enabled:
+                    timing = getattr(client, "last_timing", {})
+                    span.set(bytes=timing.get("bytes_sent", 0), bytes_recv=timing.get("bytes_recv", 0), connect_s=timing.get("connect_s"), ttfb_s=timing.get("ttfb_s"), ttft_s=timing.get("ttft_s"), reused=timing.get("reused"), child_s=early_s["dispatch"], **(resp.get("usage") or {}))
+                    if "parse_s" in timing:
+                        tracer.record("parse", timing["parse_s"], bytes=timing.get("bytes_recv", 0))
+
+            msg = resp["choices"][0]["message"]
+            messages.append(msg)
+
+            tool_calls = msg.get("tool_calls") or []
+            if not tool_calls:
+                break
+
+            if batch_actions and len(tool_calls) > 1 and tool_calls[0]["function"]["name"] in BATCH_ACTIONS:
+                out, shot = run_batch(tool_calls)
+                messages.extend(out)
+                if shot:
+                    messages = compact(messages)
+                tool_calls = []
+
+            if len(tool_calls) > 1:
+                for extra_tc in tool_calls[1:]:
+                    messages.append({
+                        "role": "tool",
+                        "tool_call_id": extra_tc["id"],
+                        "name": extra_tc["function"]["name"],
+                        "content": "error: only one tool call per response allowed"
+                    })
+                tool_calls = tool_calls[:1]
+
+            for tc in tool_calls:
+                messages.extend(early.pop(tc["id"], None) or dispatch_tool(tc))
+                if tc["function"]["name"] == "take_screenshot":
+                    messages = compact(messages)
+
+            if settle is None:
+                with tracer.span("sleep", after="step") if tracer.enabled else NULL_SPAN:
+                    time.sleep(step_delay)
+            if acted and prefetcher is not None:
+                prefetcher.schedule(grab_frame)
+    finally:
+        if prefetcher is not None:
+            prefetcher.close()
+        if owns_capture:
+            capture.close()
+        if owns_settle_capture:
+            settle_capture.close()
+        if owns_zoom_capture:
+            zoom_capture.close()
+        if owns_client:
+            client.close()
+        if owns_tracer:
+            tracer.close()
+        if recorder is not None:
+            recorder.close()
+        if replay is not None:
+            replay.close()
+        if dump_writer is not None:
+            dump_writer.close()
 
-        time.sleep(step_delay)
+    return {"steps": steps, "prefetch": prefetcher.stats() if prefetcher is not None else None, "llm": client.stats(), "prefix": prefix_stats if measure_prefix else None, "batch": batch_stats if batch_actions else None, "settle": settle.stats() if settle is not None else None, "replay": replay.report() if replay is not None else None, "cache": cache.stats() if cache is not None else None, "dump": dump_writer.stats() if dump_writer is not None else None}
@@ -26,6 +26,26 @@ def parse_coords(arg_str: Any) -> Tuple[float, float]:
     y = max(0.0, min(1000.0, y))
     return x, y
 
+def parse_region(arg_str: Any) -> Tuple[float, float, float, float]:
+    try:
+        a = json.loads(arg_str) if isinstance(arg_str, str) else (arg_str or {})
+    except:
+        a = {}
+    if isinstance(a, dict):
+        vals = [a.get("x0", 0), a.get("y0", 0), a.get("x1", 1000), a.get("y1", 1000)]
+    elif isinstance(a, (list, tuple)) and len(a) >= 4:
+        vals = list(a[:4])
+    else:
+        vals = [0, 0, 1000, 1000]
+    out = []
+    for v, default in zip(vals, (0.0, 0.0, 1000.0, 1000.0)):
+        try:
+            v = float(v)
+        except:
+            v = default
+        out.append(max(0.0, min(1000.0, v)))
+    return out[0], out[1], out[2], out[3]
+
 def parse_text(arg_str: Any) -> str:
     try:
         a = json.loads(arg_str) if isinstance(arg_str, str) else (arg_str or {})
@@ -42,3 +62,58 @@ def prune_old_screenshots(messages: List[Dict[str, Any]], keep_last: int) -> Lis
         return messages
     drop = set(idxs[:-keep_last])
     return [m for i, m in enumerate(messages) if i not in drop]
+
+def region_to_norm(x0: int, y0: int, x1: int, y1: int, w: int, h: int) -> Tuple[int, int, int, int]:
+    sx = 1000.0 / max(1, w - 1)
+    sy = 1000.0 / max(1, h - 1)
+    return int(round(x0 * sx)), int(round(y0 * sy)), min(1000, int(round((x1 - 1) * sx))), min(1000, int(round((y1 - 1) * sy)))
+
+FULL_FRAME_TEXT = "captured image data"
+
+def is_image_message(m: Dict[str, Any]) -> bool:
+    return m.get("role") == "user" and isinstance(m.get("content"), list)
+
+def is_full_frame(m: Dict[str, Any]) -> bool:
+    return is_image_message(m) and any(part.get("type") == "text" and part.get("text") == FULL_FRAME_TEXT for part in m["content"])
+
+def compact_history(messages: List[Dict[str, Any]], keep_last: int, high_watermark: int = 0) -> List[Dict[str, Any]]:
+    idxs = [i for i, m in enumerate(messages) if is_image_message(m)]
+    if len(idxs) <= max(keep_last, high_watermark):
+        return messages
+    old = set(idxs[:-keep_last] if keep_last > 0 else idxs)
+    if keep_last > 0:
+        full = [i for i in idxs if is_full_frame(messages[i])]
+        if full:
+            old.discard(full[-1])
+    return [m for i, m in enumerate(messages) if i not in old]
+
+def common_prefix_len(a: bytes, b: bytes, block: int = 4096) -> int:
+    n = min(len(a), len(b))
+    ma, mb = memoryview(a), memoryview(b)
+    i = 0
+    while i < n and ma[i:i + block] == mb[i:i + block]:
+        i += block
+    end = min(n, i + block)
+    while i < end and a[i] == b[i]:
+        i += 1
+    return min(i, n)
+
+def print_table(rows: List[Dict[str, Any]]) -> None:
+    if not rows:
+        return
+    cols = list(rows[0].keys())
+    cells = [[f"{r[c]:.2f}" if isinstance(r[c], float) else str(r[c]) for c in cols] for r in rows]
+    widths = [max(len(c), *(len(row[i]) for row in cells)) for i, c in enumerate(cols)]
+    print("  ".join(c.rjust(wd) for c, wd in zip(cols, widths)))
+    for row in cells:
+        print("  ".join(v.rjust(wd) for v, wd in zip(row, widths)))
+
+def parse_overrides(args: List[str]) -> Dict[str, Any]:
+    out: Dict[str, Any] = {}
+    for arg in args:
+        key, _, value = arg.partition("=")
+        try:
+            out[key] = json.loads(value)
+        except ValueError:
+            out[key] = value
+    return out
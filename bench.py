@@ -0,0 +1,597 @@
+# Run with: python bench.py <benchmark> [repeats]
+# Example: python bench.py bgra 5
+
+# bench.py
+from __future__ import annotations
+import sys
+import json
+import time
+import random
+import base64
+import tracemalloc
+import os
+import shutil
+import tempfile
+import struct
+import zlib
+from typing import Any, Callable, Dict, List, Tuple
+
+import imaging
+from capture import SyntheticCapture, ScriptedCapture
+from settle import SettleDetector
+from scenario import ScenarioCatalog, list_scenarios, load_scenario
+from desktop import SimulatedDesktop
+from tracing import NULL_SPAN, NULL_TRACER, Tracer, percentile
+from llm_client import ImageData, PayloadBuilder, LMClient, EndpointPool
+from mock_llm import ScriptedLLMServer, batched_reply, stall_every, fail_every
+from dumps import DirectorySink, DumpWriter, FrameArchive
+from agent_utils import prune_old_screenshots, compact_history, common_prefix_len, is_full_frame, print_table
+from llm_client import dumps_payload
+from inputs import INPUT, KEYBDINPUT, INPUT_KEYBOARD, KEYEVENTF_UNICODE, KEYEVENTF_KEYUP, RecordingInput, text_to_key_events, norm_to_screen_px, norm_rect_to_screen_px
+
+SIZES = [(64, 48), (320, 200), (1344, 756), (1920, 1080)]
+
+def synthetic_bgra(w: int, h: int, seed: int = 0) -> bytes:
+    rnd = random.Random(seed)
+    buf = bytearray(w * h * 4)
+    row = bytearray(w * 4)
+    for y in range(h):
+        if y % 16 == 0:
+            for x in range(0, w * 4, 4):
+                row[x] = (x // 4 + y) & 0xFF
+                row[x + 1] = (x // 8) & 0xFF
+                row[x + 2] = rnd.randrange(256) if (x // 4) % 97 == 0 else 0xE0
+                row[x + 3] = 0xFF
+        buf[y * w * 4:(y + 1) * w * 4] = row
+    return bytes(buf)
+
+def ref_bgra_to_rgb(bgra: bytes, w: int, h: int) -> bytes:
+    rgb = bytearray(w * h * 3)
+    j = 0
+    for i in range(0, len(bgra), 4):
+        rgb[j] = bgra[i + 2]
+        rgb[j + 1] = bgra[i + 1]
+        rgb[j + 2] = bgra[i]
+        j += 3
+    return bytes(rgb)
+
+def ref_bgra_to_gray(bgra: bytes, w: int, h: int) -> bytes:
+    return bytes((bgra[i + 2] * 77 + bgra[i + 1] * 150 + bgra[i] * 29 + 128) >> 8 for i in range(0, w * h * 4, 4))
+
+def ref_encode_rgb_to_png(rgb: bytes, w: int, h: int) -> bytes:
+    sig = b"\x89PNG\r\n\x1a\n"
+    ihdr = struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)
+    def chunk(t: bytes, d: bytes) -> bytes:
+        return struct.pack(">I", len(d)) + t + d + struct.pack(">I", zlib.crc32(t + d) & 0xFFFFFFFF)
+    row = w * 3
+    stride = row + 1
+    raw = bytearray(stride * h)
+    for y in range(h):
+        base = y * stride
+        raw[base] = 0
+        off = y * row
+        raw[base + 1:base + 1 + row] = rgb[off:off + row]
+    comp = zlib.compress(bytes(raw), 6)
+    return sig + chunk(b"IHDR", ihdr) + chunk(b"IDAT", comp) + chunk(b"IEND", b"")
+
+def png_idat(png: bytes) -> bytes:
+    out = b""
+    pos = 8
+    while pos < len(png):
+        n, t = struct.unpack(">I4s", png[pos:pos + 8])
+        if t == b"IDAT":
+            out += png[pos + 8:pos + 8 + n]
+        pos += 12 + n
+    return out
+
+def timed(fn: Callable[[], Any], repeats: int) -> Tuple[float, Any]:
+    best = float("inf")
+    out = None
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+def bench_bgra(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    for w, h in SIZES:
+        bgra = synthetic_bgra(w, h)
+        t_ref, rgb_ref = timed(lambda: ref_bgra_to_rgb(bgra, w, h), 1)
+        t_new, rgb_new = timed(lambda: imaging.bgra_to_rgb(bgra, w, h), repeats)
+        t_png_ref, png_ref = timed(lambda: ref_encode_rgb_to_png(ref_bgra_to_rgb(bgra, w, h), w, h), 1)
+        t_png_new, png_new = timed(lambda: imaging.encode_bgra_to_png(bgra, w, h), repeats)
+        if rgb_new != rgb_ref:
+            raise AssertionError(f"bgra_to_rgb mismatch at {w}x{h}")
+        if png_new != png_ref:
+            raise AssertionError(f"encode_bgra_to_png mismatch at {w}x{h}")
+        if imaging.bgra_to_gray(bgra, w, h) != ref_bgra_to_gray(bgra, w, h):
+            raise AssertionError(f"bgra_to_gray mismatch at {w}x{h}")
+        rows.append({
+            "size": f"{w}x{h}",
+            "convert_ref_ms": t_ref * 1000.0,
+            "convert_new_ms": t_new * 1000.0,
+            "png_ref_ms": t_png_ref * 1000.0,
+            "png_new_ms": t_png_new * 1000.0,
+            "identical": True,
+        })
+    return rows
+
+def bench_png(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    for w, h in SIZES:
+        bgra = synthetic_bgra(w, h)
+        rgb = imaging.bgra_to_rgb(bgra, w, h)
+        t_ref, png_ref = timed(lambda: ref_encode_rgb_to_png(rgb, w, h), repeats)
+        for preset in imaging.PNG_PRESETS:
+            t_new, png_new = timed(lambda: imaging.encode_rgb_to_png(rgb, w, h, preset), repeats)
+            if len(zlib.decompress(png_idat(png_new))) != (w * 3 + 1) * h:
+                raise AssertionError(f"invalid IDAT stream for preset {preset} at {w}x{h}")
+            rows.append({
+                "size": f"{w}x{h}",
+                "preset": preset,
+                "ref_ms": t_ref * 1000.0,
+                "new_ms": t_new * 1000.0,
+                "ref_bytes": len(png_ref),
+                "new_bytes": len(png_new),
+                "ratio": len(png_new) / float(len(png_ref)),
+            })
+    return rows
+
+def bench_modes(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    for w, h in SIZES:
+        bgra = synthetic_bgra(w, h)
+        for mode in imaging.IMAGE_MODES:
+            for quantizer in ("median_cut", "fixed") if mode.startswith("palette") else ("-",):
+                t, png = timed(lambda: imaging.encode_bgra_to_png(bgra, w, h, "default", mode, quantizer), repeats)
+                rows.append({
+                    "size": f"{w}x{h}",
+                    "mode": mode,
+                    "quantizer": quantizer,
+                    "encode_ms": t * 1000.0,
+                    "png_bytes": len(png),
+                    "b64_bytes": (len(png) + 2) // 3 * 4,
+                })
+    return rows
+
+def bench_capture(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    for (sw, sh), (tw, th) in [((1344, 756), (1344, 756)), ((1920, 1080), (1344, 756)), ((2560, 1440), (1344, 756))]:
+        with SyntheticCapture(sw, sh) as cap:
+            cap.frame[:] = synthetic_bgra(sw, sh)
+            t_grab, _ = timed(lambda: cap.grab(tw, th), repeats)
+            t_png, (png, _, _) = timed(lambda: cap.capture_png(tw, th), repeats)
+            t_old, _ = timed(lambda: ref_encode_rgb_to_png(ref_bgra_to_rgb(cap.capture_bgra(tw, th)[0], tw, th), tw, th), 1)
+            rows.append({
+                "screen": f"{sw}x{sh}",
+                "target": f"{tw}x{th}",
+                "grab_ms": t_grab * 1000.0,
+                "pipeline_ms": t_png * 1000.0,
+                "old_pipeline_ms": t_old * 1000.0,
+                "png_bytes": len(png),
+            })
+    return rows
+
+def zoom_mapping_errors(cap: SyntheticCapture, points: int, seed: int = 0) -> int:
+    rng = random.Random(seed)
+    sw, sh = cap.get_screen_size()
+    errors = 0
+    for _ in range(points):
+        x0n, y0n = rng.uniform(0, 900), rng.uniform(0, 900)
+        x1n, y1n = x0n + rng.uniform(5, 100), y0n + rng.uniform(5, 100)
+        xn, yn = rng.uniform(x0n, x1n), rng.uniform(y0n, y1n)
+        px, py = norm_to_screen_px(xn, yn, sw, sh)
+        x0, y0, x1, y1 = norm_rect_to_screen_px(x0n, y0n, x1n, y1n, sw, sh)
+        saved = cap.frame[(py * sw + px) * 4:(py * sw + px) * 4 + 4]
+        cap.fill_rect(px, py, px + 1, py + 1, (1, 2, 3))
+        view, _, _ = cap.grab_region(x0, y0, x1, y1, x1 - x0, y1 - y0)
+        cap.frame[(py * sw + px) * 4:(py * sw + px) * 4 + 4] = saved
+        at = bytes(view).find(bytes((3, 2, 1, 0xFF)))
+        if at < 0 or at % 4 or (x0 + (at // 4) % (x1 - x0), y0 + (at // 4) // (x1 - x0)) != (px, py):
+            errors += 1
+    return errors
+
+def bench_zoom(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    for sw, sh in [(1920, 1080), (2560, 1440)]:
+        with SyntheticCapture(sw, sh) as cap:
+            cap.frame[:] = synthetic_bgra(sw, sh)
+            x0, y0, x1, y1 = norm_rect_to_screen_px(400, 400, 600, 600, sw, sh)
+            cases = [
+                ("full", f"{1344}x{756}", lambda: cap.capture_png(1344, 756)[0], sw / 1344.0),
+                ("overview", f"{672}x{378}", lambda: cap.capture_png(672, 378)[0], sw / 672.0),
+                ("zoom 200x200", f"{x1 - x0}x{y1 - y0}", lambda: cap.capture_region_png(x0, y0, x1, y1, 1344, 756)[0], 1.0),
+            ]
+            for mode, size, fn, ratio in cases:
+                t, png = timed(fn, repeats)
+                rows.append({"screen": f"{sw}x{sh}", "mode": mode, "image": size, "png_bytes": len(png), "ms": t * 1000.0, "screen_px_per_px": ratio, "errors": "-"})
+            rows.append({"screen": f"{sw}x{sh}", "mode": "mapping check", "image": "-", "png_bytes": 0, "ms": 0.0, "screen_px_per_px": 0.0, "errors": zoom_mapping_errors(cap, 50 * repeats)})
+    return rows
+
+def bench_dumps(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    n = 20 * repeats
+    with SyntheticCapture(1344, 756) as cap:
+        frames = []
+        for i in range(n):
+            cap.fill_rect(40 + i * 8, 40, 48 + i * 8, 60, (0xFF, 0xFF, 0xFF))
+            frames.append(cap.capture_png(1344, 756, "fast")[0])
+    tmp = tempfile.mkdtemp()
+    try:
+        def sync_write() -> None:
+            for i, png in enumerate(frames):
+                with open(os.path.join(tmp, f"sync_{i:04d}.png"), "wb") as f:
+                    f.write(png)
+
+        t0 = time.perf_counter()
+        sync_write()
+        rows.append({"mode": "sync files", "frames": n, "loop_ms": (time.perf_counter() - t0) * 1000.0, "total_ms": (time.perf_counter() - t0) * 1000.0, "bytes": sum(map(len, frames)), "dropped": 0})
+        sinks = [
+            ("writer files", lambda: DirectorySink(os.path.join(tmp, "files"))),
+            ("writer archive", lambda: FrameArchive(os.path.join(tmp, "run.frames"))),
+            ("writer archive+delta", lambda: FrameArchive(os.path.join(tmp, "delta.frames"), delta=True)),
+        ]
+        for label, make in sinks:
+            writer = DumpWriter(make(), 32, "block")
+            t0 = time.perf_counter()
+            for i, png in enumerate(frames):
+                writer.put(f"screen_{i:04d}.png", png)
+            loop = time.perf_counter() - t0
+            writer.close()
+            total = time.perf_counter() - t0
+            path = getattr(writer.sink, "path", "")
+            size = os.path.getsize(path) if os.path.isfile(path) else writer.stats()["bytes"]
+            rows.append({"mode": label, "frames": n, "loop_ms": loop * 1000.0, "total_ms": total * 1000.0, "bytes": size, "dropped": writer.dropped})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return rows
+
+def _history_step(i: int, image: Any, text: str = "captured image data") -> List[Dict[str, Any]]:
+    call = {"id": f"call_{i}", "type": "function", "function": {"name": "take_screenshot", "arguments": "{}"}}
+    return [
+        {"role": "assistant", "content": "Observing the screen. " * 8, "tool_calls": [call]},
+        {"role": "tool", "tool_call_id": call["id"], "name": "take_screenshot", "content": "Screenshot image captured."},
+        {"role": "user", "content": [{"type": "text", "text": text}, {"type": "image_url", "image_url": {"url": image}}]},
+    ]
+
+def bench_payload(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    w, h = 1344, 756
+    png = imaging.encode_bgra_to_png(synthetic_bgra(w, h), w, h)
+    tools = [{"type": "function", "function": {"name": f"tool_{i}", "description": "x" * 80, "parameters": {"type": "object", "properties": {}}}} for i in range(5)]
+    for mode in ("json", "incremental"):
+        builder = PayloadBuilder()
+        messages: List[Dict[str, Any]] = [{"role": "system", "content": "system prompt " * 40}, {"role": "user", "content": "task"}]
+        total_s = 0.0
+        peak = 0
+        steps = 30
+        for i in range(steps):
+            tracemalloc.start()
+            t0 = time.perf_counter()
+            if mode == "json":
+                image: Any = "data:image/png;base64," + base64.b64encode(png).decode("ascii")
+            else:
+                image = ImageData(png)
+            messages = prune_old_screenshots(messages + _history_step(i, image), 1)
+            payload = {"model": "m", "messages": messages, "tools": tools, "tool_choice": "auto", "temperature": 0.2, "max_tokens": 2048}
+            if mode == "json":
+                sent = len(json.dumps(payload).encode("utf-8"))
+                chunks = 1
+            else:
+                body = builder.build(payload)
+                sent = sum(len(chunk) for chunk in body)
+                chunks = len(body.parts)
+            total_s += time.perf_counter() - t0
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        rows.append({"mode": mode, "steps": steps, "ms_per_step": total_s * 1000.0 / steps, "peak_kb": peak / 1024.0, "body_bytes": sent, "parts": chunks})
+    return rows
+
+def bench_prefix(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    rnd = random.Random(1)
+    policies = [("prune", 1, 0), ("watermark", 1, 4), ("watermark8", 1, 8)]
+    for label, keep, high in policies:
+        messages: List[Dict[str, Any]] = [{"role": "system", "content": "system prompt " * 40}, {"role": "user", "content": "task"}]
+        last = None
+        common = 0
+        total = 0
+        steps = 30
+        for i in range(steps):
+            image = "data:image/png;base64," + base64.b64encode(bytes(rnd.randrange(256) for _ in range(30000))).decode("ascii")
+            text = "captured image data" if i % 3 == 0 else "captured image data: changed region only, x 0..100 y 0..100 (0..1000)"
+            messages = compact_history(messages + _history_step(i, image, text), keep, high)
+            if not any(is_full_frame(m) for m in messages):
+                raise AssertionError(f"compact_history dropped the last full frame at step {i} ({label})")
+            body = dumps_payload({"model": "m", "messages": messages})
+            if last is not None:
+                common += common_prefix_len(last, body)
+                total += len(body)
+            last = body
+        rows.append({"policy": label, "keep": keep, "high_watermark": high, "prefix_reuse": common / float(total), "avg_body_kb": total / 1024.0 / (steps - 1)})
+    return rows
+
+def ref_type_arrays(text: str) -> List[Any]:
+    arrays = []
+    for ch in text:
+        code = ord(ch)
+        down = INPUT()
+        down.type = INPUT_KEYBOARD
+        down.ii.ki = KEYBDINPUT(0, code, KEYEVENTF_UNICODE, 0, 0)
+        up = INPUT()
+        up.type = INPUT_KEYBOARD
+        up.ii.ki = KEYBDINPUT(0, code, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP, 0, 0)
+        arrays.append((INPUT * 2)(down, up))
+    return arrays
+
+def bench_typing(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    samples = [("ascii_200", "The quick brown fox jumps over the lazy dog. " * 4 + "12345678901234567890"), ("multiline", "line one\r\nline two\n\tindented\n" * 8), ("emoji", "ok \U0001F600 \u00e9t\u00e9 \U0001F44D " * 12)]
+    for label, text in samples:
+        t_ref, _ = timed(lambda: ref_type_arrays(text), repeats)
+        backend = RecordingInput(build_arrays=True)
+        t_new, _ = timed(lambda: backend.type_text(text), repeats)
+        backend.log.clear()
+        backend.type_text(text)
+        if backend.typed_text() != text.replace("\r\n", "\n"):
+            raise AssertionError(f"typed text mismatch for {label}")
+        calls = sum(1 for entry in backend.log if entry[0] == "keys")
+        pauses = sum(entry[1] for entry in backend.log if entry[0] == "pause")
+        rows.append({
+            "text": label,
+            "chars": len(text),
+            "events": len(text_to_key_events(text)),
+            "ref_calls": len(text),
+            "new_calls": calls,
+            "ref_build_ms": t_ref * 1000.0,
+            "new_build_ms": t_new * 1000.0,
+            "ref_wall_ms": (t_ref + 0.005 * len(text)) * 1000.0,
+            "new_wall_ms": (t_new + pauses) * 1000.0,
+        })
+    return rows
+
+class VirtualClock:
+    def __init__(self) -> None:
+        self.t = 0.0
+
+    def __call__(self) -> float:
+        return self.t
+
+    def sleep(self, seconds: float) -> None:
+        self.t += seconds
+
+def _settle_scripts() -> List[Tuple[str, str, List[Tuple[float, Callable[[SyntheticCapture], None]]]]]:
+    def box(x: int, color: Tuple[int, int, int]) -> Callable[[SyntheticCapture], None]:
+        return lambda cap: cap.fill_rect(x, 200, x + 200, 400, color)
+    return [
+        ("cursor_move", "move_mouse", [(0.0, box(100, (255, 255, 255)))]),
+        ("menu_open", "click_mouse", [(0.03, box(300, (200, 200, 200)))]),
+        ("animation", "click_mouse", [(i * 0.02, box(100 + i * 40, (40 + i * 10, 80, 200))) for i in range(15)]),
+        ("slow_launch", "click_mouse", [(0.05, box(600, (90, 90, 90)))] + [(0.1 * i, box(600 + i * 40, (0, 120, 215))) for i in range(1, 15)] + [(1.5, box(900, (240, 240, 240)))]),
+        ("typing", "type_text", [(i * 0.01, box(400 + i * 8, (0, 0, 0))) for i in range(10)]),
+        ("no_change", "scroll_down", []),
+    ]
+
+def bench_settle(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    fixed_s = 0.06 + 0.4
+    t_probe, _ = timed(SettleDetector(SyntheticCapture(1920, 1080)).probe, repeats)
+    for label, action, script in _settle_scripts():
+        clock = VirtualClock()
+        cap = ScriptedCapture(1920, 1080, clock=clock)
+        detector = SettleDetector(cap, clock=clock, sleep=clock.sleep)
+        cap.play(script)
+        took = detector.wait(action)
+        last_change = max((t for t, _ in script), default=0.0)
+        st = detector.stats()[action]
+        rows.append({
+            "script": label,
+            "action": action,
+            "last_change_s": last_change,
+            "fixed_s": fixed_s,
+            "fixed_ok": last_change <= fixed_s,
+            "settle_s": took,
+            "settle_ok": last_change <= took,
+            "samples": st["samples"],
+            "timeouts": st["timeouts"],
+            "probe_ms": t_probe * 1000.0,
+        })
+    return rows
+
+def ref_load_scenario(filename: str, scenario_num: int) -> Tuple[str, str, List[Dict[str, Any]]]:
+    with open(filename, "r", encoding="utf-8") as f:
+        content = f.read()
+    shared = content.split("=== SHARED_SYSTEM_PROMPT ===", 1)[1].split("=== SCENARIO", 1)[0].strip()
+    task_prompt = ""
+    tools_schema: List[Dict[str, Any]] = []
+    for line in content.split("=== SCENARIO ")[scenario_num].strip().split("\n"):
+        stripped = line.strip()
+        if stripped.startswith("TASK_PROMPT:"):
+            task_prompt = stripped[len("TASK_PROMPT:"):].strip()
+        elif stripped.startswith("TOOLS_SCHEMA:"):
+            tools_schema = json.loads(stripped[len("TOOLS_SCHEMA:"):].strip())
+    return shared, task_prompt, tools_schema
+
+def bench_catalog(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    with open("test_scenarios.txt", "r", encoding="utf-8") as f:
+        content = f.read()
+    head, first = content.split("=== SCENARIO ")[:2]
+    block = first.split("\n", 1)[1]
+    for count in (10, 100, 500):
+        fd, path = tempfile.mkstemp(suffix=".txt")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(head + "".join(f"=== SCENARIO {i} ===\n" + block.replace("NAME: ", f"NAME: #{i} ", 1) for i in range(1, count + 1)))
+        try:
+            for mode in ("ref", "catalog"):
+                tracemalloc.start()
+                t0 = time.perf_counter()
+                if mode == "ref":
+                    loaded = [ref_load_scenario(path, i) for i in range(1, count + 1)]
+                else:
+                    catalog = ScenarioCatalog(path)
+                    loaded = [catalog.load(i) for i in range(1, count + 1)]
+                took = time.perf_counter() - t0
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                rows.append({
+                    "scenarios": count,
+                    "mode": mode,
+                    "load_all_ms": took * 1000.0,
+                    "peak_kb": peak / 1024.0,
+                    "schema_objects": len({id(s[2]) for s in loaded}),
+                })
+                del loaded
+        finally:
+            os.remove(path)
+    return rows
+
+def bench_tracing(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    n = 100000
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    try:
+        tracer = Tracer(path)
+        for label, tr, guarded in (("disabled", NULL_TRACER, False), ("disabled+guard", NULL_TRACER, True), ("enabled", tracer, True)):
+            def spans() -> None:
+                if guarded:
+                    for _ in range(n):
+                        with tr.span("phase", bytes=1) if tr.enabled else NULL_SPAN:
+                            pass
+                else:
+                    for _ in range(n):
+                        with tr.span("phase", bytes=1):
+                            pass
+            t, _ = timed(spans, repeats)
+            rows.append({"tracer": label, "spans": n, "ns_per_span": t * 1e9 / n})
+        tracer.close()
+    finally:
+        os.remove(path)
+    return rows
+
+def bench_pool(repeats: int) -> List[Dict[str, Any]]:
+    rows = []
+    n = 30 * repeats
+    payload = {"model": "bench", "messages": [{"role": "user", "content": "Move the mouse to the center"}], "tools": [{"type": "function", "function": {"name": "move_mouse"}}]}
+    servers = [
+        ScriptedLLMServer(latency_s=0.02, delay=stall_every(5, 0.5), fault=fail_every(7)).start(),
+        ScriptedLLMServer(latency_s=0.03).start(),
+        ScriptedLLMServer(latency_s=0.04).start(),
+    ]
+    endpoints = [server.endpoint for server in servers]
+    try:
+        configs = [
+            ("single", lambda: LMClient(endpoints[0], 10, retries=2, backoff=0.01)),
+            ("pool", lambda: EndpointPool(endpoints, 10, retries=0)),
+            ("pool+hedge", lambda: EndpointPool(endpoints, 10, hedge=True, hedge_initial_s=0.1, retries=0)),
+        ]
+        for label, make in configs:
+            client = make()
+            lat = []
+            errors = 0
+            t0 = time.perf_counter()
+            for _ in range(n):
+                t = time.perf_counter()
+                try:
+                    client.post(payload)
+                except Exception:
+                    errors += 1
+                lat.append(time.perf_counter() - t)
+            wall = time.perf_counter() - t0
+            lat.sort()
+            stats = client.stats()
+            client.close()
+            rows.append({"client": label, "requests": n, "errors": errors, "wall_s": wall, "p50_ms": percentile(lat, 50) * 1000, "p90_ms": percentile(lat, 90) * 1000, "p99_ms": percentile(lat, 99) * 1000, "hedges": stats.get("hedges", 0), "failovers": stats.get("failovers", 0)})
+    finally:
+        for server in servers:
+            server.close()
+    return rows
+
+def bench_batch(repeats: int) -> List[Dict[str, Any]]:
+    from agent import run_agent
+    from main import default_cfg
+    rows = []
+    typed: Dict[str, List[str]] = {}
+    scenarios = list_scenarios("test_scenarios.txt")
+    for label, batch_calls in (("single", 1), ("batched", 4)):
+        with ScriptedLLMServer(latency_s=0.02, policy=batched_reply(batch_calls)) as server:
+            steps = saved = 0
+            t0 = time.perf_counter()
+            for num, _ in scenarios:
+                system_prompt, task_prompt, tools_schema = load_scenario("test_scenarios.txt", num)
+                cfg = default_cfg()
+                cfg.update({"endpoint": server.endpoint, "dump_screenshots": False, "dump_dir": tempfile.gettempdir(), "step_delay": 0.0, "batch_actions": batch_calls > 1})
+                desk = SimulatedDesktop(1920, 1080)
+                cfg["capture_backend"] = desk
+                cfg["input_backend"] = desk
+                result = run_agent(system_prompt, task_prompt, tools_schema, cfg)
+                steps += result["steps"]
+                saved += (result["batch"] or {}).get("round_trips_saved", 0)
+                typed.setdefault(label, []).append(desk.typed_text())
+            wall = time.perf_counter() - t0
+            rows.append({"mode": label, "scenarios": len(scenarios), "steps": steps, "requests": server.requests, "bytes_recv": server.bytes_recv, "round_trips_saved": saved, "wall_s": wall})
+    if rows[1]["round_trips_saved"] <= 0 or rows[1]["requests"] >= rows[0]["requests"]:
+        raise AssertionError("batched replies saved no LLM round trips")
+    if typed["batched"] != typed["single"]:
+        raise AssertionError("batched run typed different text")
+    return rows
+
+def bench_session(repeats: int) -> List[Dict[str, Any]]:
+    from agent import run_agent
+    from main import default_cfg
+    from session import SessionArchive, replay_session
+    rows = []
+    tmp = tempfile.mkdtemp(prefix="bench_session_")
+    try:
+        with ScriptedLLMServer() as server:
+            for num, _ in list_scenarios("test_scenarios.txt"):
+                system_prompt, task_prompt, tools_schema = load_scenario("test_scenarios.txt", num)
+                path = os.path.join(tmp, f"s{num}.zip")
+                cfg = default_cfg()
+                cfg.update({"endpoint": server.endpoint, "dump_screenshots": False, "dump_dir": tmp, "step_delay": 0.0, "multires": True, "record_path": path})
+                desk = SimulatedDesktop(1920, 1080)
+                cfg["capture_backend"] = desk
+                cfg["input_backend"] = desk
+                run_agent(system_prompt, task_prompt, tools_schema, cfg)
+                archive = SessionArchive(path)
+                frames = archive.of_type("frame")
+                archive.close()
+                report = replay_session(path, {})["replay"]
+                rows.append({"scenario": num, "frames": len(frames), "zoom_frames": sum(1 for fr in frames if "region" in fr), "archive_kb": os.path.getsize(path) / 1024.0, "identical": report["identical"]})
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    if not all(r["identical"] for r in rows):
+        raise AssertionError("replay diverged from the recorded session")
+    if not any(r["zoom_frames"] for r in rows):
+        raise AssertionError("no zoom_region step was recorded")
+    return rows
+
+BENCHMARKS: Dict[str, Callable[[int], List[Dict[str, Any]]]] = {
+    "bgra": bench_bgra,
+    "png": bench_png,
+    "modes": bench_modes,
+    "capture": bench_capture,
+    "payload": bench_payload,
+    "prefix": bench_prefix,
+    "typing": bench_typing,
+    "settle": bench_settle,
+    "catalog": bench_catalog,
+    "tracing": bench_tracing,
+    "pool": bench_pool,
+    "zoom": bench_zoom,
+    "dumps": bench_dumps,
+    "batch": bench_batch,
+    "session": bench_session,
+}
+
+def main() -> None:
+    if len(sys.argv) < 2 or sys.argv[1] not in BENCHMARKS:
+        sys.exit("Usage: python bench.py <" + "|".join(BENCHMARKS) + "> [repeats]")
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+    print(f"numpy: {'yes' if imaging.np is not None else 'no'}")
+    print_table(BENCHMARKS[sys.argv[1]](repeats))
+
+if __name__ == "__main__":
+    main()
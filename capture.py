@@ -0,0 +1,165 @@
+# capture.py
+from __future__ import annotations
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from imaging import convert_bgra, crop_bgra, encode_scanlines_to_png, fit_size, resize_bgra
+from tracing import NULL_SPAN, NULL_TRACER
+
+def region_of(view: Any, screen_w: int, screen_h: int, x0: int, y0: int, x1: int, y1: int, target_w: int, target_h: int) -> memoryview:
+    x0, y0 = min(x0, screen_w - 1), min(y0, screen_h - 1)
+    x1, y1 = max(x0 + 1, min(x1, screen_w)), max(y0 + 1, min(y1, screen_h))
+    crop = crop_bgra(view, screen_w, screen_h, x0, y0, x1, y1)
+    return memoryview(resize_bgra(crop, x1 - x0, y1 - y0, target_w, target_h))
+
+class CaptureBackend:
+    _scanlines: Optional[bytearray] = None
+    tracer: Any = NULL_TRACER
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def grab(self, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        raise NotImplementedError
+
+    def grab_region(self, x0: int, y0: int, x1: int, y1: int, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        screen_w, screen_h = self.get_screen_size()
+        view, screen_w, screen_h = self.grab(screen_w, screen_h)
+        return region_of(view, screen_w, screen_h, x0, y0, x1, y1, target_w, target_h), screen_w, screen_h
+
+    def close(self) -> None:
+        pass
+
+    def capture_bgra(self, target_w: int, target_h: int) -> Tuple[bytes, int, int]:
+        with self.tracer.span("capture", w=target_w, h=target_h) if self.tracer.enabled else NULL_SPAN:
+            bgra, screen_w, screen_h = self.grab(target_w, target_h)
+            return bytes(bgra), screen_w, screen_h
+
+    def encode(self, bgra: Any, w: int, h: int, png_preset: Any = "default", image_mode: str = "rgb", quantizer: str = "median_cut", out: Optional[bytearray] = None) -> bytes:
+        with self.tracer.span("convert", mode=image_mode) if self.tracer.enabled else NULL_SPAN:
+            raw, color_type, bit_depth, palette = convert_bgra(bgra, w, h, image_mode, quantizer, out)
+        with self.tracer.span("png_encode") as span:
+            png = encode_scanlines_to_png(raw, w, h, png_preset, color_type, bit_depth, palette)
+            span.set(bytes=len(png))
+        return png
+
+    def capture_png(self, target_w: int, target_h: int, png_preset: Any = "default", image_mode: str = "rgb", quantizer: str = "median_cut") -> Tuple[bytes, int, int]:
+        with self.tracer.span("capture", w=target_w, h=target_h) if self.tracer.enabled else NULL_SPAN:
+            bgra, screen_w, screen_h = self.grab(target_w, target_h)
+        scanlines = self._scanlines
+        if scanlines is None or len(scanlines) != (target_w * 3 + 1) * target_h:
+            scanlines = self._scanlines = bytearray((target_w * 3 + 1) * target_h)
+        return self.encode(bgra, target_w, target_h, png_preset, image_mode, quantizer, scanlines), screen_w, screen_h
+
+    def capture_region_png(self, x0: int, y0: int, x1: int, y1: int, max_w: int, max_h: int, png_preset: Any = "default", image_mode: str = "rgb", quantizer: str = "median_cut") -> Tuple[bytes, int, int]:
+        tw, th = fit_size(x1 - x0, y1 - y0, max_w, max_h)
+        with self.tracer.span("capture", w=tw, h=th, zoom=True) if self.tracer.enabled else NULL_SPAN:
+            bgra, _, _ = self.grab_region(x0, y0, x1, y1, tw, th)
+        return self.encode(bgra, tw, th, png_preset, image_mode, quantizer), tw, th
+
+    def __enter__(self) -> "CaptureBackend":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+class SyntheticCapture(CaptureBackend):
+    def __init__(self, screen_w: int = 1920, screen_h: int = 1080, color: Tuple[int, int, int] = (0x30, 0x30, 0x30)) -> None:
+        self.screen_w = screen_w
+        self.screen_h = screen_h
+        self.frame = bytearray(bytes((color[2], color[1], color[0], 0xFF)) * (screen_w * screen_h))
+        self.grabs = 0
+        self._out: Optional[bytearray] = None
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.screen_w, self.screen_h
+
+    def set_screen_size(self, screen_w: int, screen_h: int, color: Tuple[int, int, int] = (0x30, 0x30, 0x30)) -> None:
+        SyntheticCapture.__init__(self, screen_w, screen_h, color)
+
+    def fill_rect(self, x0: int, y0: int, x1: int, y1: int, color: Tuple[int, int, int]) -> None:
+        x0, x1 = max(0, x0), min(self.screen_w, x1)
+        y0, y1 = max(0, y0), min(self.screen_h, y1)
+        if x1 <= x0 or y1 <= y0:
+            return
+        run = bytes((color[2], color[1], color[0], 0xFF)) * (x1 - x0)
+        for y in range(y0, y1):
+            off = (y * self.screen_w + x0) * 4
+            self.frame[off:off + len(run)] = run
+
+    def grab(self, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        self.grabs += 1
+        out = resize_bgra(self.frame, self.screen_w, self.screen_h, target_w, target_h, self._out)
+        if not isinstance(out, memoryview):
+            self._out = out
+        return memoryview(out), self.screen_w, self.screen_h
+
+class ScriptedCapture(SyntheticCapture):
+    def __init__(self, screen_w: int = 1920, screen_h: int = 1080, color: Tuple[int, int, int] = (0x30, 0x30, 0x30), clock: Callable[[], float] = time.perf_counter) -> None:
+        super().__init__(screen_w, screen_h, color)
+        self.clock = clock
+        self._script: List[Tuple[float, Callable[[SyntheticCapture], None]]] = []
+        self._t0 = 0.0
+
+    def play(self, script: List[Tuple[float, Callable[[SyntheticCapture], None]]]) -> None:
+        self._script = sorted(script, key=lambda ev: ev[0])
+        self._t0 = self.clock()
+
+    def grab(self, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        now = self.clock() - self._t0
+        while self._script and self._script[0][0] <= now:
+            self._script.pop(0)[1](self)
+        return super().grab(target_w, target_h)
+
+class FramePrefetcher:
+    def __init__(self) -> None:
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._pending: Optional[Tuple[int, Future]] = None
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.saved_s = 0.0
+
+    def _run(self, produce: Callable[[], Any]) -> Tuple[Any, float]:
+        with self._lock:
+            t0 = time.perf_counter()
+            return produce(), time.perf_counter() - t0
+
+    def run(self, produce: Callable[[], Any]) -> Any:
+        return self._run(produce)[0]
+
+    def schedule(self, produce: Callable[[], Any]) -> None:
+        self.invalidate()
+        self._pending = (self._generation, self._pool.submit(self._run, produce))
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        if self._pending is not None:
+            self.discarded += 1
+            self._pending = None
+
+    def take(self, produce: Callable[[], Any]) -> Any:
+        pending, self._pending = self._pending, None
+        if pending is not None and pending[0] == self._generation:
+            t0 = time.perf_counter()
+            try:
+                out, took = pending[1].result()
+            except Exception:
+                pass
+            else:
+                self.hits += 1
+                self.saved_s += max(0.0, took - (time.perf_counter() - t0))
+                return out
+        self.misses += 1
+        return self._run(produce)[0]
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "discarded": self.discarded, "saved_s": self.saved_s}
+
+    def close(self) -> None:
+        self.invalidate()
+        self._pool.shutdown(wait=True)
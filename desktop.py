@@ -0,0 +1,138 @@
+# desktop.py
+from __future__ import annotations
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from capture import SyntheticCapture
+from inputs import InputBackend, KeyEvent, key_events_to_text, norm_to_screen_px
+
+BACKGROUND = (0x1F, 0x4E, 0x79)
+TASKBAR = (0x20, 0x20, 0x20)
+WINDOW = (0xF0, 0xF0, 0xF0)
+TITLE = (0x60, 0x60, 0x60)
+TITLE_FOCUSED = (0x00, 0x78, 0xD7)
+GLYPH_W = 8
+GLYPH_H = 14
+CURSOR_W = 12
+CURSOR_H = 19
+
+class SimulatedDesktop(SyntheticCapture, InputBackend):
+    def __init__(self, screen_w: int = 1920, screen_h: int = 1080) -> None:
+        SyntheticCapture.__init__(self, screen_w, screen_h, BACKGROUND)
+        self.chunk_pacing = 0.0
+        self.cursor = (screen_w // 2, screen_h // 2)
+        self.taskbar_h = max(24, screen_h // 24)
+        self.window = (screen_w // 6, screen_h // 8, screen_w * 5 // 6, screen_h * 3 // 4)
+        self.title_h = max(20, screen_h // 36)
+        self.window_open = True
+        self.focused = False
+        self.caret = (0, 0)
+        self.text: List[str] = []
+        self.log: List[Tuple[Any, ...]] = []
+        self.capture_s = 0.0
+        self.encode_s = 0.0
+        self._redraw()
+
+    def _text_area(self) -> Tuple[int, int, int, int]:
+        x0, y0, x1, y1 = self.window
+        return x0 + 4, y0 + self.title_h + 4, x1 - 4, y1 - 4
+
+    def _redraw(self) -> None:
+        w, h = self.screen_w, self.screen_h
+        self.fill_rect(0, 0, w, h, BACKGROUND)
+        self.fill_rect(0, h - self.taskbar_h, w, h, TASKBAR)
+        self.fill_rect(8, h - self.taskbar_h + 4, 8 + self.taskbar_h * 2, h - 4, WINDOW if self.window_open else TITLE)
+        if self.window_open:
+            x0, y0, x1, y1 = self.window
+            self.fill_rect(x0, y0, x1, y1, WINDOW)
+            self.fill_rect(x0, y0, x1, y0 + self.title_h, TITLE_FOCUSED if self.focused else TITLE)
+            tx0, ty0, tx1, ty1 = self._text_area()
+            cols = max(1, (tx1 - tx0) // GLYPH_W)
+            row = col = 0
+            for ch in "".join(self.text):
+                if ch == "\n" or col >= cols:
+                    row += 1
+                    col = 0
+                    if ch == "\n":
+                        continue
+                y = ty0 + row * (GLYPH_H + 2)
+                if y + GLYPH_H > ty1:
+                    break
+                code = ord(ch)
+                if not ch.isspace():
+                    self.fill_rect(tx0 + col * GLYPH_W + 1, y + 2, tx0 + (col + 1) * GLYPH_W - 1, y + GLYPH_H, (code * 37 & 0x7F, code * 11 & 0x7F, code * 5 & 0x7F))
+                col += 1
+            self.caret = (tx0 + col * GLYPH_W, ty0 + row * (GLYPH_H + 2))
+            if self.focused:
+                cx, cy = self.caret
+                self.fill_rect(cx, cy, cx + 2, cy + GLYPH_H, (0, 0, 0))
+
+    def _hit(self, rect: Tuple[int, int, int, int]) -> bool:
+        x, y = self.cursor
+        return rect[0] <= x < rect[2] and rect[1] <= y < rect[3]
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.screen_w, self.screen_h
+
+    def grab(self, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        t0 = time.perf_counter()
+        x, y = self.cursor
+        x1, y1 = min(self.screen_w, x + CURSOR_W), min(self.screen_h, y + CURSOR_H)
+        saved = [(off, bytes(self.frame[off:off + (x1 - x) * 4])) for off in ((row * self.screen_w + x) * 4 for row in range(y, y1))]
+        self.fill_rect(x, y, x1, y1, (0, 0, 0))
+        self.fill_rect(x + 1, y + 1, x1 - 1, y1 - 1, (0xFF, 0xFF, 0xFF))
+        try:
+            view, screen_w, screen_h = SyntheticCapture.grab(self, target_w, target_h)
+            if (target_w, target_h) == (screen_w, screen_h):
+                view = memoryview(bytes(view))
+        finally:
+            for off, data in saved:
+                self.frame[off:off + len(data)] = data
+        self.capture_s += time.perf_counter() - t0
+        return view, screen_w, screen_h
+
+    def encode(self, bgra: Any, w: int, h: int, png_preset: Any = "default", image_mode: str = "rgb", quantizer: str = "median_cut", out: Optional[bytearray] = None) -> bytes:
+        t0 = time.perf_counter()
+        png = SyntheticCapture.encode(self, bgra, w, h, png_preset, image_mode, quantizer, out)
+        self.encode_s += time.perf_counter() - t0
+        return png
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        self.cursor = norm_to_screen_px(xn, yn, self.screen_w, self.screen_h)
+        self.log.append(("move",) + self.cursor)
+        return self.screen_w, self.screen_h
+
+    def click_mouse(self) -> None:
+        self.log.append(("click",) + self.cursor)
+        h = self.screen_h
+        if self._hit((8, h - self.taskbar_h + 4, 8 + self.taskbar_h * 2, h - 4)):
+            self.window_open = not self.window_open
+            self.focused = False
+        elif self.window_open and self._hit(self.window):
+            self.focused = True
+        else:
+            self.focused = False
+        self._redraw()
+
+    def scroll_down(self) -> None:
+        self.log.append(("scroll", -120))
+        if self.window_open and self.text:
+            joined = "".join(self.text)
+            cut = joined.find("\n")
+            self.text = [joined[cut + 1:]] if cut >= 0 else []
+            self._redraw()
+
+    def send_key_events(self, events: List[KeyEvent]) -> None:
+        self.log.append(("keys", list(events)))
+        if self.window_open and self.focused:
+            self.text.append(key_events_to_text(events))
+            self._redraw()
+
+    def pause(self, seconds: float) -> None:
+        pass
+
+    def typed_text(self) -> str:
+        return "".join(self.text)
+
+    def state(self) -> Dict[str, Any]:
+        return {"cursor": self.cursor, "window_open": self.window_open, "focused": self.focused, "text": self.typed_text(), "events": len(self.log)}
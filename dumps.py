@@ -0,0 +1,326 @@
+# Run with: python dumps.py <list|extract> <archive.frames> [out_dir] [name|index ...]
+# Example: python dumps.py extract dumps/run.frames dumps/extracted 3 screen_0007.png
+
+# dumps.py
+from __future__ import annotations
+import os
+import sys
+import json
+import time
+import zlib
+import queue
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+from imaging import decode_png_rows, encode_scanlines_to_png, np, pack_scanlines
+from agent_utils import common_prefix_len, print_table
+
+ARCHIVE_MAGIC = b"FRAMES01"
+RECORD = struct.Struct("<4sBBHII")
+RECORD_TAG = b"FRM\x00"
+TRAILER = struct.Struct("<4sQ")
+TRAILER_TAG = b"FIDX"
+KIND_PNG = 0
+KIND_DELTA = 1
+DUMP_POLICIES = ("drop", "block")
+
+def _xor(a: bytes, b: bytes) -> bytes:
+    if np is not None:
+        return np.bitwise_xor(np.frombuffer(a, dtype=np.uint8), np.frombuffer(b, dtype=np.uint8)).tobytes()
+    return (int.from_bytes(a, "little") ^ int.from_bytes(b, "little")).to_bytes(len(a), "little")
+
+def _changed_span(a: bytes, b: bytes, block: int = 4096) -> Tuple[int, int]:
+    n = len(a)
+    if np is not None:
+        ne = np.frombuffer(a, dtype=np.uint8) != np.frombuffer(b, dtype=np.uint8)
+        if not ne.any():
+            return n, n
+        return int(ne.argmax()), n - int(ne[::-1].argmax())
+    lo = common_prefix_len(a, b)
+    if lo >= n:
+        return n, n
+    hi = n
+    while hi - block >= lo and a[hi - block:hi] == b[hi - block:hi]:
+        hi -= block
+    while hi > lo and a[hi - 1] == b[hi - 1]:
+        hi -= 1
+    return lo, hi
+
+def _raw_frame(png: bytes) -> Tuple[Tuple[int, int, int, int, Optional[bytes]], bytes]:
+    w, h, color_type, bit_depth, palette, rows = decode_png_rows(png)
+    return (w, h, color_type, bit_depth, palette), b"".join(rows[y] for y in range(h))
+
+def _encode_raw(fmt: Tuple[int, int, int, int, Optional[bytes]], raw: bytes) -> bytes:
+    w, h, color_type, bit_depth, palette = fmt
+    row_bytes = len(raw) // h
+    pal = [tuple(palette[i:i + 3]) for i in range(0, len(palette) - 2, 3)] if palette is not None else None
+    return encode_scanlines_to_png(pack_scanlines(raw, row_bytes, h), w, h, "fast", color_type, bit_depth, pal)
+
+class DirectorySink:
+    def __init__(self, path: str) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+
+    def write(self, name: str, png: bytes, t: float) -> int:
+        with open(os.path.join(self.path, name), "wb") as f:
+            f.write(png)
+        return len(png)
+
+    def close(self) -> None:
+        pass
+
+class FrameArchive:
+    def __init__(self, path: str, mode: str = "a", delta: bool = False, keyframe_interval: int = 30, level: int = 6) -> None:
+        if mode not in ("r", "a"):
+            raise ValueError(f"Unknown archive mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.delta = delta
+        self.keyframe_interval = keyframe_interval
+        self.level = level
+        self.entries: List[Dict[str, Any]] = []
+        self.by_name: Dict[str, int] = {}
+        self._prev: Optional[Tuple[Tuple[int, int, int, int, Optional[bytes]], bytes]] = None
+        self._since_key = 0
+        self._cache: Optional[Tuple[int, Tuple[int, int, int, int, Optional[bytes]], bytes]] = None
+        if mode == "r":
+            self._f = open(path, "rb")
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._f = open(path, "r+b" if os.path.exists(path) else "w+b")
+        self._f.seek(0, os.SEEK_END)
+        if self._f.tell() == 0 and mode == "a":
+            self._f.write(ARCHIVE_MAGIC)
+        self._f.seek(0)
+        if self._f.read(len(ARCHIVE_MAGIC)) != ARCHIVE_MAGIC:
+            raise ValueError(f"not a frame archive: {path}")
+        end = self._load_index()
+        if mode == "a":
+            self._f.seek(end)
+            self._f.truncate()
+
+    def _load_index(self) -> int:
+        f = self._f
+        size = f.seek(0, os.SEEK_END)
+        if size >= len(ARCHIVE_MAGIC) + TRAILER.size:
+            f.seek(size - TRAILER.size)
+            tag, offset = TRAILER.unpack(f.read(TRAILER.size))
+            if tag == TRAILER_TAG and len(ARCHIVE_MAGIC) <= offset < size:
+                f.seek(offset)
+                try:
+                    entries = json.loads(f.read(size - TRAILER.size - offset).decode("utf-8"))
+                except ValueError:
+                    entries = None
+                if isinstance(entries, list):
+                    self._set_entries(entries)
+                    return offset
+        return self._scan()
+
+    def _scan(self) -> int:
+        f = self._f
+        pos = f.seek(len(ARCHIVE_MAGIC))
+        entries = []
+        while True:
+            head = f.read(RECORD.size)
+            if len(head) < RECORD.size:
+                break
+            tag, kind, _, meta_len, payload_len, crc = RECORD.unpack(head)
+            if tag != RECORD_TAG:
+                break
+            meta_raw = f.read(meta_len)
+            payload = f.read(payload_len)
+            if len(meta_raw) < meta_len or len(payload) < payload_len or zlib.crc32(payload) != crc:
+                break
+            meta = json.loads(meta_raw.decode("utf-8"))
+            meta.update({"kind": kind, "offset": pos + RECORD.size + meta_len, "length": payload_len})
+            entries.append(meta)
+            pos = f.tell()
+        self._set_entries(entries)
+        return pos
+
+    def _set_entries(self, entries: List[Dict[str, Any]]) -> None:
+        self.entries = entries
+        self.by_name = {e["name"]: i for i, e in enumerate(entries)}
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def resolve(self, key: Union[int, str]) -> int:
+        if isinstance(key, str) and not key.isdigit():
+            if key not in self.by_name:
+                raise KeyError(f"Unknown frame: {key}")
+            return self.by_name[key]
+        idx = int(key)
+        if not 0 <= idx < len(self.entries):
+            raise KeyError(f"Unknown frame index: {idx} (0..{len(self.entries) - 1})")
+        return idx
+
+    def append(self, name: str, png: bytes, t: Optional[float] = None) -> int:
+        meta: Dict[str, Any] = {"name": name, "t": time.time() if t is None else t}
+        kind = KIND_PNG
+        payload = png
+        if self.delta:
+            fmt, raw = _raw_frame(png)
+            meta.update({"w": fmt[0], "h": fmt[1]})
+            prev = self._prev
+            if prev is not None and prev[0] == fmt and fmt[2] in (0, 2, 3) and self._since_key < self.keyframe_interval:
+                lo, hi = _changed_span(raw, prev[1])
+                packed = zlib.compress(_xor(raw[lo:hi], prev[1][lo:hi]), self.level)
+                if len(packed) < len(png):
+                    kind = KIND_DELTA
+                    payload = packed
+                    meta.update({"prev": len(self.entries) - 1, "lo": lo})
+            self._prev = (fmt, raw)
+            self._since_key = self._since_key + 1 if kind == KIND_DELTA else 1
+        meta_raw = json.dumps(meta, separators=(",", ":")).encode("utf-8")
+        f = self._f
+        pos = f.seek(0, os.SEEK_END)
+        f.write(RECORD.pack(RECORD_TAG, kind, 0, len(meta_raw), len(payload), zlib.crc32(payload)))
+        f.write(meta_raw)
+        f.write(payload)
+        meta.update({"kind": kind, "offset": pos + RECORD.size + len(meta_raw), "length": len(payload)})
+        self.by_name[name] = len(self.entries)
+        self.entries.append(meta)
+        return RECORD.size + len(meta_raw) + len(payload)
+
+    def write(self, name: str, png: bytes, t: float) -> int:
+        return self.append(name, png, t)
+
+    def _payload(self, idx: int) -> bytes:
+        e = self.entries[idx]
+        self._f.seek(e["offset"])
+        return self._f.read(e["length"])
+
+    def _raw(self, idx: int) -> Tuple[Tuple[int, int, int, int, Optional[bytes]], bytes]:
+        chain = []
+        i = idx
+        while self.entries[i]["kind"] == KIND_DELTA:
+            if self._cache is not None and self._cache[0] == i:
+                break
+            chain.append(i)
+            i = self.entries[i]["prev"]
+        if self._cache is not None and self._cache[0] == i:
+            fmt, raw = self._cache[1], self._cache[2]
+        else:
+            fmt, raw = _raw_frame(self._payload(i))
+        for j in reversed(chain):
+            span = zlib.decompress(self._payload(j))
+            lo = self.entries[j].get("lo", 0)
+            hi = lo + len(span)
+            raw = raw[:lo] + _xor(raw[lo:hi], span) + raw[hi:]
+        self._cache = (idx, fmt, raw)
+        return fmt, raw
+
+    def read_png(self, key: Union[int, str]) -> bytes:
+        idx = self.resolve(key)
+        if self.entries[idx]["kind"] == KIND_PNG:
+            return self._payload(idx)
+        return _encode_raw(*self._raw(idx))
+
+    def info(self) -> Dict[str, Any]:
+        size = os.path.getsize(self.path)
+        deltas = sum(1 for e in self.entries if e["kind"] == KIND_DELTA)
+        return {"frames": len(self.entries), "keyframes": len(self.entries) - deltas, "deltas": deltas, "bytes": size, "payload_bytes": sum(e["length"] for e in self.entries)}
+
+    def close(self) -> None:
+        if self._f.closed:
+            return
+        if self.mode == "a":
+            offset = self._f.seek(0, os.SEEK_END)
+            self._f.write(json.dumps(self.entries, separators=(",", ":")).encode("utf-8"))
+            self._f.write(TRAILER.pack(TRAILER_TAG, offset))
+        self._f.close()
+
+    def __enter__(self) -> "FrameArchive":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+class DumpWriter:
+    def __init__(self, sink: Any, max_queue: int = 32, policy: str = "block") -> None:
+        if policy not in DUMP_POLICIES:
+            raise ValueError(f"Unknown dump policy: {policy} ({'|'.join(DUMP_POLICIES)})")
+        self.sink = sink
+        self.policy = policy
+        self.submitted = 0
+        self.written = 0
+        self.dropped = 0
+        self.errors = 0
+        self.bytes = 0
+        self.write_s = 0.0
+        self.blocked_s = 0.0
+        self.max_depth = 0
+        self.last_error: Optional[str] = None
+        self._queue: "queue.Queue[Optional[Tuple[str, bytes, float]]]" = queue.Queue(max_queue)
+        self._thread = threading.Thread(target=self._run, name="dump-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, name: str, png: bytes) -> bool:
+        self.submitted += 1
+        item = (name, png, time.time())
+        if self.policy == "block":
+            t0 = time.perf_counter()
+            self._queue.put(item)
+            self.blocked_s += time.perf_counter() - t0
+        else:
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                return False
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                self.bytes += self.sink.write(*item)
+                self.written += 1
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{type(e).__name__}: {e}"
+            self.write_s += time.perf_counter() - t0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"submitted": self.submitted, "written": self.written, "dropped": self.dropped, "errors": self.errors, "bytes": self.bytes, "write_s": self.write_s, "blocked_s": self.blocked_s, "max_depth": self.max_depth, "last_error": self.last_error}
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join()
+        self.sink.close()
+
+def main() -> None:
+    if len(sys.argv) < 3 or sys.argv[1] not in ("list", "extract"):
+        sys.exit("Usage: python dumps.py <list|extract> <archive.frames> [out_dir] [name|index ...]")
+    try:
+        archive = FrameArchive(sys.argv[2], "r")
+    except (OSError, ValueError) as e:
+        sys.exit(str(e))
+    with archive:
+        if sys.argv[1] == "list":
+            print_table([{"index": i, "name": e["name"], "kind": "delta" if e["kind"] == KIND_DELTA else "png", "bytes": e["length"], "t": time.strftime("%H:%M:%S", time.localtime(e["t"]))} for i, e in enumerate(archive.entries)])
+            print(json.dumps(archive.info()))
+            return
+        out_dir = sys.argv[3] if len(sys.argv) > 3 else "."
+        keys = sys.argv[4:] or [str(i) for i in range(len(archive))]
+        os.makedirs(out_dir, exist_ok=True)
+        for key in keys:
+            try:
+                idx = archive.resolve(key)
+            except KeyError as e:
+                sys.exit(e.args[0])
+            fn = os.path.join(out_dir, archive.entries[idx]["name"])
+            with open(fn, "wb") as f:
+                f.write(archive.read_png(idx))
+            print(fn)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,642 @@
+# imaging.py
+from __future__ import annotations
+import os
+import struct
+import zlib
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+PNG_SIG = b"\x89PNG\r\n\x1a\n"
+FILTER_TYPES = {"none": 0, "sub": 1, "up": 2, "paeth": 4}
+DEFLATE_WINDOW = 32768
+MIN_STRIPE_BYTES = 65536
+
+PNG_PRESETS: Dict[str, Dict[str, Any]] = {
+    "default": {"level": 6, "strategy": zlib.Z_DEFAULT_STRATEGY, "filters": ("none",), "stripes": 1},
+    "fast": {"level": 1, "strategy": zlib.Z_DEFAULT_STRATEGY, "filters": ("none", "up") if np is not None else ("none",), "stripes": 0},
+    # Adaptive filtering is pure Python without NumPy (~5x default at 1344x756), so "small" keeps default filtering there.
+    "small": {"level": 9, "strategy": zlib.Z_DEFAULT_STRATEGY, "filters": ("none", "sub", "up", "paeth") if np is not None else ("none",), "stripes": 0},
+}
+
+IMAGE_MODES = ("rgb", "gray", "palette", "palette4")
+
+_SHL4 = bytes((v << 4) & 0xFF for v in range(256))
+
+VGA16_PALETTE = [
+    (0, 0, 0), (128, 0, 0), (0, 128, 0), (128, 128, 0), (0, 0, 128), (128, 0, 128), (0, 128, 128), (192, 192, 192),
+    (128, 128, 128), (255, 0, 0), (0, 255, 0), (255, 255, 0), (0, 0, 255), (255, 0, 255), (0, 255, 255), (255, 255, 255),
+]
+
+_pool: Optional[ThreadPoolExecutor] = None
+
+def png_chunk(t: bytes, d: bytes) -> bytes:
+    return struct.pack(">I", len(d)) + t + d + struct.pack(">I", zlib.crc32(t + d) & 0xFFFFFFFF)
+
+def _as_view(buf: Any, size: int) -> memoryview:
+    mv = memoryview(buf).cast("B")
+    if len(mv) < size:
+        raise ValueError(f"pixel buffer too small: {len(mv)} < {size}")
+    return mv[:size]
+
+def bgra_to_rgb(bgra: Any, w: int, h: int) -> bytes:
+    n = w * h
+    src = _as_view(bgra, n * 4)
+    if np is not None:
+        a = np.frombuffer(src, dtype=np.uint8).reshape(n, 4)
+        return a[:, 2::-1].tobytes()
+    rgb = bytearray(n * 3)
+    rgb[0::3] = src[2::4]
+    rgb[1::3] = src[1::4]
+    rgb[2::3] = src[0::4]
+    return bytes(rgb)
+
+def bgra_to_scanlines(bgra: Any, w: int, h: int, out: Optional[bytearray] = None) -> bytearray:
+    row = w * 3
+    stride = row + 1
+    src = _as_view(bgra, w * h * 4)
+    if out is not None and len(out) == stride * h:
+        raw = out
+        raw[0::stride] = bytes(h)
+    else:
+        raw = bytearray(stride * h)
+    if np is not None:
+        out = np.frombuffer(raw, dtype=np.uint8).reshape(h, stride)
+        out[:, 1:].reshape(h, w, 3)[:] = np.frombuffer(src, dtype=np.uint8).reshape(h, w, 4)[:, :, 2::-1]
+        return raw
+    sw = w * 4
+    for y in range(h):
+        base = y * stride + 1
+        off = y * sw
+        line = src[off:off + sw]
+        raw[base:base + row:3] = line[2::4]
+        raw[base + 1:base + row:3] = line[1::4]
+        raw[base + 2:base + row:3] = line[0::4]
+    return raw
+
+def rgb_to_scanlines(rgb: Any, w: int, h: int) -> bytearray:
+    return pack_scanlines(rgb, w * 3, h)
+
+def pack_scanlines(data: Any, row: int, h: int) -> bytearray:
+    stride = row + 1
+    src = _as_view(data, row * h)
+    raw = bytearray(stride * h)
+    for y in range(h):
+        base = y * stride
+        off = y * row
+        raw[base + 1:base + 1 + row] = src[off:off + row]
+    return raw
+
+def get_png_preset(preset: Any) -> Dict[str, Any]:
+    if isinstance(preset, dict):
+        return {**PNG_PRESETS["default"], **preset}
+    if preset not in PNG_PRESETS:
+        raise ValueError(f"unknown png preset: {preset!r}")
+    return PNG_PRESETS[preset]
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="png")
+    return _pool
+
+@lru_cache(maxsize=8)
+def _swar_masks(n: int) -> Tuple[int, int]:
+    return int.from_bytes(b"\x80" * n, "big"), int.from_bytes(b"\x7f" * n, "big")
+
+def _sub_bytes(a: bytes, b: bytes) -> bytes:
+    n = len(a)
+    hi, lo = _swar_masks(n)
+    x = int.from_bytes(a, "big")
+    y = int.from_bytes(b, "big")
+    return (((x | hi) - (y & lo)) ^ (~(x ^ y) & hi)).to_bytes(n, "big")
+
+def _paeth_row(cur: bytes, prev: bytes, bpp: int) -> bytes:
+    out = bytearray(len(cur))
+    for i in range(len(cur)):
+        a = cur[i - bpp] if i >= bpp else 0
+        b = prev[i]
+        c = prev[i - bpp] if i >= bpp else 0
+        p = a + b - c
+        pa = abs(p - a)
+        pb = abs(p - b)
+        pc = abs(p - c)
+        if pa <= pb and pa <= pc:
+            pred = a
+        elif pb <= pc:
+            pred = b
+        else:
+            pred = c
+        out[i] = (cur[i] - pred) & 0xFF
+    return bytes(out)
+
+def _filter_rows_py(raw: Any, stride: int, bpp: int, y0: int, y1: int, filters: Sequence[str]) -> bytes:
+    src = bytes(memoryview(raw)[y0 * stride:y1 * stride])
+    above = bytes(memoryview(raw)[(y0 - 1) * stride:y0 * stride]) if y0 > 0 else bytes(stride)
+    cands = []
+    for name in filters:
+        if name == "none":
+            f = src
+        elif name == "sub":
+            f = bytearray(_sub_bytes(src, bytes(bpp) + src[:-bpp]))
+            for base in range(1, len(src), stride):
+                f[base:base + bpp] = src[base:base + bpp]
+        elif name == "up":
+            f = _sub_bytes(src, above + src[:-stride])
+        else:
+            f = bytearray(len(src))
+            prev = above[1:]
+            for base in range(0, len(src), stride):
+                cur = src[base + 1:base + stride]
+                f[base + 1:base + stride] = _paeth_row(cur, prev, bpp)
+                prev = cur
+        cands.append((FILTER_TYPES[name], f))
+    if len(cands) == 1:
+        best_t, f = cands[0]
+        out = bytearray(f)
+        out[0::stride] = bytes([best_t]) * (y1 - y0)
+        return bytes(out)
+    out = bytearray(len(src))
+    for base in range(0, len(src), stride):
+        best_t, best, best_zeros = 0, src, -1
+        for t, f in cands:
+            zeros = f.count(0, base + 1, base + stride)
+            if zeros > best_zeros:
+                best_t, best, best_zeros = t, f, zeros
+        out[base] = best_t
+        out[base + 1:base + stride] = best[base + 1:base + stride]
+    return bytes(out)
+
+def _filter_rows_np(raw: Any, stride: int, bpp: int, h: int, filters: Sequence[str]) -> bytes:
+    data = np.frombuffer(raw, dtype=np.uint8, count=stride * h).reshape(h, stride)[:, 1:]
+    left = np.zeros_like(data)
+    left[:, bpp:] = data[:, :-bpp]
+    up = np.zeros_like(data)
+    up[1:] = data[:-1]
+    cands = []
+    for name in filters:
+        if name == "none":
+            f = data
+        elif name == "sub":
+            f = data - left
+        elif name == "up":
+            f = data - up
+        else:
+            upleft = np.zeros_like(data)
+            upleft[1:, bpp:] = data[:-1, :-bpp]
+            a = left.astype(np.int16)
+            b = up.astype(np.int16)
+            c = upleft.astype(np.int16)
+            p = a + b - c
+            pa = np.abs(p - a)
+            pb = np.abs(p - b)
+            pc = np.abs(p - c)
+            pred = np.where((pa <= pb) & (pa <= pc), a, np.where(pb <= pc, b, c)).astype(np.uint8)
+            f = data - pred
+        cands.append(f)
+    stack = np.stack(cands)
+    choice = np.argmax((stack == 0).sum(axis=2), axis=0)
+    out = np.empty((h, stride), dtype=np.uint8)
+    out[:, 0] = np.array([FILTER_TYPES[n] for n in filters], dtype=np.uint8)[choice]
+    out[:, 1:] = stack[choice, np.arange(h)]
+    return out.tobytes()
+
+def _zlib_header(level: int) -> bytes:
+    if level < 0 or level == 6:
+        flevel = 2
+    elif level <= 1:
+        flevel = 0
+    else:
+        flevel = 1 if level < 6 else 3
+    cmf = 0x78
+    flg = flevel << 6
+    flg += 31 - ((cmf << 8) + flg) % 31
+    return bytes((cmf, flg))
+
+def _deflate_stripe(data: bytes, zdict: bytes, level: int, strategy: int, last: bool) -> bytes:
+    if zdict:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, 8, strategy, zdict)
+    else:
+        c = zlib.compressobj(level, zlib.DEFLATED, -15, 8, strategy)
+    return c.compress(data) + c.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+
+def _stripe_bounds(h: int, stride: int, stripes: int) -> List[Tuple[int, int]]:
+    if stripes <= 0:
+        stripes = os.cpu_count() or 4
+    stripes = max(1, min(stripes, h, (stride * h) // MIN_STRIPE_BYTES or 1))
+    step = -(-h // stripes)
+    return [(y, min(h, y + step)) for y in range(0, h, step)]
+
+def deflate_scanlines(raw: Any, row_bytes: int, h: int, bpp: int, preset: Any = "default") -> bytes:
+    p = get_png_preset(preset)
+    level, strategy, filters = p["level"], p["strategy"], tuple(p["filters"])
+    stride = row_bytes + 1
+    bounds = _stripe_bounds(h, stride, p["stripes"])
+    if filters == ("none",) and len(bounds) == 1 and strategy == zlib.Z_DEFAULT_STRATEGY:
+        return zlib.compress(raw, level)
+    pool = _get_pool()
+    if np is not None:
+        filtered = _filter_rows_np(raw, stride, bpp, h, filters)
+        parts = [filtered[y0 * stride:y1 * stride] for y0, y1 in bounds]
+    elif len(bounds) > 1:
+        parts = list(pool.map(lambda b: _filter_rows_py(raw, stride, bpp, b[0], b[1], filters), bounds))
+    else:
+        parts = [_filter_rows_py(raw, stride, bpp, 0, h, filters)]
+    dicts = [b""] + [part[-DEFLATE_WINDOW:] for part in parts[:-1]]
+    lasts = [i == len(parts) - 1 for i in range(len(parts))]
+    if len(parts) > 1:
+        bodies = list(pool.map(lambda a: _deflate_stripe(a[0], a[1], level, strategy, a[2]), zip(parts, dicts, lasts)))
+    else:
+        bodies = [_deflate_stripe(parts[0], b"", level, strategy, True)]
+    adler = 1
+    for part in parts:
+        adler = zlib.adler32(part, adler)
+    return _zlib_header(level) + b"".join(bodies) + struct.pack(">I", adler & 0xFFFFFFFF)
+
+def encode_scanlines_to_png(raw: Any, w: int, h: int, preset: Any = "default", color_type: int = 2, bit_depth: int = 8, palette: Optional[Sequence[Tuple[int, int, int]]] = None) -> bytes:
+    channels = 3 if color_type == 2 else 1
+    row_bytes = (w * channels * bit_depth + 7) // 8
+    bpp = max(1, channels * bit_depth // 8)
+    ihdr = struct.pack(">IIBBBBB", w, h, bit_depth, color_type, 0, 0, 0)
+    comp = deflate_scanlines(raw, row_bytes, h, bpp, preset)
+    out = PNG_SIG + png_chunk(b"IHDR", ihdr)
+    if palette is not None:
+        out += png_chunk(b"PLTE", b"".join(bytes(c) for c in palette))
+    return out + png_chunk(b"IDAT", comp) + png_chunk(b"IEND", b"")
+
+@lru_cache(maxsize=8)
+def _gray_round(n: int) -> int:
+    return int.from_bytes(b"\x00\x80" * n, "big")
+
+def gray_of(r: int, g: int, b: int) -> int:
+    return (r * 77 + g * 150 + b * 29 + 128) >> 8
+
+def bgra_to_gray(bgra: Any, w: int, h: int) -> bytes:
+    n = w * h
+    src = _as_view(bgra, n * 4)
+    if np is not None:
+        a = np.frombuffer(src, dtype=np.uint8).reshape(n, 4).astype(np.uint16)
+        return ((a[:, 2] * 77 + a[:, 1] * 150 + a[:, 0] * 29 + 128) >> 8).astype(np.uint8).tobytes()
+    lanes = bytearray(2 * n)
+    lanes[1::2] = src[2::4]
+    r = int.from_bytes(lanes, "big")
+    lanes[1::2] = src[1::4]
+    g = int.from_bytes(lanes, "big")
+    lanes[1::2] = src[0::4]
+    b = int.from_bytes(lanes, "big")
+    return (r * 77 + g * 150 + b * 29 + _gray_round(n)).to_bytes(2 * n, "big")[0::2]
+
+def _key5(r: int, g: int, b: int) -> int:
+    return (r >> 3) << 10 | (g >> 3) << 5 | (b >> 3)
+
+def _nearest_lut(palette: Sequence[Tuple[int, int, int]]) -> bytes:
+    lut = bytearray(32768)
+    for key in range(32768):
+        r = (key >> 10) * 8 + 4
+        g = (key >> 5 & 31) * 8 + 4
+        b = (key & 31) * 8 + 4
+        best = 0
+        best_d = 1 << 30
+        for i, (pr, pg, pb) in enumerate(palette):
+            d = (r - pr) * (r - pr) + (g - pg) * (g - pg) + (b - pb) * (b - pb)
+            if d < best_d:
+                best, best_d = i, d
+        lut[key] = best
+    return bytes(lut)
+
+@lru_cache(maxsize=4)
+def fixed_palette(colors: int) -> Tuple[List[Tuple[int, int, int]], bytes]:
+    if colors <= 16:
+        return VGA16_PALETTE, _nearest_lut(VGA16_PALETTE)
+    palette = [(r * 255 // 5, g * 255 // 6, b * 255 // 5) for r in range(6) for g in range(7) for b in range(6)]
+    lut = bytearray(32768)
+    for key in range(32768):
+        r = (key >> 10) * 8 + 4
+        g = (key >> 5 & 31) * 8 + 4
+        b = (key & 31) * 8 + 4
+        lut[key] = ((r * 5 + 127) // 255) * 42 + ((g * 6 + 127) // 255) * 6 + (b * 5 + 127) // 255
+    return palette, bytes(lut)
+
+def _color_histogram(pixels: Any, step: int) -> Dict[int, List[int]]:
+    hist: Dict[int, List[int]] = {}
+    if np is not None:
+        p = np.asarray(pixels, dtype=np.uint32)[::step]
+        keys = ((p >> 9) & 0x7C00) | ((p >> 6) & 0x3E0) | ((p >> 3) & 0x1F)
+        cnt = np.bincount(keys, minlength=32768)
+        rs = np.bincount(keys, weights=(p >> 16) & 0xFF, minlength=32768)
+        gs = np.bincount(keys, weights=(p >> 8) & 0xFF, minlength=32768)
+        bs = np.bincount(keys, weights=p & 0xFF, minlength=32768)
+        for k in np.nonzero(cnt)[0].tolist():
+            hist[k] = [int(cnt[k]), int(rs[k]), int(gs[k]), int(bs[k])]
+        return hist
+    for v, c in Counter(pixels[::step]).items():
+        r, g, b = v >> 16 & 0xFF, v >> 8 & 0xFF, v & 0xFF
+        e = hist.get(_key5(r, g, b))
+        if e is None:
+            hist[_key5(r, g, b)] = [c, r * c, g * c, b * c]
+        else:
+            e[0] += c
+            e[1] += r * c
+            e[2] += g * c
+            e[3] += b * c
+    return hist
+
+def _box_split_score(its: List[Any]) -> Tuple[int, int]:
+    best_score, best_axis = 0, 0
+    n = sum(e[0] for _, e in its)
+    for axis in range(3):
+        vals = [c[axis] for c, _ in its]
+        if vals and (max(vals) - min(vals)) * n > best_score:
+            best_score, best_axis = (max(vals) - min(vals)) * n, axis
+    return best_score, best_axis
+
+def median_cut_palette(pixels: Any, colors: int, samples: int = 65536) -> Tuple[List[Tuple[int, int, int]], bytes]:
+    hist = _color_histogram(pixels, max(1, len(pixels) // samples))
+    items = [((k >> 10, k >> 5 & 31, k & 31), e) for k, e in hist.items()]
+    boxes = [(*_box_split_score(items), [0, 0, 0], [31, 31, 31], items)]
+    while len(boxes) < colors:
+        best_i = max(range(len(boxes)), key=lambda i: boxes[i][0])
+        if boxes[best_i][0] <= 0:
+            break
+        _, axis, lo, hi, its = boxes.pop(best_i)
+        its.sort(key=lambda it: it[0][axis])
+        half = sum(e[0] for _, e in its) / 2.0
+        acc = 0
+        cut = its[0][0][axis]
+        for c, e in its:
+            acc += e[0]
+            cut = c[axis]
+            if acc >= half:
+                break
+        if cut >= its[-1][0][axis]:
+            cut = its[-1][0][axis] - 1
+        lhi = list(hi)
+        lhi[axis] = cut
+        rlo = list(lo)
+        rlo[axis] = cut + 1
+        left = [it for it in its if it[0][axis] <= cut]
+        right = [it for it in its if it[0][axis] > cut]
+        boxes.append((*_box_split_score(left), lo, lhi, left))
+        boxes.append((*_box_split_score(right), rlo, hi, right))
+    palette = []
+    lut = bytearray(32768)
+    for idx, (_, _, lo, hi, its) in enumerate(boxes):
+        n = sum(e[0] for _, e in its)
+        if n:
+            palette.append(tuple(min(255, int(round(sum(e[ch] for _, e in its) / float(n)))) for ch in (1, 2, 3)))
+        else:
+            palette.append(tuple((lo[ch] + hi[ch]) * 4 + 4 for ch in range(3)))
+        run = bytes([idx]) * (hi[2] - lo[2] + 1)
+        for r in range(lo[0], hi[0] + 1):
+            for g in range(lo[1], hi[1] + 1):
+                base = r << 10 | g << 5 | lo[2]
+                lut[base:base + len(run)] = run
+    return palette, bytes(lut)
+
+def bgra_to_indexed(bgra: Any, w: int, h: int, colors: int = 256, quantizer: str = "median_cut") -> Tuple[bytes, List[Tuple[int, int, int]]]:
+    n = w * h
+    pixels = _as_view(bgra, n * 4).cast("I")
+    if np is not None:
+        p = np.frombuffer(pixels, dtype=np.uint32) & 0xFFFFFF
+        uniq, inverse = np.unique(p, return_inverse=True)
+        if len(uniq) <= colors:
+            palette = [(v >> 16 & 0xFF, v >> 8 & 0xFF, v & 0xFF) for v in uniq.tolist()]
+            return inverse.astype(np.uint8).tobytes(), palette
+        palette, lut = median_cut_palette(p, colors) if quantizer == "median_cut" else fixed_palette(colors)
+        keys = ((p >> 9) & 0x7C00) | ((p >> 6) & 0x3E0) | ((p >> 3) & 0x1F)
+        return np.frombuffer(lut, dtype=np.uint8)[keys].tobytes(), palette
+    uniq = set(pixels)
+    masked = {v & 0xFFFFFF for v in uniq}
+    if len(masked) <= colors:
+        order = sorted(masked)
+        pos = {v: i for i, v in enumerate(order)}
+        mapping = {v: pos[v & 0xFFFFFF] for v in uniq}
+        palette = [(v >> 16 & 0xFF, v >> 8 & 0xFF, v & 0xFF) for v in order]
+    else:
+        palette, lut = median_cut_palette(pixels, colors) if quantizer == "median_cut" else fixed_palette(colors)
+        mapping = {v: lut[(v >> 9 & 0x7C00) | (v >> 6 & 0x3E0) | (v >> 3 & 0x1F)] for v in uniq}
+    return bytes(map(mapping.__getitem__, pixels)), palette
+
+def pack_nibbles(indices: bytes, w: int, h: int) -> bytes:
+    row = (w + 1) // 2
+    out = bytearray(row * h)
+    for y in range(h):
+        line = indices[y * w:(y + 1) * w]
+        if w & 1:
+            line += b"\x00"
+        hi = int.from_bytes(line[0::2].translate(_SHL4), "big")
+        lo = int.from_bytes(line[1::2], "big")
+        out[y * row:(y + 1) * row] = (hi + lo).to_bytes(row, "big")
+    return bytes(out)
+
+def encode_rgb_to_png(rgb: Any, w: int, h: int, preset: Any = "default", mode: str = "rgb", quantizer: str = "median_cut") -> bytes:
+    if mode == "rgb":
+        return encode_scanlines_to_png(rgb_to_scanlines(rgb, w, h), w, h, preset)
+    src = _as_view(rgb, w * h * 3)
+    bgra = bytearray(w * h * 4)
+    bgra[0::4] = src[2::3]
+    bgra[1::4] = src[1::3]
+    bgra[2::4] = src[0::3]
+    return encode_bgra_to_png(bgra, w, h, preset, mode, quantizer)
+
+def convert_bgra(bgra: Any, w: int, h: int, mode: str = "rgb", quantizer: str = "median_cut", out: Optional[bytearray] = None) -> Tuple[Any, int, int, Optional[List[Tuple[int, int, int]]]]:
+    if mode == "rgb":
+        return bgra_to_scanlines(bgra, w, h, out), 2, 8, None
+    if mode == "gray":
+        return pack_scanlines(bgra_to_gray(bgra, w, h), w, h), 0, 8, None
+    if mode == "palette":
+        idx, palette = bgra_to_indexed(bgra, w, h, 256, quantizer)
+        return pack_scanlines(idx, w, h), 3, 8, palette
+    if mode == "palette4":
+        idx, palette = bgra_to_indexed(bgra, w, h, 16, quantizer)
+        return pack_scanlines(pack_nibbles(idx, w, h), (w + 1) // 2, h), 3, 4, palette
+    raise ValueError(f"unknown image mode: {mode!r}")
+
+def encode_bgra_to_png(bgra: Any, w: int, h: int, preset: Any = "default", mode: str = "rgb", quantizer: str = "median_cut", out: Optional[bytearray] = None) -> bytes:
+    raw, color_type, bit_depth, palette = convert_bgra(bgra, w, h, mode, quantizer, out)
+    return encode_scanlines_to_png(raw, w, h, preset, color_type, bit_depth, palette)
+
+def resize_bgra(bgra: Any, w: int, h: int, tw: int, th: int, out: Optional[bytearray] = None) -> Any:
+    if (tw, th) == (w, h):
+        return _as_view(bgra, w * h * 4)
+    src = _as_view(bgra, w * h * 4).cast("I")
+    if out is None or len(out) != tw * th * 4:
+        out = bytearray(tw * th * 4)
+    if np is not None:
+        ys = np.minimum(h - 1, (np.arange(th) * h) // th)
+        xs = np.minimum(w - 1, (np.arange(tw) * w) // tw)
+        np.frombuffer(out, dtype=np.uint32).reshape(th, tw)[:] = np.frombuffer(src, dtype=np.uint32).reshape(h, w)[ys[:, None], xs]
+        return out
+    dst = memoryview(out).cast("I")
+    cols = [min(w - 1, (x * w) // tw) for x in range(tw)]
+    prev_sy = -1
+    for y in range(th):
+        sy = min(h - 1, (y * h) // th)
+        if sy == prev_sy:
+            dst[y * tw:(y + 1) * tw] = dst[(y - 1) * tw:y * tw]
+        else:
+            line = src[sy * w:(sy + 1) * w]
+            dst[y * tw:(y + 1) * tw] = array("I", map(line.__getitem__, cols))
+        prev_sy = sy
+    return out
+
+def fit_size(w: int, h: int, max_w: int, max_h: int) -> Tuple[int, int]:
+    if w <= max_w and h <= max_h:
+        return w, h
+    scale = min(max_w / float(w), max_h / float(h))
+    return max(1, int(w * scale)), max(1, int(h * scale))
+
+def crop_bgra(bgra: Any, w: int, h: int, x0: int, y0: int, x1: int, y1: int) -> bytes:
+    src = _as_view(bgra, w * h * 4)
+    cw = (x1 - x0) * 4
+    out = bytearray(cw * (y1 - y0))
+    for y in range(y0, y1):
+        off = (y * w + x0) * 4
+        out[(y - y0) * cw:(y - y0 + 1) * cw] = src[off:off + cw]
+    return bytes(out)
+
+def block_hashes(bgra: Any, w: int, h: int, block: int = 32) -> List[int]:
+    src = _as_view(bgra, w * h * 4)
+    cols = -(-w // block)
+    span = block * 4
+    out = []
+    for by in range(0, h, block):
+        crcs = [0] * cols
+        for y in range(by, min(h, by + block)):
+            line = src[y * w * 4:(y + 1) * w * 4]
+            for bx in range(cols):
+                crcs[bx] = zlib.crc32(line[bx * span:(bx + 1) * span], crcs[bx])
+        out.extend(crcs)
+    return out
+
+def dirty_rect(prev: Sequence[int], cur: Sequence[int], w: int, h: int, block: int = 32) -> Optional[Tuple[int, int, int, int]]:
+    if len(prev) != len(cur):
+        return 0, 0, w, h
+    cols = -(-w // block)
+    changed = [i for i, (a, b) in enumerate(zip(prev, cur)) if a != b]
+    if not changed:
+        return None
+    bxs = [i % cols for i in changed]
+    bys = [i // cols for i in changed]
+    return min(bxs) * block, min(bys) * block, min(w, (max(bxs) + 1) * block), min(h, (max(bys) + 1) * block)
+
+def _add_bytes(a: bytes, b: bytes) -> bytes:
+    n = len(a)
+    hi, lo = _swar_masks(n)
+    x = int.from_bytes(a, "big")
+    y = int.from_bytes(b, "big")
+    return (((x & lo) + (y & lo)) ^ ((x ^ y) & hi)).to_bytes(n, "big")
+
+def _unfilter_row(ft: int, line: bytes, prev: bytes, bpp: int) -> bytes:
+    if ft == 0:
+        return line
+    if ft == 2:
+        return _add_bytes(line, prev)
+    cur = bytearray(line)
+    n = len(cur)
+    if ft == 1:
+        for i in range(bpp, n):
+            cur[i] = (cur[i] + cur[i - bpp]) & 0xFF
+    elif ft == 3:
+        for i in range(n):
+            cur[i] = (cur[i] + (((cur[i - bpp] if i >= bpp else 0) + prev[i]) >> 1)) & 0xFF
+    elif ft == 4:
+        for i in range(n):
+            a = cur[i - bpp] if i >= bpp else 0
+            b = prev[i]
+            c = prev[i - bpp] if i >= bpp else 0
+            p = a + b - c
+            pa = abs(p - a)
+            pb = abs(p - b)
+            pc = abs(p - c)
+            cur[i] = (cur[i] + (a if pa <= pb and pa <= pc else b if pb <= pc else c)) & 0xFF
+    else:
+        raise ValueError(f"unknown PNG filter type: {ft}")
+    return bytes(cur)
+
+def decode_png_rows(png: bytes, want: Optional[Sequence[int]] = None) -> Tuple[int, int, int, int, Optional[bytes], Dict[int, bytes]]:
+    if png[:8] != PNG_SIG:
+        raise ValueError("not a PNG image")
+    pos = 8
+    idat = []
+    palette = None
+    w = h = bit_depth = color_type = 0
+    while pos < len(png):
+        n, t = struct.unpack(">I4s", png[pos:pos + 8])
+        data = png[pos + 8:pos + 8 + n]
+        if t == b"IHDR":
+            w, h, bit_depth, color_type = struct.unpack(">IIBB", data[:10])
+        elif t == b"PLTE":
+            palette = data
+        elif t == b"IDAT":
+            idat.append(data)
+        elif t == b"IEND":
+            break
+        pos += 12 + n
+    channels = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}[color_type]
+    row_bytes = (w * channels * bit_depth + 7) // 8
+    bpp = max(1, channels * bit_depth // 8)
+    raw = zlib.decompress(b"".join(idat))
+    wanted = set(range(h) if want is None else want)
+    last = max(wanted) if wanted else -1
+    rows: Dict[int, bytes] = {}
+    prev = bytes(row_bytes)
+    stride = row_bytes + 1
+    for y in range(last + 1):
+        off = y * stride
+        prev = _unfilter_row(raw[off], raw[off + 1:off + stride], prev, bpp)
+        if y in wanted:
+            rows[y] = prev
+    return w, h, color_type, bit_depth, palette, rows
+
+def _grid_points(n: int, cells: int, samples: int) -> List[int]:
+    return [min(n - 1, ((i * 2 + 1) * n) // (cells * samples * 2)) for i in range(cells * samples)]
+
+def png_gray_grid(png: bytes, cols: int, rows: int, samples: int = 4) -> List[int]:
+    w, h = struct.unpack(">II", png[16:24])
+    ys = _grid_points(h, rows, samples)
+    xs = _grid_points(w, cols, samples)
+    _, _, color_type, bit_depth, palette, lines = decode_png_rows(png, ys)
+    if color_type == 3:
+        pal = palette or b""
+        lut = [gray_of(pal[i], pal[i + 1], pal[i + 2]) for i in range(0, len(pal) - 2, 3)]
+        lut += [0] * (256 - len(lut))
+
+    def gray(line: bytes, x: int) -> int:
+        if color_type == 2 or color_type == 6:
+            i = x * (3 if color_type == 2 else 4)
+            return gray_of(line[i], line[i + 1], line[i + 2])
+        if color_type == 3:
+            return lut[line[x] if bit_depth == 8 else (line[x >> 1] >> (4 - 4 * (x & 1))) & 0x0F]
+        return line[x * (2 if color_type == 4 else 1)]
+
+    grid = []
+    for gy in range(rows):
+        cell_ys = ys[gy * samples:(gy + 1) * samples]
+        for gx in range(cols):
+            total = 0
+            for y in cell_ys:
+                line = lines[y]
+                for x in xs[gx * samples:(gx + 1) * samples]:
+                    total += gray(line, x)
+            grid.append(total // (samples * samples))
+    return grid
+
+def dhash_png(png: bytes, size: int = 8) -> int:
+    grid = png_gray_grid(png, size + 1, size)
+    bits = 0
+    for y in range(size):
+        row = grid[y * (size + 1):(y + 1) * (size + 1)]
+        for x in range(size):
+            bits = (bits << 1) | (row[x] > row[x + 1])
+    return bits
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
@@ -0,0 +1,183 @@
+# inputs.py
+from __future__ import annotations
+import time
+import ctypes
+from ctypes import wintypes
+from typing import Any, Iterable, List, Tuple
+
+try:
+    ULONG_PTR = wintypes.ULONG_PTR
+except AttributeError:
+    ULONG_PTR = ctypes.c_ulonglong if ctypes.sizeof(ctypes.c_void_p) == 8 else ctypes.c_ulong
+
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_WHEEL = 0x0800
+VK_TAB = 0x09
+VK_RETURN = 0x0D
+MAX_BATCH_EVENTS = 64
+CHUNK_PACING = 0.01
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD), ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
+
+class HARDWAREINPUT(ctypes.Structure):
+    _fields_ = [("uMsg", wintypes.DWORD), ("wParamL", wintypes.WORD), ("wParamH", wintypes.WORD)]
+
+class INPUT_I(ctypes.Union):
+    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
+
+class INPUT(ctypes.Structure):
+    _fields_ = [("type", wintypes.DWORD), ("ii", INPUT_I)]
+
+KeyEvent = Tuple[int, int, int]
+
+def norm_to_screen_px(xn: float, yn: float, screen_w: int, screen_h: int) -> Tuple[int, int]:
+    if xn < 0.0:
+        xn = 0.0
+    elif xn > 1000.0:
+        xn = 1000.0
+    if yn < 0.0:
+        yn = 0.0
+    elif yn > 1000.0:
+        yn = 1000.0
+    x = int(round((xn / 1000.0) * (screen_w - 1)))
+    y = int(round((yn / 1000.0) * (screen_h - 1)))
+    return x, y
+
+def norm_rect_to_screen_px(x0n: float, y0n: float, x1n: float, y1n: float, screen_w: int, screen_h: int, min_px: int = 1) -> Tuple[int, int, int, int]:
+    x0, y0 = norm_to_screen_px(min(x0n, x1n), min(y0n, y1n), screen_w, screen_h)
+    x1, y1 = norm_to_screen_px(max(x0n, x1n), max(y0n, y1n), screen_w, screen_h)
+    x1, y1 = x1 + 1, y1 + 1
+    min_w, min_h = min(min_px, screen_w), min(min_px, screen_h)
+    if x1 - x0 < min_w:
+        x0 = max(0, min(screen_w - min_w, (x0 + x1 - min_w) // 2))
+        x1 = x0 + min_w
+    if y1 - y0 < min_h:
+        y0 = max(0, min(screen_h - min_h, (y0 + y1 - min_h) // 2))
+        y1 = y0 + min_h
+    return x0, y0, x1, y1
+
+def text_to_key_events(text: str) -> List[KeyEvent]:
+    events: List[KeyEvent] = []
+    text = text.replace("\r\n", "\n").replace("\r", "\n")
+    for ch in text:
+        if ch == "\n" or ch == "\t":
+            vk = VK_RETURN if ch == "\n" else VK_TAB
+            events.append((vk, 0, 0))
+            events.append((vk, 0, KEYEVENTF_KEYUP))
+            continue
+        units = ch.encode("utf-16-le")
+        for i in range(0, len(units), 2):
+            unit = units[i] | units[i + 1] << 8
+            events.append((0, unit, KEYEVENTF_UNICODE))
+            events.append((0, unit, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
+    return events
+
+def key_events_to_text(events: Iterable[KeyEvent]) -> str:
+    units = []
+    for vk, scan, flags in events:
+        if flags & KEYEVENTF_KEYUP:
+            continue
+        if flags & KEYEVENTF_UNICODE:
+            units.append(scan)
+        elif vk == VK_RETURN:
+            units.append(0x0A)
+        elif vk == VK_TAB:
+            units.append(0x09)
+    return b"".join(u.to_bytes(2, "little") for u in units).decode("utf-16-le", "replace")
+
+def chunk_key_events(events: List[KeyEvent], max_events: int = MAX_BATCH_EVENTS) -> List[List[KeyEvent]]:
+    chunks = []
+    start = 0
+    n = len(events)
+    while start < n:
+        end = min(n, start + max(4, max_events))
+        if end < n and events[end - 1][2] & KEYEVENTF_KEYUP == 0:
+            end -= 1
+        if end < n and 0xD800 <= events[end - 1][1] <= 0xDBFF and events[end - 1][2] & KEYEVENTF_UNICODE:
+            end -= 2
+        if end <= start:
+            end = min(n, start + max(4, max_events))
+        chunks.append(events[start:end])
+        start = end
+    return chunks
+
+def build_input_array(events: List[KeyEvent]) -> Any:
+    arr = (INPUT * len(events))()
+    for inp, (vk, scan, flags) in zip(arr, events):
+        inp.type = INPUT_KEYBOARD
+        ki = inp.ii.ki
+        ki.wVk = vk
+        ki.wScan = scan
+        ki.dwFlags = flags
+    return arr
+
+class InputBackend:
+    max_batch_events = MAX_BATCH_EVENTS
+    chunk_pacing = CHUNK_PACING
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        raise NotImplementedError
+
+    def click_mouse(self) -> None:
+        raise NotImplementedError
+
+    def scroll_down(self) -> None:
+        raise NotImplementedError
+
+    def send_key_events(self, events: List[KeyEvent]) -> None:
+        raise NotImplementedError
+
+    def pause(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+    def type_text(self, text: str) -> None:
+        chunks = chunk_key_events(text_to_key_events(text), self.max_batch_events)
+        for i, chunk in enumerate(chunks):
+            if i and self.chunk_pacing > 0:
+                self.pause(self.chunk_pacing)
+            self.send_key_events(chunk)
+
+class RecordingInput(InputBackend):
+    def __init__(self, screen_w: int = 1920, screen_h: int = 1080, build_arrays: bool = False) -> None:
+        self.screen_w = screen_w
+        self.screen_h = screen_h
+        self.build_arrays = build_arrays
+        self.cursor = (0, 0)
+        self.log: List[Tuple[Any, ...]] = []
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.screen_w, self.screen_h
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        self.cursor = norm_to_screen_px(xn, yn, self.screen_w, self.screen_h)
+        self.log.append(("move", self.cursor[0], self.cursor[1]))
+        return self.screen_w, self.screen_h
+
+    def click_mouse(self) -> None:
+        self.log.append(("click", self.cursor[0], self.cursor[1]))
+
+    def scroll_down(self) -> None:
+        self.log.append(("scroll", -120))
+
+    def send_key_events(self, events: List[KeyEvent]) -> None:
+        if self.build_arrays:
+            build_input_array(events)
+        self.log.append(("keys", list(events)))
+
+    def pause(self, seconds: float) -> None:
+        self.log.append(("pause", seconds))
+
+    def typed_text(self) -> str:
+        return key_events_to_text(ev for entry in self.log if entry[0] == "keys" for ev in entry[1])
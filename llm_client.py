@@ -1,11 +1,622 @@
 # llm_client.py
 from __future__ import annotations
+import io
 import json
-import urllib.request
-from typing import Any, Dict
-
-def post_to_lm(payload: Dict[str, Any], endpoint: str, timeout: int) -> Dict[str, Any]:
-    data = json.dumps(payload).encode("utf-8")
-    req = urllib.request.Request(endpoint, data=data, headers={"Content-Type": "application/json"}, method="POST")
-    with urllib.request.urlopen(req, timeout=timeout) as resp:
-        return json.loads(resp.read().decode("utf-8"))
+import gzip
+import base64
+import time
+import socket
+import threading
+import http.client
+import urllib.error
+import urllib.parse
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Tuple, Union
+
+from tracing import percentile
+
+RETRY_STATUSES = (429, 502, 503, 504)
+TRANSIENT_ERRORS = (ConnectionError, http.client.IncompleteRead, http.client.BadStatusLine)
+
+B64_CHUNK = 3 * 16384
+MERGE_MAX_BYTES = 16384
+HEDGE_MIN_SAMPLES = 5
+LATENCY_WINDOW = 64
+
+class StaleConnection(Exception):
+    pass
+
+class ImageData:
+    __slots__ = ("data", "mime")
+
+    def __init__(self, data: bytes, mime: str = "image/png") -> None:
+        self.data = data
+        self.mime = mime
+
+    def prefix(self) -> bytes:
+        return f"data:{self.mime};base64,".encode("ascii")
+
+    def to_url(self) -> str:
+        return (self.prefix() + base64.b64encode(self.data)).decode("ascii")
+
+    def json_len(self) -> int:
+        return len(self.prefix()) + 4 * ((len(self.data) + 2) // 3) + 2
+
+    def iter_json(self, chunk: int = B64_CHUNK) -> Iterator[bytes]:
+        yield b'"' + self.prefix()
+        mv = memoryview(self.data)
+        for i in range(0, len(mv), chunk):
+            yield base64.b64encode(mv[i:i + chunk])
+        yield b'"'
+
+def _json_default(o: Any) -> Any:
+    if isinstance(o, ImageData):
+        return o.to_url()
+    raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+
+def dumps_payload(payload: Dict[str, Any]) -> bytes:
+    return json.dumps(payload, default=_json_default).encode("utf-8")
+
+class StreamBody:
+    def __init__(self, parts: List[Any]) -> None:
+        self.parts = parts
+        self.length = sum(len(p) if isinstance(p, bytes) else p.json_len() for p in parts)
+
+    def __len__(self) -> int:
+        return self.length
+
+    def __iter__(self) -> Iterator[bytes]:
+        for p in self.parts:
+            if isinstance(p, bytes):
+                yield p
+            else:
+                yield from p.iter_json()
+
+    def getvalue(self) -> bytes:
+        return b"".join(self)
+
+class PayloadBuilder:
+    _MARK = "\x00msg\x00"
+    _IMG = "\x00img\x00"
+
+    def __init__(self) -> None:
+        self._cache: Dict[int, Tuple[Dict[str, Any], List[Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _fragment(self, msg: Dict[str, Any]) -> List[Any]:
+        hit = self._cache.get(id(msg))
+        if hit is not None and hit[0] is msg:
+            self.hits += 1
+            return hit[1]
+        self.misses += 1
+        images: List[ImageData] = []
+        def mark(o: Any) -> Any:
+            if isinstance(o, ImageData):
+                images.append(o)
+                return self._IMG
+            raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
+        text = json.dumps(msg, default=mark)
+        token = json.dumps(self._IMG)
+        pieces = text.split(token)
+        frag: List[Any] = [pieces[0].encode("utf-8")]
+        for img, piece in zip(images, pieces[1:]):
+            frag.append(img)
+            frag.append(piece.encode("utf-8"))
+        self._cache[id(msg)] = (msg, frag)
+        return frag
+
+    def build(self, payload: Dict[str, Any]) -> StreamBody:
+        messages = payload.get("messages") or []
+        head, tail = json.dumps({**payload, "messages": [self._MARK]}).split(json.dumps([self._MARK]), 1)
+        parts: List[Any] = [(head + "[").encode("utf-8")]
+        live = set()
+        for i, msg in enumerate(messages):
+            if i:
+                parts.append(b", ")
+            parts.extend(self._fragment(msg))
+            live.add(id(msg))
+        parts.append(("]" + tail).encode("utf-8"))
+        for k in [k for k in self._cache if k not in live]:
+            del self._cache[k]
+        merged: List[Any] = []
+        run: List[bytes] = []
+        for p in parts:
+            if isinstance(p, bytes) and len(p) < MERGE_MAX_BYTES:
+                run.append(p)
+                continue
+            if run:
+                merged.append(b"".join(run))
+                run = []
+            merged.append(p)
+        if run:
+            merged.append(b"".join(run))
+        return StreamBody(merged)
+
+class LMClient:
+    def __init__(self, endpoint: str, timeout: float = 240, retries: int = 2, backoff: float = 0.5, gzip_body: bool = False, nodelay: bool = True, sndbuf: int = 0, rcvbuf: int = 0, max_idle: int = 4, incremental_body: bool = False) -> None:
+        u = urllib.parse.urlsplit(endpoint)
+        self.endpoint = endpoint
+        self.https = u.scheme == "https"
+        self.host = u.hostname or "localhost"
+        self.port = u.port or (443 if self.https else 80)
+        self.path = (u.path or "/") + ("?" + u.query if u.query else "")
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.gzip_body = gzip_body
+        self.nodelay = nodelay
+        self.sndbuf = sndbuf
+        self.rcvbuf = rcvbuf
+        self.max_idle = max_idle
+        self.builder = PayloadBuilder() if incremental_body else None
+        self._idle: List[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self.last_timing: Dict[str, Any] = {}
+        self.requests = 0
+        self.connects = 0
+        self.retried = 0
+        self.totals: Dict[str, float] = {"connect_s": 0.0, "send_s": 0.0, "ttfb_s": 0.0, "recv_s": 0.0, "total_s": 0.0, "bytes_sent": 0, "bytes_recv": 0}
+
+    def _connect(self) -> http.client.HTTPConnection:
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        conn = cls(self.host, self.port, timeout=self.timeout)
+        conn.connect()
+        sock = conn.sock
+        if self.nodelay:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.sndbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+        if self.rcvbuf:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        self.connects += 1
+        return conn
+
+    def _acquire(self) -> Tuple[http.client.HTTPConnection, bool, float]:
+        with self._lock:
+            if self._idle:
+                return self._idle.pop(), True, 0.0
+        t0 = time.perf_counter()
+        conn = self._connect()
+        return conn, False, time.perf_counter() - t0
+
+    def _release(self, conn: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def encode_body(self, payload: Dict[str, Any]) -> Tuple[Any, Dict[str, str]]:
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        if self.builder is not None:
+            body = self.builder.build(payload)
+            if not self.gzip_body:
+                headers["Content-Length"] = str(len(body))
+                return body, headers
+            body = body.getvalue()
+        else:
+            body = dumps_payload(payload)
+        if self.gzip_body:
+            body = gzip.compress(body, 5)
+            headers["Content-Encoding"] = "gzip"
+        return body, headers
+
+    def _attempt(self, body: bytes, headers: Dict[str, str]) -> Tuple[int, Any, bytes, Dict[str, Any]]:
+        conn, reused, connect_s = self._acquire()
+        timing: Dict[str, Any] = {"reused": reused, "connect_s": connect_s}
+        try:
+            t0 = time.perf_counter()
+            conn.request("POST", self.path, body=body, headers=headers)
+            t1 = time.perf_counter()
+            resp = conn.getresponse()
+            t2 = time.perf_counter()
+            data = resp.read()
+            t3 = time.perf_counter()
+        except (ConnectionError, http.client.BadStatusLine) as e:
+            conn.close()
+            if reused:
+                raise StaleConnection() from e
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        if resp.getheader("Content-Encoding", "").lower() == "gzip":
+            data = gzip.decompress(data)
+        if resp.will_close:
+            conn.close()
+        else:
+            self._release(conn)
+        timing.update({"send_s": t1 - t0, "ttfb_s": t2 - t1, "recv_s": t3 - t2, "bytes_sent": len(body), "bytes_recv": len(data)})
+        return resp.status, resp, data, timing
+
+    def _retry(self, attempt: int) -> bool:
+        if attempt >= self.retries:
+            return False
+        time.sleep(self.backoff * (2 ** attempt))
+        self.retried += 1
+        return True
+
+    def post_raw(self, body: Any, headers: Dict[str, str]) -> bytes:
+        t_start = time.perf_counter()
+        attempt = 0
+        while True:
+            try:
+                status, resp, data, timing = self._attempt(body, headers)
+            except StaleConnection:
+                continue
+            except TRANSIENT_ERRORS:
+                if not self._retry(attempt):
+                    raise
+                attempt += 1
+                continue
+            if status in RETRY_STATUSES and self._retry(attempt):
+                attempt += 1
+                continue
+            break
+        timing["total_s"] = time.perf_counter() - t_start
+        timing["attempts"] = attempt + 1
+        self.requests += 1
+        self.last_timing = timing
+        for k in self.totals:
+            self.totals[k] += timing[k]
+        if status >= 400:
+            raise urllib.error.HTTPError(self.endpoint, status, resp.reason, resp.headers, io.BytesIO(data))
+        return data
+
+    def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        body, headers = self.encode_body(payload)
+        data = self.post_raw(body, headers)
+        t0 = time.perf_counter()
+        resp = json.loads(data.decode("utf-8"))
+        self.last_timing["parse_s"] = time.perf_counter() - t0
+        return resp
+
+    def post_stream(self, payload: Dict[str, Any], on_tool_call: Optional[Callable[[Dict[str, Any]], Any]] = None, stop_after_tool: bool = False) -> Dict[str, Any]:
+        payload = {**payload, "stream": True, "stream_options": {"include_usage": True}}
+        body, headers = self.encode_body(payload)
+        headers["Accept"] = "text/event-stream"
+        t_start = time.perf_counter()
+        attempt = 0
+        while True:
+            conn, reused, connect_s = self._acquire()
+            try:
+                t0 = time.perf_counter()
+                conn.request("POST", self.path, body=body, headers=headers)
+                t1 = time.perf_counter()
+                resp = conn.getresponse()
+                t2 = time.perf_counter()
+            except TRANSIENT_ERRORS:
+                conn.close()
+                if reused:
+                    continue
+                if not self._retry(attempt):
+                    raise
+                attempt += 1
+                continue
+            except BaseException:
+                conn.close()
+                raise
+            if resp.status in RETRY_STATUSES and attempt < self.retries:
+                resp.read()
+                if resp.will_close:
+                    conn.close()
+                else:
+                    self._release(conn)
+                self._retry(attempt)
+                attempt += 1
+                continue
+            break
+        timing: Dict[str, Any] = {"reused": reused, "connect_s": connect_s, "send_s": t1 - t0, "ttfb_s": t2 - t1, "bytes_sent": len(body), "ttft_s": None, "tool_call_s": None}
+        if resp.status >= 400:
+            data = resp.read()
+            conn.close()
+            raise urllib.error.HTTPError(self.endpoint, resp.status, resp.reason, resp.headers, io.BytesIO(data))
+        stream = StreamAssembler()
+        recv = 0
+        stopped = False
+        try:
+            while True:
+                line = resp.readline()
+                if not line:
+                    break
+                recv += len(line)
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    break
+                ready = stream.feed(json.loads(data.decode("utf-8")))
+                if timing["ttft_s"] is None and stream.started:
+                    timing["ttft_s"] = time.perf_counter() - t0
+                for tc in ready:
+                    if timing["tool_call_s"] is None:
+                        timing["tool_call_s"] = time.perf_counter() - t0
+                    if on_tool_call is not None:
+                        on_tool_call(tc)
+                if ready and stop_after_tool:
+                    stopped = True
+                    break
+            for tc in ([] if stopped else stream.finish()):
+                if timing["tool_call_s"] is None:
+                    timing["tool_call_s"] = time.perf_counter() - t0
+                if on_tool_call is not None:
+                    on_tool_call(tc)
+        except BaseException:
+            conn.close()
+            raise
+        if stopped or resp.will_close:
+            conn.close()
+        else:
+            resp.read()
+            self._release(conn)
+        timing.update({"recv_s": time.perf_counter() - t2, "bytes_recv": recv, "total_s": time.perf_counter() - t_start, "attempts": attempt + 1, "stopped_early": stopped})
+        self.requests += 1
+        self.last_timing = timing
+        for k in self.totals:
+            self.totals[k] += timing[k]
+        return stream.response(complete_only=stopped)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, "connects": self.connects, "retried": self.retried, **self.totals}
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+class StreamAssembler:
+    def __init__(self) -> None:
+        self.role = "assistant"
+        self.content: List[str] = []
+        self.calls: Dict[int, Dict[str, Any]] = {}
+        self.dispatched: set = set()
+        self.finish_reason: Optional[str] = None
+        self.usage: Optional[Dict[str, Any]] = None
+        self.extra: Dict[str, Any] = {}
+        self.started = False
+
+    def _complete(self, idx: int) -> Optional[Dict[str, Any]]:
+        if idx in self.dispatched or idx not in self.calls:
+            return None
+        self.dispatched.add(idx)
+        return self.tool_call(idx)
+
+    def tool_call(self, idx: int) -> Dict[str, Any]:
+        c = self.calls[idx]
+        return {"id": c["id"] or f"call_{idx}", "type": "function", "function": {"name": c["name"], "arguments": "".join(c["arguments"])}}
+
+    def feed(self, chunk: Dict[str, Any]) -> List[Dict[str, Any]]:
+        ready = []
+        for k in ("id", "model", "created", "object"):
+            if k in chunk and k not in self.extra:
+                self.extra[k] = chunk[k]
+        if chunk.get("usage"):
+            self.usage = chunk["usage"]
+        for choice in chunk.get("choices") or []:
+            delta = choice.get("delta") or {}
+            if delta.get("role"):
+                self.role = delta["role"]
+            if delta.get("content"):
+                self.started = True
+                self.content.append(delta["content"])
+            for tcd in delta.get("tool_calls") or []:
+                self.started = True
+                idx = tcd.get("index", len(self.calls))
+                if idx not in self.calls:
+                    for prev in sorted(self.calls):
+                        tc = self._complete(prev)
+                        if tc is not None:
+                            ready.append(tc)
+                    self.calls[idx] = {"id": None, "name": "", "arguments": []}
+                c = self.calls[idx]
+                if tcd.get("id"):
+                    c["id"] = tcd["id"]
+                fn = tcd.get("function") or {}
+                if fn.get("name"):
+                    c["name"] += fn["name"]
+                if fn.get("arguments"):
+                    c["arguments"].append(fn["arguments"])
+                    if fn["arguments"].rstrip().endswith("}") and idx not in self.dispatched:
+                        try:
+                            json.loads("".join(c["arguments"]))
+                        except ValueError:
+                            pass
+                        else:
+                            ready.append(self._complete(idx))
+            if choice.get("finish_reason"):
+                self.finish_reason = choice["finish_reason"]
+        return ready
+
+    def finish(self) -> List[Dict[str, Any]]:
+        out = []
+        for idx in sorted(self.calls):
+            tc = self._complete(idx)
+            if tc is not None:
+                out.append(tc)
+        return out
+
+    def response(self, complete_only: bool = False) -> Dict[str, Any]:
+        msg: Dict[str, Any] = {"role": self.role, "content": "".join(self.content) or None}
+        idxs = [i for i in sorted(self.calls) if i in self.dispatched or not complete_only]
+        if idxs:
+            msg["tool_calls"] = [self.tool_call(i) for i in idxs]
+        out = {**self.extra, "choices": [{"index": 0, "message": msg, "finish_reason": self.finish_reason}]}
+        if self.usage is not None:
+            out["usage"] = self.usage
+        return out
+
+def is_endpoint_failure(e: BaseException) -> bool:
+    if isinstance(e, urllib.error.HTTPError):
+        return e.code >= 500 or e.code in RETRY_STATUSES
+    return isinstance(e, (OSError, http.client.HTTPException, ValueError))
+
+class Endpoint:
+    def __init__(self, url: str, client: LMClient) -> None:
+        self.url = url
+        self.client = client
+        self.ewma_s: Optional[float] = None
+        self.recent: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.failures = 0
+        self.open_until = 0.0
+        self.trips = 0
+        self.requests = 0
+        self.errors = 0
+        self.wins = 0
+        self.inflight = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {"endpoint": self.url, "requests": self.requests, "wins": self.wins, "errors": self.errors, "trips": self.trips, "ewma_s": self.ewma_s, "p50_s": percentile(sorted(self.recent), 50)}
+
+class EndpointPool:
+    def __init__(self, endpoints: List[str], timeout: float = 240, hedge: bool = False, hedge_percentile: float = 90.0, hedge_min_s: float = 0.05, hedge_initial_s: float = 2.0, ewma_alpha: float = 0.3, breaker_failures: int = 3, breaker_cooldown_s: float = 30.0, clock: Callable[[], float] = time.monotonic, **client_kwargs: Any) -> None:
+        if not endpoints:
+            raise ValueError("EndpointPool needs at least one endpoint")
+        self.endpoints = [Endpoint(url, LMClient(url, timeout, **client_kwargs)) for url in endpoints]
+        self.hedge = hedge and len(endpoints) > 1
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_s = hedge_min_s
+        self.hedge_initial_s = hedge_initial_s
+        self.ewma_alpha = ewma_alpha
+        self.breaker_failures = breaker_failures
+        self.breaker_cooldown_s = breaker_cooldown_s
+        self.clock = clock
+        self.last_timing: Dict[str, Any] = {}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2 * len(endpoints), thread_name_prefix="lm-pool")
+
+    def ranked(self) -> List[Endpoint]:
+        now = self.clock()
+        with self._lock:
+            closed = [ep for ep in self.endpoints if ep.open_until <= now]
+            if not closed:
+                return sorted(self.endpoints, key=lambda ep: ep.open_until)
+            return sorted(closed, key=lambda ep: (ep.ewma_s or 0.0) * (1 + ep.inflight))
+
+    def hedge_delay(self, ep: Endpoint) -> float:
+        with self._lock:
+            if len(ep.recent) < HEDGE_MIN_SAMPLES:
+                return max(self.hedge_min_s, self.hedge_initial_s)
+            return max(self.hedge_min_s, percentile(sorted(ep.recent), self.hedge_percentile))
+
+    def _succeeded(self, ep: Endpoint, dur_s: float) -> None:
+        with self._lock:
+            ep.ewma_s = dur_s if ep.ewma_s is None else ep.ewma_s + self.ewma_alpha * (dur_s - ep.ewma_s)
+            ep.recent.append(dur_s)
+            ep.failures = 0
+            ep.open_until = 0.0
+
+    def _failed(self, ep: Endpoint) -> None:
+        with self._lock:
+            ep.errors += 1
+            ep.failures += 1
+            if ep.failures >= self.breaker_failures or ep.open_until > 0:
+                ep.open_until = self.clock() + self.breaker_cooldown_s
+                ep.trips += 1
+
+    def _call(self, ep: Endpoint, fn: Callable[[Endpoint], Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        with self._lock:
+            ep.requests += 1
+            ep.inflight += 1
+        t0 = time.perf_counter()
+        try:
+            resp = fn(ep)
+            timing = dict(ep.client.last_timing)
+        except BaseException as e:
+            if is_endpoint_failure(e):
+                self._failed(ep)
+            raise
+        finally:
+            with self._lock:
+                ep.inflight -= 1
+        self._succeeded(ep, time.perf_counter() - t0)
+        return resp, timing
+
+    def _race(self, fn: Callable[[Endpoint], Dict[str, Any]], winner: Dict[str, Any]) -> Dict[str, Any]:
+        backups = self.ranked()
+        primary = backups.pop(0)
+        pending: Dict[Future, Endpoint] = {self._executor.submit(self._call, primary, fn): primary}
+        deadline = self.hedge_delay(primary) if self.hedge and backups else None
+        hedged = False
+        error: Optional[BaseException] = None
+        while pending:
+            done, _ = wait(pending, timeout=deadline, return_when=FIRST_COMPLETED)
+            if not done:
+                ep = backups.pop(0)
+                pending[self._executor.submit(self._call, ep, fn)] = ep
+                deadline = None
+                hedged = True
+                self.hedges += 1
+                continue
+            for fut in done:
+                ep = pending.pop(fut)
+                try:
+                    resp, timing = fut.result()
+                except BaseException as e:
+                    if not is_endpoint_failure(e):
+                        raise
+                    error = e
+                    if not pending and backups and "ep" not in winner:
+                        nxt = backups.pop(0)
+                        pending[self._executor.submit(self._call, nxt, fn)] = nxt
+                        self.failovers += 1
+                    continue
+                with self._lock:
+                    won = winner.setdefault("ep", ep) is ep
+                    if won:
+                        ep.wins += 1
+                if not won:
+                    continue
+                if ep is not primary:
+                    self.hedge_wins += hedged
+                self.last_timing = dict(timing, endpoint=ep.url, hedged=hedged)
+                return resp
+        assert error is not None
+        raise error
+
+    def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._race(lambda ep: ep.client.post(payload), {})
+
+    def post_stream(self, payload: Dict[str, Any], on_tool_call: Optional[Callable[[Dict[str, Any]], Any]] = None, stop_after_tool: bool = False) -> Dict[str, Any]:
+        winner: Dict[str, Any] = {}
+
+        def call(ep: Endpoint) -> Dict[str, Any]:
+            def gated(tc: Dict[str, Any]) -> None:
+                with self._lock:
+                    won = winner.setdefault("ep", ep) is ep
+                if won and on_tool_call is not None:
+                    on_tool_call(tc)
+            return ep.client.post_stream(payload, gated, stop_after_tool)
+
+        return self._race(call, winner)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"requests": 0, "connects": 0, "retried": 0}
+        for ep in self.endpoints:
+            for k, v in ep.client.stats().items():
+                out[k] = out.get(k, 0) + v
+        out.update({"hedges": self.hedges, "hedge_wins": self.hedge_wins, "failovers": self.failovers, "endpoints": [ep.stats() for ep in self.endpoints]})
+        return out
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+        for ep in self.endpoints:
+            ep.client.close()
+
+_clients: Dict[Tuple[Any, float], Any] = {}
+
+def get_client(endpoint: Union[str, List[str]], timeout: float) -> Any:
+    key = (endpoint if isinstance(endpoint, str) else tuple(endpoint), timeout)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = LMClient(endpoint, timeout) if isinstance(endpoint, str) else EndpointPool(list(endpoint), timeout)
+    return client
+
+def post_to_lm(payload: Dict[str, Any], endpoint: Union[str, List[str]], timeout: int) -> Dict[str, Any]:
+    return get_client(endpoint, timeout).post(payload)
@@ -5,38 +5,101 @@
 from __future__ import annotations
 import os
 import sys
+from typing import Any, Dict
 
-import winapi
 from scenario import parse_cli, load_scenario
 from agent import run_agent
 
-def main() -> None:
-    if os.name != "nt":
-        sys.exit("Windows required")
-
-    winapi.init_dpi()
-
-    cli = parse_cli(sys.argv)
-    system_prompt, task_prompt, tools_schema = load_scenario(cli["scenario_file"], cli["scenario_num"])
-
-    cfg = {
+def default_cfg() -> Dict[str, Any]:
+    return {
         "endpoint": "http://localhost:1234/v1/chat/completions",
         "model_id": "qwen/qwen3-vl-2b-instruct",
         "timeout": 240,
+        "http_retries": 2,
+        "http_gzip": False,
+        "stream": False,
+        "stream_early_stop": False,
+        "incremental_body": False,
         "temperature": 0.2,
         "max_tokens": 2048,
         "target_w": 1344,
         "target_h": 756,
+        "png_preset": "default",
+        "image_mode": "rgb",
+        "quantizer": "median_cut",
+        "frame_delta": False,
+        "delta_block": 32,
+        "dirty_crop": False,
+        "dirty_crop_max_area": 0.25,
+        "prefetch": False,
         "dump_screenshots": True,
         "dump_dir": "dumps",
         "dump_prefix": "screen_",
         "dump_start": 1,
+        "dump_archive": None,
+        "dump_delta": False,
+        "dump_keyframe_interval": 30,
+        "dump_queue": 32,
+        "dump_policy": "block",
         "keep_last_screenshots": 1,
+        "history_high_watermark": 0,
+        "measure_prefix": False,
+        "type_chunk": 64,
+        "type_pacing": 0.01,
+        "batch_actions": False,
+        "max_batch_actions": 8,
+        "batch_screenshot": False,
+        "settle": False,
+        "settle_probe_w": 64,
+        "settle_probe_h": 36,
+        "settle_policies": {},
+        "trace_path": None,
+        "record_path": None,
+        "replay_path": None,
+        "action_delay": 0.06,
+        "endpoints": None,
+        "hedge": False,
+        "hedge_percentile": 90.0,
+        "hedge_min_s": 0.05,
+        "hedge_initial_s": 2.0,
+        "ewma_alpha": 0.3,
+        "breaker_failures": 3,
+        "breaker_cooldown_s": 30.0,
+        "multires": False,
+        "overview_w": 672,
+        "overview_h": 378,
+        "zoom_max_w": 1344,
+        "zoom_max_h": 756,
+        "zoom_min_px": 64,
+        "response_cache": None,
+        "cache_max_entries": 512,
+        "cache_max_mb": 64,
+        "cache_tolerance": 4,
         "max_steps": 50,
         "step_delay": 0.4,
     }
 
-    run_agent(system_prompt, task_prompt, tools_schema, cfg)
+def main() -> None:
+    if os.name != "nt":
+        sys.exit("Windows required")
+
+    import winapi
+    winapi.init_dpi()
+
+    cli = parse_cli(sys.argv)
+    system_prompt, task_prompt, tools_schema = load_scenario(cli["scenario_file"], cli["scenario_num"])
+
+    cfg = default_cfg()
+
+    result = run_agent(system_prompt, task_prompt, tools_schema, cfg)
+    if result["batch"] is not None:
+        print(f"scenario {cli['scenario_num']}: {result['steps']} round-trips, {result['batch']['round_trips_saved']} saved by batching")
+    if "hedges" in result["llm"]:
+        print(f"scenario {cli['scenario_num']}: {result['llm']['hedges']} hedged requests ({result['llm']['hedge_wins']} won), {result['llm']['failovers']} failovers")
+    if result["dump"] is not None and (result["dump"]["dropped"] or result["dump"]["errors"]):
+        print(f"scenario {cli['scenario_num']}: screenshot dumps dropped {result['dump']['dropped']}, failed {result['dump']['errors']} ({result['dump']['last_error']})")
+    if result["cache"] is not None:
+        print(f"scenario {cli['scenario_num']}: response cache {result['cache']['hits']} hits, {result['cache']['misses']} misses")
 
 if __name__ == "__main__":
     main()
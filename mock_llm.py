@@ -0,0 +1,225 @@
+# mock_llm.py
+from __future__ import annotations
+import re
+import gzip
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+CORNERS = {
+    "top-left": (20, 20),
+    "top-right": (980, 20),
+    "bottom-left": (20, 980),
+    "bottom-right": (980, 980),
+}
+BATCHABLE = ("move_mouse", "click_mouse", "type_text", "scroll_down")
+
+def stall_every(every: int, stall_s: float) -> Callable[[int], float]:
+    return lambda idx: stall_s if every > 0 and idx % every == 0 else 0.0
+
+def fail_every(every: int, status: int = 503) -> Callable[[int], int]:
+    return lambda idx: status if every > 0 and idx % every == 0 else 0
+
+def scripted_plan(task: str, tool_names: List[str]) -> List[Tuple[str, Dict[str, Any]]]:
+    task_l = task.lower()
+    plan: List[Tuple[str, Dict[str, Any]]] = [("take_screenshot", {})]
+    if "move" in task_l or "corner" in task_l or "center" in task_l:
+        x, y = next((xy for key, xy in CORNERS.items() if key in task_l), (500, 400) if "notepad" in task_l else (500, 500))
+        if "zoom_region" in tool_names:
+            plan.append(("zoom_region", {"x0": max(0, x - 100), "y0": max(0, y - 100), "x1": min(1000, x + 100), "y1": min(1000, y + 100)}))
+        plan.append(("move_mouse", {"x": x, "y": y}))
+    if "click" in task_l or "focus" in task_l:
+        plan.append(("click_mouse", {}))
+    m = re.search(r'type\s+"([^"]*)"', task, re.IGNORECASE)
+    if m:
+        plan.append(("type_text", {"text": m.group(1)}))
+    if "scroll" in task_l:
+        plan.append(("scroll_down", {}))
+    if len(plan) > 1:
+        plan.append(("take_screenshot", {}))
+    return [(name, args) for name, args in plan if name in tool_names]
+
+def task_of(payload: Dict[str, Any]) -> str:
+    return next((m["content"] for m in payload.get("messages") or [] if m.get("role") == "user" and isinstance(m.get("content"), str)), "")
+
+def scripted_reply(payload: Dict[str, Any], max_calls: int = 1) -> Dict[str, Any]:
+    messages = payload.get("messages") or []
+    task = task_of(payload)
+    tool_names = [t["function"]["name"] for t in payload.get("tools") or []]
+    plan = scripted_plan(task, tool_names)
+    n = sum(len(m.get("tool_calls") or []) or 1 for m in messages if m.get("role") == "assistant")
+    if n >= len(plan):
+        return {"role": "assistant", "content": f"Done after {n} actions."}
+    end = n + 1
+    if plan[n][0] in BATCHABLE:
+        while end < len(plan) and end - n < max_calls:
+            end += 1
+            if plan[end - 1][0] not in BATCHABLE:
+                break
+    calls = [{"id": f"call_{i}", "type": "function", "function": {"name": name, "arguments": json.dumps(args)}} for i, (name, args) in enumerate(plan[n:end], n)]
+    return {"role": "assistant", "content": None, "tool_calls": calls}
+
+def batched_reply(max_calls: int) -> Callable[[Dict[str, Any]], Dict[str, Any]]:
+    return lambda payload: scripted_reply(payload, max_calls)
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_Server"
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        owner = self.server.owner
+        idx = owner._count(len(body))
+        if self.headers.get("Content-Encoding", "").lower() == "gzip":
+            body = gzip.decompress(body)
+        payload = json.loads(body.decode("utf-8"))
+        latency_s = owner.delay(idx) if owner.delay is not None else 0.0
+        if owner.engine is not None:
+            owner.engine.run()
+        else:
+            latency_s += owner.latency_s
+        if latency_s > 0:
+            time.sleep(latency_s)
+        status = owner.fault(owner._count_task(task_of(payload))) if owner.fault is not None else 0
+        if status:
+            self._error(status)
+            return
+        msg = owner.policy(payload)
+        finish = "tool_calls" if msg.get("tool_calls") else "stop"
+        usage = {"prompt_tokens": len(body) // 4, "completion_tokens": len(json.dumps(msg)) // 4}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        if payload.get("stream"):
+            self._stream(msg, finish, usage)
+            return
+        data = json.dumps({"id": "mock", "object": "chat.completion", "model": payload.get("model"), "choices": [{"index": 0, "message": msg, "finish_reason": finish}], "usage": usage}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _error(self, status: int) -> None:
+        data = json.dumps({"error": {"message": f"injected fault {status}", "type": "server_error"}}).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, msg: Dict[str, Any], finish: str, usage: Dict[str, int]) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def event(obj: Any) -> None:
+            line = b"data: " + (obj if isinstance(obj, bytes) else json.dumps(obj).encode("utf-8")) + b"\n\n"
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+
+        event({"id": "mock", "choices": [{"index": 0, "delta": {"role": "assistant"}}]})
+        if msg.get("content"):
+            event({"choices": [{"index": 0, "delta": {"content": msg["content"]}}]})
+        for i, tc in enumerate(msg.get("tool_calls") or []):
+            args = tc["function"]["arguments"]
+            event({"choices": [{"index": 0, "delta": {"tool_calls": [{"index": i, "id": tc["id"], "type": "function", "function": {"name": tc["function"]["name"], "arguments": ""}}]}}]})
+            for start in range(0, len(args), 8):
+                event({"choices": [{"index": 0, "delta": {"tool_calls": [{"index": i, "function": {"arguments": args[start:start + 8]}}]}}]})
+        event({"choices": [{"index": 0, "delta": {}, "finish_reason": finish}]})
+        event({"choices": [], "usage": usage})
+        event(b"[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+class BatchEngine:
+    def __init__(self, capacity: int, pass_s: float) -> None:
+        self.capacity = capacity
+        self.pass_s = pass_s
+        self.passes = 0
+        self.served = 0
+        self._queue: List[threading.Event] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(target=self._loop, name="mock-llm-engine", daemon=True)
+        self._thread.start()
+
+    def run(self) -> None:
+        done = threading.Event()
+        with self._cond:
+            self._queue.append(done)
+            self._cond.notify()
+        done.wait()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                batch, self._queue = self._queue[:self.capacity], self._queue[self.capacity:]
+                self.passes += 1
+                self.served += len(batch)
+            time.sleep(self.pass_s)
+            for done in batch:
+                done.set()
+
+    def close(self) -> None:
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    owner: "ScriptedLLMServer"
+
+class ScriptedLLMServer:
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_s: float = 0.0, policy: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None, delay: Optional[Callable[[int], float]] = None, fault: Optional[Callable[[int], int]] = None, batch_capacity: int = 0) -> None:
+        self.latency_s = latency_s
+        self.policy = policy or scripted_reply
+        self.delay = delay
+        self.fault = fault
+        self.engine = BatchEngine(batch_capacity, latency_s) if batch_capacity > 0 else None
+        self.requests = 0
+        self.bytes_recv = 0
+        self._per_task: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.owner = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def _count(self, n: int) -> int:
+        with self._lock:
+            self.requests += 1
+            self.bytes_recv += n
+            return self.requests
+
+    def _count_task(self, task: str) -> int:
+        with self._lock:
+            self._per_task[task] = self._per_task.get(task, 0) + 1
+            return self._per_task[task]
+
+    def start(self) -> "ScriptedLLMServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock-llm", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self.engine is not None:
+            self.engine.close()
+
+    def __enter__(self) -> "ScriptedLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,226 @@
+# Run with: python response_cache.py <cache_dir> [clear]
+# Example: python response_cache.py cache/responses
+
+# response_cache.py
+from __future__ import annotations
+import os
+import sys
+import copy
+import json
+import time
+import base64
+import shutil
+import hashlib
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from imaging import dhash_png, hamming
+from llm_client import ImageData
+
+IMAGE_PLACEHOLDER = "<image>"
+KEY_FIELDS = ("model", "tools", "tool_choice", "temperature", "max_tokens", "top_p")
+MAX_HASH_MEMO = 256
+
+def _image_bytes(url: Any) -> bytes:
+    if isinstance(url, ImageData):
+        return url.data
+    if isinstance(url, str) and url.startswith("data:"):
+        return base64.b64decode(url[url.index(",") + 1:])
+    return b""
+
+class ResponseCache:
+    def __init__(self, path: str, max_entries: int = 512, max_bytes: int = 64 << 20, tolerance: int = 4, hash_size: int = 8) -> None:
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.tolerance = tolerance
+        self.hash_size = hash_size
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evicted = 0
+        self.hash_s = 0.0
+        self.distances: List[int] = []
+        self._memo: Dict[bytes, int] = {}
+        self._lock = threading.Lock()
+
+    def image_hash(self, url: Any) -> int:
+        raw = url.data if isinstance(url, ImageData) else str(url).encode("ascii", "replace")
+        memo_key = hashlib.blake2b(raw, digest_size=16).digest()
+        h = self._memo.get(memo_key)
+        if h is None:
+            t0 = time.perf_counter()
+            png = _image_bytes(url)
+            h = dhash_png(png, self.hash_size) if png else 0
+            self.hash_s += time.perf_counter() - t0
+            if len(self._memo) >= MAX_HASH_MEMO:
+                self._memo.clear()
+            self._memo[memo_key] = h
+        return h
+
+    def key(self, payload: Dict[str, Any]) -> Tuple[str, List[int]]:
+        hashes: List[int] = []
+
+        def strip(o: Any) -> Any:
+            if isinstance(o, dict):
+                if o.get("type") == "image_url" and isinstance(o.get("image_url"), dict):
+                    hashes.append(self.image_hash(o["image_url"].get("url")))
+                    return {"type": "image_url", "image_url": IMAGE_PLACEHOLDER}
+                return {k: strip(v) for k, v in o.items()}
+            if isinstance(o, list):
+                return [strip(v) for v in o]
+            return o
+
+        text = {k: payload.get(k) for k in KEY_FIELDS}
+        text["messages"] = strip(payload.get("messages") or [])
+        body = json.dumps(text, sort_keys=True, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        return hashlib.blake2b(body, digest_size=16).hexdigest(), hashes
+
+    def _entries(self, text_key: str) -> List[str]:
+        prefix = text_key + "-"
+        return [name for name in os.listdir(self.path) if name.startswith(prefix) and name.endswith(".json")]
+
+    def _match(self, text_key: str, hashes: List[int]) -> Optional[Tuple[str, Dict[str, Any], int]]:
+        best = None
+        for name in self._entries(text_key):
+            try:
+                with open(os.path.join(self.path, name), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            stored = [int(h, 16) for h in entry.get("phashes", [])]
+            if len(stored) != len(hashes):
+                continue
+            dist = max((hamming(a, b) for a, b in zip(stored, hashes)), default=0)
+            if dist <= self.tolerance and (best is None or dist < best[2]):
+                best = (name, entry, dist)
+        return best
+
+    def get(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        text_key, hashes = self.key(payload)
+        with self._lock:
+            found = self._match(text_key, hashes)
+            if found is None:
+                self.misses += 1
+                return None
+            name, entry, dist = found
+            self.hits += 1
+            self.distances.append(dist)
+            try:
+                os.utime(os.path.join(self.path, name))
+            except OSError:
+                pass
+        return entry["response"]
+
+    def put(self, payload: Dict[str, Any], resp: Dict[str, Any]) -> None:
+        text_key, hashes = self.key(payload)
+        entry = {"phashes": [f"{h:x}" for h in hashes], "created": time.time(), "response": resp}
+        data = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.blake2b(",".join(entry["phashes"]).encode("ascii"), digest_size=8).hexdigest()
+        name = f"{text_key}-{digest}.json"
+        tmp = os.path.join(self.path, f".{name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with self._lock:
+            with open(tmp, "wb") as f:
+                f.write(data)
+            os.replace(tmp, os.path.join(self.path, name))
+            self.stores += 1
+            self._evict()
+
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        files = []
+        for de in os.scandir(self.path):
+            if de.name.endswith(".json") and de.is_file():
+                st = de.stat()
+                files.append((st.st_mtime, st.st_size, de.path))
+        return files
+
+    def _evict(self) -> None:
+        files = self._scan()
+        count = len(files)
+        total = sum(size for _, size, _ in files)
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        for _, size, path in sorted(files):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            count -= 1
+            total -= size
+            self.evicted += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            shutil.rmtree(self.path, ignore_errors=True)
+            os.makedirs(self.path, exist_ok=True)
+
+    def stats(self) -> Dict[str, Any]:
+        files = self._scan()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evicted": self.evicted,
+            "entries": len(files),
+            "bytes": sum(size for _, size, _ in files),
+            "max_distance": max(self.distances, default=0),
+            "hash_s": self.hash_s,
+        }
+
+class CachingClient:
+    def __init__(self, inner: Any, cache: ResponseCache) -> None:
+        self.inner = inner
+        self.cache = cache
+        self._hit_timing: Optional[Dict[str, Any]] = None
+
+    @property
+    def last_timing(self) -> Dict[str, Any]:
+        if self._hit_timing is not None:
+            return self._hit_timing
+        return getattr(self.inner, "last_timing", {})
+
+    def _cached(self, payload: Dict[str, Any], call: Callable[[], Dict[str, Any]], on_hit: Callable[[Dict[str, Any]], None]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        resp = self.cache.get(payload)
+        if resp is not None:
+            self._hit_timing = {"bytes_sent": 0, "bytes_recv": 0, "total_s": time.perf_counter() - t0, "cache": "hit"}
+            on_hit(resp)
+            return resp
+        self._hit_timing = None
+        resp = call()
+        self.cache.put(payload, copy.deepcopy(resp))
+        return resp
+
+    def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._cached(payload, lambda: self.inner.post(payload), lambda resp: None)
+
+    def post_stream(self, payload: Dict[str, Any], on_tool_call: Optional[Callable[[Dict[str, Any]], Any]] = None, stop_after_tool: bool = False) -> Dict[str, Any]:
+        def replay_calls(resp: Dict[str, Any]) -> None:
+            calls = resp["choices"][0]["message"].get("tool_calls") or []
+            if on_tool_call is not None:
+                for tc in calls[:1] if stop_after_tool else calls:
+                    on_tool_call(tc)
+
+        return self._cached(payload, lambda: self.inner.post_stream(payload, on_tool_call, stop_after_tool), replay_calls)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.inner.stats()
+
+    def close(self) -> None:
+        self.inner.close()
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python response_cache.py <cache_dir> [clear]")
+    cache = ResponseCache(sys.argv[1])
+    if sys.argv[2:] == ["clear"]:
+        cache.clear()
+    print(json.dumps(cache.stats(), indent=2))
+
+if __name__ == "__main__":
+    main()
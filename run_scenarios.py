@@ -0,0 +1,88 @@
+# Run with: python run_scenarios.py test_scenarios.txt [workers] [key=value ...]
+# Example: python run_scenarios.py test_scenarios.txt 4 png_preset=fast stream=true
+# Example: python run_scenarios.py test_scenarios.txt 4 llm_servers=3 llm_stall_every=3 llm_stall_s=1 hedge=true
+# Example: python run_scenarios.py test_scenarios.txt 4 llm_batch_calls=4 batch_actions=true
+
+# run_scenarios.py
+from __future__ import annotations
+import os
+import sys
+import time
+import tempfile
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List
+
+from scenario import list_scenarios, load_scenario
+from desktop import SimulatedDesktop
+from mock_llm import ScriptedLLMServer, batched_reply, stall_every, fail_every
+from agent import run_agent
+from main import default_cfg
+from agent_utils import parse_overrides, print_table
+
+def run_one(scenario_file: str, num: int, name: str, endpoints: List[str], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    system_prompt, task_prompt, tools_schema = load_scenario(scenario_file, num)
+    cfg = default_cfg()
+    cfg.update({"endpoint": endpoints[0], "endpoints": endpoints, "timeout": 30, "dump_screenshots": False, "dump_dir": tempfile.gettempdir(), "step_delay": 0.0})
+    cfg.update(overrides)
+    for key in ("record_path", "dump_archive"):
+        if cfg.get(key):
+            cfg[key] = cfg[key].format(scenario=num)
+    desk = SimulatedDesktop(*cfg.pop("screen_size", (1920, 1080)))
+    cfg["capture_backend"] = desk
+    cfg["input_backend"] = desk
+    row: Dict[str, Any] = {"scenario": num, "name": name[:32]}
+    t0 = time.perf_counter()
+    try:
+        result = run_agent(system_prompt, task_prompt, tools_schema, cfg)
+        error = ""
+    except Exception as e:
+        result = {"steps": 0, "llm": {}}
+        error = f"{type(e).__name__}: {e}"
+    llm = result.get("llm") or {}
+    row.update({
+        "steps": result["steps"],
+        "wall_s": time.perf_counter() - t0,
+        "bytes_sent": llm.get("bytes_sent", 0),
+        "capture_s": desk.capture_s,
+        "encode_s": desk.encode_s,
+        "llm_s": llm.get("total_s", 0.0),
+        "saved": (result.get("batch") or {}).get("round_trips_saved", 0),
+        "typed": repr(desk.typed_text()),
+        "error": error or "-",
+    })
+    return row
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python run_scenarios.py <scenario_file> [workers] [key=value ...]")
+    scenario_file = sys.argv[1]
+    rest = sys.argv[2:]
+    workers = int(rest.pop(0)) if rest and rest[0].isdigit() else (os.cpu_count() or 1)
+    overrides = parse_overrides(rest)
+    latency_s = float(overrides.pop("llm_latency_s", 0.0))
+    n_servers = int(overrides.pop("llm_servers", 1))
+    stall = stall_every(int(overrides.pop("llm_stall_every", 0)), float(overrides.pop("llm_stall_s", 0.0)))
+    fault = fail_every(int(overrides.pop("llm_fail_every", 0)))
+    batch_calls = int(overrides.pop("llm_batch_calls", 1))
+    policy = batched_reply(batch_calls) if batch_calls > 1 else None
+    scenarios = list_scenarios(scenario_file)
+    t0 = time.perf_counter()
+    with ExitStack() as stack:
+        servers = [stack.enter_context(ScriptedLLMServer(latency_s=latency_s, policy=policy, delay=stall if i == 0 else None, fault=fault if i == 0 else None)) for i in range(n_servers)]
+        endpoints = [server.endpoint for server in servers]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(run_one, scenario_file, num, name, endpoints, overrides) for num, name in scenarios]
+            rows = [f.result() for f in futures]
+    wall = time.perf_counter() - t0
+    print_table(rows)
+    print(f"{len(rows)} scenarios, {workers} workers, {wall:.2f}s wall, {sum(r['wall_s'] for r in rows):.2f}s summed, {sum(s.requests for s in servers)} LLM requests, {sum(s.bytes_recv for s in servers)} bytes received")
+    if any(r["saved"] for r in rows):
+        print(f"batching saved {sum(r['saved'] for r in rows)} LLM round trips")
+    if n_servers > 1:
+        print("requests per server: " + ", ".join(str(s.requests) for s in servers))
+    if any(r["error"] != "-" for r in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
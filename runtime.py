@@ -0,0 +1,265 @@
+# Run with: python runtime.py <scenario_file> [sessions] [key=value ...]
+# Example: python runtime.py test_scenarios.txt 8 max_concurrency=4 batch_window_s=0.02 llm_batch_capacity=8 llm_latency_s=0.2
+
+# runtime.py
+from __future__ import annotations
+import sys
+import time
+import queue
+import asyncio
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from scenario import list_scenarios, load_scenario
+from desktop import SimulatedDesktop
+from mock_llm import ScriptedLLMServer
+from agent import run_agent
+from main import default_cfg
+from llm_client import LMClient
+from tracing import percentile
+from agent_utils import parse_overrides, print_table
+
+class _Request:
+    __slots__ = ("session", "fn", "future", "t_enq", "seq")
+
+    def __init__(self, session: str, fn: Callable[[LMClient], Dict[str, Any]], future: "asyncio.Future[Tuple[Dict[str, Any], Dict[str, Any]]]", seq: int) -> None:
+        self.session = session
+        self.fn = fn
+        self.future = future
+        self.t_enq = time.perf_counter()
+        self.seq = seq
+
+class SharedLLM:
+    def __init__(self, endpoint: str, max_concurrency: int = 4, batch_window_s: float = 0.0, max_batch: int = 0, timeout: float = 240, **client_kwargs: Any) -> None:
+        self.endpoint = endpoint
+        self.max_concurrency = max_concurrency
+        self.batch_window_s = batch_window_s
+        self.max_batch = max_batch or max_concurrency
+        self.clients = [LMClient(endpoint, timeout, **client_kwargs) for _ in range(max_concurrency)]
+        self.service_s: Dict[str, float] = {}
+        self.waits: Dict[str, List[float]] = {}
+        self.batch_sizes: List[int] = []
+        self._pending: List[_Request] = []
+        self._seq = 0
+        self._free: Optional[asyncio.Queue] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="lm-shared")
+
+    async def start(self) -> None:
+        self._free = asyncio.Queue()
+        for client in self.clients:
+            self._free.put_nowait(client)
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._dispatch())
+
+    async def submit(self, session: str, fn: Callable[[LMClient], Dict[str, Any]]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        future = asyncio.get_running_loop().create_future()
+        self._seq += 1
+        self._pending.append(_Request(session, fn, future, self._seq))
+        self.service_s.setdefault(session, 0.0)
+        self._wakeup.set()
+        return await future
+
+    def _pick(self) -> _Request:
+        req = min(self._pending, key=lambda r: (self.service_s[r.session], r.seq))
+        self._pending.remove(req)
+        return req
+
+    async def _dispatch(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            while not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            if self.batch_window_s > 0:
+                deadline = loop.time() + self.batch_window_s
+                while len(self._pending) < self.max_batch:
+                    left = deadline - loop.time()
+                    if left <= 0:
+                        break
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), left)
+                    except asyncio.TimeoutError:
+                        break
+            batch = [(await self._free.get(), self._pick())]
+            while self._pending and not self._free.empty() and len(batch) < self.max_batch:
+                batch.append((self._free.get_nowait(), self._pick()))
+            self.batch_sizes.append(len(batch))
+            for client, req in batch:
+                asyncio.create_task(self._execute(client, req))
+
+    async def _execute(self, client: LMClient, req: _Request) -> None:
+        t_start = time.perf_counter()
+        queue_s = t_start - req.t_enq
+        self.waits.setdefault(req.session, []).append(queue_s)
+
+        def call() -> Tuple[Dict[str, Any], Dict[str, Any]]:
+            resp = req.fn(client)
+            return resp, dict(client.last_timing)
+
+        try:
+            resp, timing = await asyncio.get_running_loop().run_in_executor(self._executor, call)
+        except BaseException as e:
+            if not req.future.done():
+                req.future.set_exception(e)
+        else:
+            timing["queue_s"] = queue_s
+            if not req.future.done():
+                req.future.set_result((resp, timing))
+        finally:
+            self.service_s[req.session] += time.perf_counter() - t_start
+            self._free.put_nowait(client)
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {"requests": 0, "connects": 0, "retried": 0}
+        for client in self.clients:
+            for k, v in client.stats().items():
+                out[k] = out.get(k, 0) + v
+        out["batches"] = len(self.batch_sizes)
+        out["mean_batch"] = sum(self.batch_sizes) / len(self.batch_sizes) if self.batch_sizes else 0.0
+        return out
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._executor.shutdown(wait=False)
+        for client in self.clients:
+            client.close()
+
+class SessionClient:
+    def __init__(self, shared: SharedLLM, session: str, loop: asyncio.AbstractEventLoop) -> None:
+        self.shared = shared
+        self.session = session
+        self.loop = loop
+        self.last_timing: Dict[str, Any] = {}
+        self.requests = 0
+        self.totals: Dict[str, float] = {"queue_s": 0.0, "total_s": 0.0, "bytes_sent": 0, "bytes_recv": 0}
+
+    def _call(self, fn: Callable[[LMClient], Dict[str, Any]], calls: "Optional[queue.Queue[Optional[Dict[str, Any]]]]" = None, on_tool_call: Optional[Callable[[Dict[str, Any]], Any]] = None) -> Dict[str, Any]:
+        future = asyncio.run_coroutine_threadsafe(self.shared.submit(self.session, fn), self.loop)
+        if calls is not None:
+            future.add_done_callback(lambda f: calls.put(None))
+            while True:
+                tc = calls.get()
+                if tc is None:
+                    break
+                on_tool_call(tc)
+        resp, timing = future.result()
+        self.last_timing = timing
+        self.requests += 1
+        for k in self.totals:
+            self.totals[k] += timing.get(k, 0)
+        return resp
+
+    def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._call(lambda client: client.post(payload))
+
+    def post_stream(self, payload: Dict[str, Any], on_tool_call: Optional[Callable[[Dict[str, Any]], Any]] = None, stop_after_tool: bool = False) -> Dict[str, Any]:
+        if on_tool_call is None:
+            return self._call(lambda client: client.post_stream(payload, None, stop_after_tool))
+        calls: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+
+        def stream(client: LMClient) -> Dict[str, Any]:
+            try:
+                return client.post_stream(payload, calls.put, stop_after_tool)
+            finally:
+                calls.put(None)
+
+        return self._call(stream, calls, on_tool_call)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.requests, **self.totals}
+
+    def close(self) -> None:
+        pass
+
+def jain_index(values: List[float]) -> float:
+    total = sum(values)
+    squares = sum(v * v for v in values)
+    return total * total / (len(values) * squares) if squares else 1.0
+
+async def run_sessions(specs: List[Dict[str, Any]], shared: SharedLLM, workers: int = 0) -> List[Dict[str, Any]]:
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=workers or len(specs), thread_name_prefix="agent-session")
+    await shared.start()
+
+    async def one(spec: Dict[str, Any]) -> Dict[str, Any]:
+        session = spec["session"]
+        cfg = dict(spec["cfg"])
+        client = SessionClient(shared, session, loop)
+        cfg["llm_client"] = client
+        row: Dict[str, Any] = {"session": session, "scenario": spec["scenario"]}
+        t0 = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(executor, run_agent, spec["system_prompt"], spec["task_prompt"], spec["tools_schema"], cfg)
+            error = ""
+        except Exception as e:
+            result = {"steps": 0}
+            error = f"{type(e).__name__}: {e}"
+        wall = time.perf_counter() - t0
+        waits = sorted(shared.waits.get(session, []))
+        row.update({
+            "steps": result["steps"],
+            "wall_s": wall,
+            "steps_per_s": result["steps"] / wall if wall > 0 else 0.0,
+            "llm_s": shared.service_s.get(session, 0.0),
+            "queue_p50_ms": percentile(waits, 50) * 1000.0,
+            "queue_p90_ms": percentile(waits, 90) * 1000.0,
+            "error": error or "-",
+        })
+        return row
+
+    try:
+        return await asyncio.gather(*(one(spec) for spec in specs))
+    finally:
+        executor.shutdown(wait=True)
+        await shared.close()
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python runtime.py <scenario_file> [sessions] [key=value ...]")
+    scenario_file = sys.argv[1]
+    rest = sys.argv[2:]
+    n_sessions = int(rest.pop(0)) if rest and rest[0].isdigit() else 4
+    overrides = parse_overrides(rest)
+    latency_s = float(overrides.pop("llm_latency_s", 0.1))
+    batch_capacity = int(overrides.pop("llm_batch_capacity", 0))
+    max_concurrency = int(overrides.pop("max_concurrency", 4))
+    batch_window_s = float(overrides.pop("batch_window_s", 0.0))
+    max_batch = int(overrides.pop("max_batch", 0))
+    scenarios = list_scenarios(scenario_file)
+    with ScriptedLLMServer(latency_s=latency_s, batch_capacity=batch_capacity) as server:
+        specs = []
+        for i in range(n_sessions):
+            num, _ = scenarios[i % len(scenarios)]
+            system_prompt, task_prompt, tools_schema = load_scenario(scenario_file, num)
+            cfg = default_cfg()
+            cfg.update({"endpoint": server.endpoint, "timeout": 60, "dump_screenshots": False, "dump_dir": tempfile.gettempdir(), "step_delay": 0.0})
+            cfg.update(overrides)
+            desk = SimulatedDesktop(*cfg.pop("screen_size", (1920, 1080)))
+            cfg["capture_backend"] = desk
+            cfg["input_backend"] = desk
+            specs.append({"session": f"s{i + 1}", "scenario": num, "system_prompt": system_prompt, "task_prompt": task_prompt, "tools_schema": tools_schema, "cfg": cfg})
+        shared = SharedLLM(server.endpoint, max_concurrency, batch_window_s, max_batch, timeout=60, gzip_body=bool(overrides.get("http_gzip", False)))
+        t0 = time.perf_counter()
+        rows = asyncio.run(run_sessions(specs, shared))
+        wall = time.perf_counter() - t0
+    print_table(rows)
+    steps = sum(r["steps"] for r in rows)
+    llm = shared.stats()
+    print(f"{n_sessions} sessions, max_concurrency {max_concurrency}, {wall:.2f}s wall, {steps} steps, {steps / wall:.2f} steps/s aggregate")
+    print(f"LLM: {llm['requests']} requests in {llm['batches']} dispatches (mean batch {llm['mean_batch']:.2f}), fairness (Jain, steps/s) {jain_index([r['steps_per_s'] for r in rows]):.3f}")
+    if server.engine is not None:
+        print(f"server: {server.engine.served} requests in {server.engine.passes} passes")
+    if any(r["error"] != "-" for r in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
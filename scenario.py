@@ -1,40 +1,128 @@
 # scenario.py
 from __future__ import annotations
+import os
 import json
 import sys
-from typing import Any, List, Tuple
-
-def load_scenario(filename: str, scenario_num: int) -> Tuple[str, str, List[Dict[str, Any]]]:
-    with open(filename, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    shared_system_prompt = ""
-    if "=== SHARED_SYSTEM_PROMPT ===" in content:
-        parts = content.split("=== SHARED_SYSTEM_PROMPT ===", 1)
-        shared_block = parts[1].split("=== SCENARIO", 1)[0]
-        shared_system_prompt = shared_block.strip()
-
-    scenarios = content.split("=== SCENARIO ")
-    scenario_text = scenarios[scenario_num].strip()
-
-    lines = scenario_text.split("\n")
-    system_prompt = shared_system_prompt
-    task_prompt = ""
-    tools_schema = []
-
-    for line in lines:
-        stripped = line.strip()
-        if stripped.startswith("TASK_PROMPT:"):
-            task_prompt = stripped[len("TASK_PROMPT:"):].strip()
-        elif stripped.startswith("TOOLS_SCHEMA:"):
-            tools_schema = json.loads(stripped[len("TOOLS_SCHEMA:"):].strip())
-
-    if not task_prompt or not tools_schema:
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+SHARED_MARKER = b"=== SHARED_SYSTEM_PROMPT ==="
+SCENARIO_MARKER = b"=== SCENARIO "
+
+class ScenarioCatalog:
+    def __init__(self, filename: str) -> None:
+        self.filename = filename
+        st = os.stat(filename)
+        self.key = (st.st_mtime_ns, st.st_size)
+        self.system_prompt = ""
+        self.entries: List[Tuple[int, int, str]] = []
+        self.by_name: Dict[str, int] = {}
+        self._schemas: Dict[str, List[Dict[str, Any]]] = {}
+        self._schema_bytes: Dict[int, int] = {}
+        self._parsed: Dict[int, Tuple[str, List[Dict[str, Any]]]] = {}
+        self._build_index()
+
+    def _build_index(self) -> None:
+        with open(self.filename, "rb") as f:
+            content = f.read()
+        first = content.find(SCENARIO_MARKER)
+        if first < 0:
+            first = len(content)
+        shared = content.find(SHARED_MARKER, 0, first)
+        if shared >= 0:
+            self.system_prompt = content[shared + len(SHARED_MARKER):first].decode("utf-8").strip()
+        starts = []
+        pos = first
+        while pos < len(content):
+            starts.append(pos + len(SCENARIO_MARKER))
+            nxt = content.find(SCENARIO_MARKER, pos + len(SCENARIO_MARKER))
+            pos = len(content) if nxt < 0 else nxt
+        for num, start in enumerate(starts, 1):
+            end = starts[num] - len(SCENARIO_MARKER) if num < len(starts) else len(content)
+            name = ""
+            at = content.find(b"\nNAME:", start, end)
+            if at >= 0:
+                eol = content.find(b"\n", at + 1, end)
+                name = content[at + 6:end if eol < 0 else eol].decode("utf-8").strip()
+            self.entries.append((start, end, name))
+            if name:
+                self.by_name.setdefault(name.lower(), num)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def resolve(self, key: Union[int, str]) -> int:
+        if isinstance(key, str) and not key.isdigit():
+            num = self.by_name.get(key.strip().lower())
+            if num is None:
+                raise KeyError(f"Unknown scenario name: {key}")
+            return num
+        num = int(key)
+        if not 1 <= num <= len(self.entries):
+            raise KeyError(f"Unknown scenario number: {num} (1..{len(self.entries)})")
+        return num
+
+    def names(self) -> List[Tuple[int, str]]:
+        return [(num, name) for num, (_, _, name) in enumerate(self.entries, 1)]
+
+    def _intern_schema(self, raw: str) -> List[Dict[str, Any]]:
+        schema = self._schemas.get(raw)
+        if schema is None:
+            schema = self._schemas[raw] = json.loads(raw)
+            self._schema_bytes[id(schema)] = len(json.dumps(schema).encode("utf-8"))
+        return schema
+
+    def _parse(self, num: int) -> Tuple[str, List[Dict[str, Any]]]:
+        parsed = self._parsed.get(num)
+        if parsed is not None:
+            return parsed
+        start, end, _ = self.entries[num - 1]
+        with open(self.filename, "rb") as f:
+            f.seek(start)
+            block = f.read(end - start).decode("utf-8")
+        task_prompt = ""
+        tools_schema: Optional[List[Dict[str, Any]]] = None
+        for line in block.split("\n"):
+            stripped = line.strip()
+            if stripped.startswith("TASK_PROMPT:"):
+                task_prompt = stripped[len("TASK_PROMPT:"):].strip()
+            elif stripped.startswith("TOOLS_SCHEMA:"):
+                tools_schema = self._intern_schema(stripped[len("TOOLS_SCHEMA:"):].strip())
+        if not task_prompt or not tools_schema:
+            raise ValueError(f"Invalid scenario: {num}")
+        parsed = self._parsed[num] = (task_prompt, tools_schema)
+        return parsed
+
+    def load(self, key: Union[int, str]) -> Tuple[str, str, List[Dict[str, Any]]]:
+        task_prompt, tools_schema = self._parse(self.resolve(key))
+        return self.system_prompt, task_prompt, tools_schema
+
+    def info(self, key: Union[int, str]) -> Dict[str, Any]:
+        num = self.resolve(key)
+        _, tools_schema = self._parse(num)
+        return {"num": num, "name": self.entries[num - 1][2], "schema_bytes": self._schema_bytes[id(tools_schema)], "unique_schemas": len(self._schemas)}
+
+_catalogs: Dict[str, ScenarioCatalog] = {}
+
+def get_catalog(filename: str) -> ScenarioCatalog:
+    path = os.path.abspath(filename)
+    st = os.stat(path)
+    catalog = _catalogs.get(path)
+    if catalog is None or catalog.key != (st.st_mtime_ns, st.st_size):
+        catalog = _catalogs[path] = ScenarioCatalog(path)
+    return catalog
+
+def load_scenario(filename: str, scenario_num: Union[int, str]) -> Tuple[str, str, List[Dict[str, Any]]]:
+    try:
+        return get_catalog(filename).load(scenario_num)
+    except KeyError as e:
+        sys.exit(e.args[0])
+    except ValueError:
         sys.exit("Invalid scenario")
 
-    return system_prompt, task_prompt, tools_schema
+def list_scenarios(filename: str) -> List[Tuple[int, str]]:
+    return get_catalog(filename).names()
 
 def parse_cli(argv: list[str]) -> dict[str, Any]:
     if len(argv) < 3:
-        sys.exit("Usage: python main.py <scenario_file> <scenario_num>")
-    return {"scenario_file": argv[1], "scenario_num": int(argv[2])}
+        sys.exit("Usage: python main.py <scenario_file> <scenario_num|scenario_name>")
+    return {"scenario_file": argv[1], "scenario_num": int(argv[2]) if argv[2].isdigit() else argv[2]}
@@ -0,0 +1,390 @@
+# Run with: python session.py <info|replay> <archive.zip> [key=value ...]
+# Example: python session.py replay sessions/scenario_5.zip png_preset=fast
+
+# session.py
+from __future__ import annotations
+import sys
+import copy
+import json
+import time
+import hashlib
+import zipfile
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from capture import CaptureBackend, region_of
+from imaging import resize_bgra
+from inputs import InputBackend, KeyEvent
+from llm_client import dumps_payload
+from agent_utils import parse_overrides, print_table
+
+def request_digest(payload: Dict[str, Any]) -> Tuple[str, int]:
+    body = dumps_payload(payload)
+    return hashlib.blake2b(body, digest_size=16).hexdigest(), len(body)
+
+def json_safe(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    out = {}
+    for k, v in cfg.items():
+        try:
+            json.dumps(v)
+        except (TypeError, ValueError):
+            continue
+        out[k] = v
+    return out
+
+class RecordingCapture(CaptureBackend):
+    def __init__(self, inner: CaptureBackend, recorder: "SessionRecorder") -> None:
+        self.inner = inner
+        self.recorder = recorder
+
+    @property
+    def tracer(self) -> Any:
+        return self.inner.tracer
+
+    @tracer.setter
+    def tracer(self, tracer: Any) -> None:
+        self.inner.tracer = tracer
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.inner.get_screen_size()
+
+    def grab(self, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        view, screen_w, screen_h = self.inner.grab(target_w, target_h)
+        self.recorder.add_frame(view, target_w, target_h, screen_w, screen_h)
+        return view, screen_w, screen_h
+
+    def grab_region(self, x0: int, y0: int, x1: int, y1: int, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        view, screen_w, screen_h = self.inner.grab_region(x0, y0, x1, y1, target_w, target_h)
+        self.recorder.add_frame(view, target_w, target_h, screen_w, screen_h, (x0, y0, x1, y1))
+        return view, screen_w, screen_h
+
+    def encode(self, bgra: Any, w: int, h: int, png_preset: Any = "default", image_mode: str = "rgb", quantizer: str = "median_cut", out: Optional[bytearray] = None) -> bytes:
+        return self.inner.encode(bgra, w, h, png_preset, image_mode, quantizer, out)
+
+    def close(self) -> None:
+        self.inner.close()
+
+class RecordingInputs(InputBackend):
+    def __init__(self, inner: InputBackend, recorder: "SessionRecorder") -> None:
+        self.inner = inner
+        self.recorder = recorder
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.inner.get_screen_size()
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        self.recorder.add_event({"type": "action", "name": "move_mouse", "args": [xn, yn]})
+        return self.inner.move_mouse_norm(xn, yn)
+
+    def click_mouse(self) -> None:
+        self.recorder.add_event({"type": "action", "name": "click_mouse", "args": []})
+        self.inner.click_mouse()
+
+    def scroll_down(self) -> None:
+        self.recorder.add_event({"type": "action", "name": "scroll_down", "args": []})
+        self.inner.scroll_down()
+
+    def type_text(self, text: str) -> None:
+        self.recorder.add_event({"type": "action", "name": "type_text", "args": [text]})
+        self.inner.type_text(text)
+
+    def send_key_events(self, events: List[KeyEvent]) -> None:
+        self.inner.send_key_events(events)
+
+class RecordingClient:
+    def __init__(self, inner: Any, recorder: "SessionRecorder") -> None:
+        self.inner = inner
+        self.recorder = recorder
+
+    @property
+    def last_timing(self) -> Dict[str, Any]:
+        return getattr(self.inner, "last_timing", {})
+
+    def _record(self, payload: Dict[str, Any], call: Callable[[], Dict[str, Any]], stream: bool) -> Dict[str, Any]:
+        digest, size = request_digest(payload)
+        self.recorder.add_event({"type": "request", "digest": digest, "bytes": size, "messages": len(payload.get("messages") or []), "stream": stream})
+        resp = call()
+        self.recorder.add_event({"type": "response", "body": resp, "timing": json_safe(self.last_timing)})
+        return resp
+
+    def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._record(payload, lambda: self.inner.post(payload), False)
+
+    def post_stream(self, payload: Dict[str, Any], on_tool_call: Optional[Callable[[Dict[str, Any]], Any]] = None, stop_after_tool: bool = False) -> Dict[str, Any]:
+        return self._record(payload, lambda: self.inner.post_stream(payload, on_tool_call, stop_after_tool), True)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.inner.stats()
+
+    def close(self) -> None:
+        self.inner.close()
+
+class SessionRecorder:
+    def __init__(self, path: str, **meta: Any) -> None:
+        self.path = path
+        self.meta = meta
+        self.events: List[Dict[str, Any]] = []
+        self.frames: Dict[str, str] = {}
+        self.frame_bytes = 0
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._zip = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+
+    def add_event(self, event: Dict[str, Any]) -> None:
+        with self._lock:
+            event["t"] = time.perf_counter() - self._t0
+            self.events.append(event)
+
+    def add_frame(self, bgra: Any, w: int, h: int, screen_w: int, screen_h: int, region: Optional[Tuple[int, int, int, int]] = None) -> None:
+        data = bytes(bgra)
+        digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        with self._lock:
+            name = self.frames.get(digest)
+            if name is None:
+                name = self.frames[digest] = f"frames/{len(self.frames):06d}.bgra"
+                self._zip.writestr(name, data)
+                self.frame_bytes += len(data)
+        event: Dict[str, Any] = {"type": "frame", "name": name, "w": w, "h": h, "screen_w": screen_w, "screen_h": screen_h}
+        if region is not None:
+            event["region"] = list(region)
+        self.add_event(event)
+
+    def wrap_capture(self, capture: CaptureBackend) -> RecordingCapture:
+        return RecordingCapture(capture, self)
+
+    def wrap_inputs(self, inputs: InputBackend) -> RecordingInputs:
+        return RecordingInputs(inputs, self)
+
+    def wrap_client(self, client: Any) -> RecordingClient:
+        return RecordingClient(client, self)
+
+    def close(self) -> None:
+        with self._lock:
+            self._zip.writestr("events.jsonl", "".join(json.dumps(e) + "\n" for e in self.events))
+            self._zip.writestr("meta.json", json.dumps({**self.meta, "unique_frames": len(self.frames), "frame_bytes": self.frame_bytes}))
+            self._zip.close()
+
+class SessionArchive:
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._zip = zipfile.ZipFile(path, "r")
+        self.meta: Dict[str, Any] = json.loads(self._zip.read("meta.json"))
+        self.events = [json.loads(line) for line in self._zip.read("events.jsonl").decode("utf-8").splitlines() if line]
+        self._frames: Dict[str, bytes] = {}
+
+    def of_type(self, kind: str) -> List[Dict[str, Any]]:
+        return [e for e in self.events if e["type"] == kind]
+
+    def frame(self, name: str) -> bytes:
+        data = self._frames.get(name)
+        if data is None:
+            data = self._frames[name] = self._zip.read(name)
+        return data
+
+    def close(self) -> None:
+        self._zip.close()
+
+class ReplayCapture(CaptureBackend):
+    def __init__(self, archive: SessionArchive) -> None:
+        self.archive = archive
+        self.frames = archive.of_type("frame")
+        self.pos = 0
+        self.extra_grabs = 0
+        self.current: Optional[Dict[str, Any]] = self.frames[0] if self.frames else None
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        if self.current is None:
+            return 1920, 1080
+        return self.current["screen_w"], self.current["screen_h"]
+
+    def frame_at(self, fr: Dict[str, Any], target_w: int, target_h: int) -> memoryview:
+        data = self.archive.frame(fr["name"])
+        if (fr["w"], fr["h"]) != (target_w, target_h):
+            data = resize_bgra(data, fr["w"], fr["h"], target_w, target_h)
+        return memoryview(bytearray(data))
+
+    def _advance(self) -> Optional[Dict[str, Any]]:
+        if self.pos < len(self.frames):
+            self.pos += 1
+            return self.frames[self.pos - 1]
+        self.extra_grabs += 1
+        return None
+
+    def grab(self, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        fr = self._advance()
+        if fr is not None:
+            self.current = fr
+        if self.current is None:
+            raise RuntimeError("session archive has no frames")
+        return self.frame_at(self.current, target_w, target_h), self.current["screen_w"], self.current["screen_h"]
+
+    def grab_region(self, x0: int, y0: int, x1: int, y1: int, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        fr = self._advance()
+        if fr is not None and "region" in fr:
+            return self.frame_at(fr, target_w, target_h), fr["screen_w"], fr["screen_h"]
+        if fr is not None:
+            self.current = fr
+        if self.current is None:
+            raise RuntimeError("session archive has no frames")
+        screen_w, screen_h = self.current["screen_w"], self.current["screen_h"]
+        view = self.frame_at(self.current, screen_w, screen_h)
+        return region_of(view, screen_w, screen_h, x0, y0, x1, y1, target_w, target_h), screen_w, screen_h
+
+class ReplayProbe(CaptureBackend):
+    def __init__(self, source: ReplayCapture) -> None:
+        self.source = source
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.source.get_screen_size()
+
+    def grab(self, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        cur = self.source.current
+        if cur is None:
+            raise RuntimeError("session archive has no frames")
+        return self.source.frame_at(cur, target_w, target_h), cur["screen_w"], cur["screen_h"]
+
+class ReplayInputs(InputBackend):
+    def __init__(self, archive: SessionArchive, capture: ReplayCapture) -> None:
+        self.expected = archive.of_type("action")
+        self.capture = capture
+        self.pos = 0
+        self.mismatches: List[int] = []
+
+    def _check(self, name: str, args: List[Any]) -> None:
+        exp = self.expected[self.pos] if self.pos < len(self.expected) else None
+        if exp is None or exp["name"] != name or exp["args"] != args:
+            self.mismatches.append(self.pos)
+        self.pos += 1
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return self.capture.get_screen_size()
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        self._check("move_mouse", [xn, yn])
+        return self.get_screen_size()
+
+    def click_mouse(self) -> None:
+        self._check("click_mouse", [])
+
+    def scroll_down(self) -> None:
+        self._check("scroll_down", [])
+
+    def type_text(self, text: str) -> None:
+        self._check("type_text", [text])
+
+    def send_key_events(self, events: List[KeyEvent]) -> None:
+        pass
+
+class ReplayClient:
+    def __init__(self, archive: SessionArchive) -> None:
+        self.requests = archive.of_type("request")
+        self.responses = archive.of_type("response")
+        self.pos = 0
+        self.mismatches: List[int] = []
+        self.last_timing: Dict[str, Any] = {}
+        self.totals: Dict[str, float] = {"total_s": 0.0, "bytes_sent": 0, "bytes_recv": 0}
+
+    def _next(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        t0 = time.perf_counter()
+        digest, size = request_digest(payload)
+        i = self.pos
+        self.pos += 1
+        if i >= len(self.responses):
+            self.mismatches.append(i)
+            resp = {"choices": [{"index": 0, "message": {"role": "assistant", "content": "Replay archive exhausted."}, "finish_reason": "stop"}]}
+        else:
+            if self.requests[i]["digest"] != digest:
+                self.mismatches.append(i)
+            resp = copy.deepcopy(self.responses[i]["body"])
+        self.last_timing = {"bytes_sent": size, "bytes_recv": 0, "total_s": time.perf_counter() - t0}
+        for k in self.totals:
+            self.totals[k] += self.last_timing[k]
+        return resp
+
+    def post(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        return self._next(payload)
+
+    def post_stream(self, payload: Dict[str, Any], on_tool_call: Optional[Callable[[Dict[str, Any]], Any]] = None, stop_after_tool: bool = False) -> Dict[str, Any]:
+        resp = self._next(payload)
+        calls = resp["choices"][0]["message"].get("tool_calls") or []
+        if on_tool_call is not None:
+            for tc in calls[:1] if stop_after_tool else calls:
+                on_tool_call(tc)
+        return resp
+
+    def stats(self) -> Dict[str, Any]:
+        return {"requests": self.pos, **self.totals}
+
+    def close(self) -> None:
+        pass
+
+class SessionReplay:
+    def __init__(self, path: str) -> None:
+        self.archive = SessionArchive(path)
+        self.capture = ReplayCapture(self.archive)
+        self.probe = ReplayProbe(self.capture)
+        self.inputs = ReplayInputs(self.archive, self.capture)
+        self.client = ReplayClient(self.archive)
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "requests": self.client.pos,
+            "recorded_requests": len(self.client.requests),
+            "request_mismatches": self.client.mismatches,
+            "frames": self.capture.pos,
+            "recorded_frames": len(self.capture.frames),
+            "extra_grabs": self.capture.extra_grabs,
+            "actions": self.inputs.pos,
+            "recorded_actions": len(self.inputs.expected),
+            "action_mismatches": self.inputs.mismatches,
+            "identical": not self.client.mismatches and not self.inputs.mismatches and self.client.pos == len(self.client.requests),
+        }
+
+    def close(self) -> None:
+        self.archive.close()
+
+def replay_session(path: str, overrides: Dict[str, Any]) -> Dict[str, Any]:
+    from agent import run_agent
+    archive = SessionArchive(path)
+    meta = archive.meta
+    archive.close()
+    cfg = dict(meta.get("cfg") or {})
+    cfg.update({"dump_screenshots": False, "step_delay": 0.0, "action_delay": 0.0, "trace_path": None, "record_path": None})
+    cfg.update(overrides)
+    cfg["response_cache"] = None
+    cfg["replay_path"] = path
+    t0 = time.perf_counter()
+    result = run_agent(meta["system_prompt"], meta["task_prompt"], meta["tools_schema"], cfg)
+    result["wall_s"] = time.perf_counter() - t0
+    return result
+
+def main() -> None:
+    if len(sys.argv) < 3 or sys.argv[1] not in ("info", "replay"):
+        sys.exit("Usage: python session.py <info|replay> <archive.zip> [key=value ...]")
+    path = sys.argv[2]
+    if sys.argv[1] == "info":
+        archive = SessionArchive(path)
+        counts: Dict[str, int] = {}
+        for e in archive.events:
+            counts[e["type"]] = counts.get(e["type"], 0) + 1
+        print_table([{"task": archive.meta.get("task_prompt", "")[:48], **counts, "unique_frames": archive.meta.get("unique_frames", 0), "frame_mb": archive.meta.get("frame_bytes", 0) / 1e6}])
+        archive.close()
+        return
+    result = replay_session(path, parse_overrides(sys.argv[3:]))
+    report = result["replay"]
+    print_table([{
+        "steps": result["steps"],
+        "wall_s": result["wall_s"],
+        "requests": f"{report['requests']}/{report['recorded_requests']}",
+        "req_mismatch": len(report["request_mismatches"]),
+        "frames": f"{report['frames']}/{report['recorded_frames']}",
+        "actions": f"{report['actions']}/{report['recorded_actions']}",
+        "act_mismatch": len(report["action_mismatches"]),
+        "bytes_sent": result["llm"].get("bytes_sent", 0),
+        "identical": report["identical"],
+    }])
+    if not report["identical"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
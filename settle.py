@@ -0,0 +1,74 @@
+# settle.py
+from __future__ import annotations
+import time
+import zlib
+from typing import Any, Callable, Dict, Optional
+
+from capture import CaptureBackend
+
+SETTLE_POLICIES: Dict[str, Dict[str, float]] = {
+    "move_mouse": {"interval": 0.01, "stable": 2, "change_wait": 0.02, "timeout": 0.25},
+    "click_mouse": {"interval": 0.03, "stable": 5, "change_wait": 0.25, "timeout": 3.0},
+    "type_text": {"interval": 0.02, "stable": 3, "change_wait": 0.1, "timeout": 1.0},
+    "scroll_down": {"interval": 0.02, "stable": 3, "change_wait": 0.1, "timeout": 1.0},
+    "default": {"interval": 0.03, "stable": 3, "change_wait": 0.1, "timeout": 1.0},
+}
+
+def merge_policies(overrides: Optional[Dict[str, Dict[str, float]]]) -> Dict[str, Dict[str, float]]:
+    policies = {k: dict(v) for k, v in SETTLE_POLICIES.items()}
+    for action, policy in (overrides or {}).items():
+        policies.setdefault(action, dict(policies["default"])).update(policy)
+    return policies
+
+class SettleDetector:
+    def __init__(self, capture: CaptureBackend, probe_w: int = 64, probe_h: int = 36, policies: Optional[Dict[str, Dict[str, float]]] = None, clock: Callable[[], float] = time.perf_counter, sleep: Callable[[float], None] = time.sleep) -> None:
+        self.capture = capture
+        self.probe_w = probe_w
+        self.probe_h = probe_h
+        self.policies = merge_policies(policies)
+        self.clock = clock
+        self.sleep = sleep
+        self.last_s = 0.0
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    def probe(self) -> int:
+        view = self.capture.grab(self.probe_w, self.probe_h)[0]
+        return zlib.crc32(view)
+
+    def wait(self, action: str) -> float:
+        policy = self.policies.get(action) or self.policies["default"]
+        t0 = self.clock()
+        prev = self.probe()
+        samples = 1
+        stable = 0
+        changed = False
+        timed_out = False
+        while True:
+            elapsed = self.clock() - t0
+            if elapsed >= policy["timeout"]:
+                timed_out = True
+                break
+            self.sleep(policy["interval"])
+            cur = self.probe()
+            samples += 1
+            if cur != prev:
+                changed = True
+                stable = 0
+            else:
+                stable += 1
+            prev = cur
+            if stable >= policy["stable"] and (changed or self.clock() - t0 >= policy["change_wait"]):
+                break
+        took = self.clock() - t0
+        st = self._stats.setdefault(action, {"count": 0, "total_s": 0.0, "max_s": 0.0, "samples": 0, "changed": 0, "timeouts": 0})
+        st["count"] += 1
+        st["total_s"] += took
+        st["max_s"] = max(st["max_s"], took)
+        st["samples"] += samples
+        st["changed"] += changed
+        st["timeouts"] += timed_out
+        self.last_s = took
+        return took
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {action: dict(st, mean_s=st["total_s"] / st["count"]) for action, st in self._stats.items()}
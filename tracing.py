@@ -0,0 +1,146 @@
+# Run with: python tracing.py <trace.jsonl> [more.jsonl ...]
+# Example: python tracing.py traces/run1.jsonl traces/run2.jsonl
+
+# tracing.py
+from __future__ import annotations
+import os
+import sys
+import json
+import math
+import itertools
+import time
+import threading
+from typing import Any, Dict, List, Optional
+
+from agent_utils import print_table
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        pass
+
+NULL_SPAN = _NullSpan()
+
+class NullTracer:
+    enabled = False
+    step = 0
+
+    def span(self, name: str, **attrs: Any) -> Any:
+        return NULL_SPAN
+
+    def record(self, name: str, dur_s: float, **attrs: Any) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+NULL_TRACER = NullTracer()
+_run_seq = itertools.count(1)
+
+class Span:
+    __slots__ = ("tracer", "name", "attrs", "t0")
+
+    def __init__(self, tracer: "Tracer", name: str, attrs: Dict[str, Any]) -> None:
+        self.tracer = tracer
+        self.name = name
+        self.attrs = attrs
+        self.t0 = 0.0
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, *exc: Any) -> None:
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        self.tracer.emit(self.name, self.t0, time.perf_counter() - self.t0, self.attrs)
+
+class Tracer(NullTracer):
+    enabled = True
+
+    def __init__(self, path: str, run_id: Optional[str] = None, **meta: Any) -> None:
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.run_id = run_id or f"{os.getpid()}-{int(time.time() * 1000)}-{next(_run_seq)}"
+        self.step = 0
+        self._t_start = time.perf_counter()
+        self._lock = threading.Lock()
+        self._f = open(path, "a", encoding="utf-8", buffering=1)
+        self._f.write(json.dumps({"run": self.run_id, "name": "run", "t": 0.0, "dur": 0.0, "wall": time.time(), **meta}) + "\n")
+
+    def span(self, name: str, **attrs: Any) -> Span:
+        return Span(self, name, attrs)
+
+    def record(self, name: str, dur_s: float, **attrs: Any) -> None:
+        self.emit(name, time.perf_counter() - dur_s, dur_s, attrs)
+
+    def emit(self, name: str, t0: float, dur_s: float, attrs: Dict[str, Any]) -> None:
+        line = json.dumps({"run": self.run_id, "step": self.step, "name": name, "t": t0 - self._t_start, "dur": dur_s, **attrs})
+        with self._lock:
+            self._f.write(line + "\n")
+
+    def close(self) -> None:
+        with self._lock:
+            self._f.close()
+
+def load_spans(paths: List[str]) -> List[Dict[str, Any]]:
+    spans = []
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    rec = json.loads(line)
+                    if rec.get("name") != "run":
+                        spans.append(rec)
+    return spans
+
+def percentile(sorted_vals: List[float], q: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    idx = min(len(sorted_vals) - 1, max(0, math.ceil(q / 100.0 * len(sorted_vals)) - 1))
+    return sorted_vals[idx]
+
+def self_s(rec: Dict[str, Any]) -> float:
+    return rec["dur"] - rec.get("child_s", 0.0)
+
+def summarize(spans: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for rec in spans:
+        groups.setdefault(rec["name"], []).append(rec)
+    rows = []
+    for name, recs in sorted(groups.items(), key=lambda kv: -sum(self_s(r) for r in kv[1])):
+        durs = sorted(self_s(r) * 1000.0 for r in recs)
+        rows.append({
+            "phase": name,
+            "count": len(recs),
+            "runs": len({r["run"] for r in recs}),
+            "total_ms": sum(durs),
+            "p50_ms": percentile(durs, 50),
+            "p90_ms": percentile(durs, 90),
+            "p99_ms": percentile(durs, 99),
+            "max_ms": durs[-1],
+            "bytes": sum(r.get("bytes", 0) for r in recs),
+            "tokens": sum(r.get("prompt_tokens", 0) + r.get("completion_tokens", 0) for r in recs),
+        })
+    return rows
+
+def main() -> None:
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python tracing.py <trace.jsonl> [more.jsonl ...]")
+    print_table(summarize(load_spans(sys.argv[1:])))
+
+if __name__ == "__main__":
+    main()
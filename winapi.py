@@ -1,12 +1,13 @@
 # winapi.py
 from __future__ import annotations
 import os
-import time
 import ctypes
 from ctypes import wintypes
-import struct
-import zlib
-from typing import Tuple
+from typing import Any, Callable, List, Tuple
+
+from imaging import bgra_to_rgb, encode_rgb_to_png, encode_bgra_to_png
+from capture import CaptureBackend
+from inputs import INPUT, MOUSEINPUT, INPUT_MOUSE, MOUSEEVENTF_LEFTDOWN, MOUSEEVENTF_LEFTUP, MOUSEEVENTF_WHEEL, InputBackend, KeyEvent, build_input_array, norm_to_screen_px
 
 if os.name != "nt":
     raise OSError("Windows required")
@@ -21,11 +22,6 @@ if not hasattr(wintypes, "HBITMAP"):
 if not hasattr(wintypes, "HICON"):
     wintypes.HICON = wintypes.HANDLE
 
-try:
-    ULONG_PTR = wintypes.ULONG_PTR
-except AttributeError:
-    ULONG_PTR = ctypes.c_ulonglong if ctypes.sizeof(ctypes.c_void_p) == 8 else ctypes.c_ulong
-
 DPI_AWARENESS_CONTEXT_PER_MONITOR_AWARE_V2 = ctypes.c_void_p(-4)
 SM_CXSCREEN = 0
 SM_CYSCREEN = 1
@@ -33,13 +29,6 @@ CURSOR_SHOWING = 0x00000001
 DI_NORMAL = 0x0003
 BI_RGB = 0
 DIB_RGB_COLORS = 0
-INPUT_MOUSE = 0
-INPUT_KEYBOARD = 1
-KEYEVENTF_KEYUP = 0x0002
-KEYEVENTF_UNICODE = 0x0004
-MOUSEEVENTF_LEFTDOWN = 0x0002
-MOUSEEVENTF_LEFTUP = 0x0004
-MOUSEEVENTF_WHEEL = 0x0800
 HALFTONE = 4
 SRCCOPY = 0x00CC0020
 
@@ -58,21 +47,6 @@ class BITMAPINFOHEADER(ctypes.Structure):
 class BITMAPINFO(ctypes.Structure):
     _fields_ = [("bmiHeader", BITMAPINFOHEADER), ("bmiColors", wintypes.DWORD * 3)]
 
-class MOUSEINPUT(ctypes.Structure):
-    _fields_ = [("dx", wintypes.LONG), ("dy", wintypes.LONG), ("mouseData", wintypes.DWORD), ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
-
-class KEYBDINPUT(ctypes.Structure):
-    _fields_ = [("wVk", wintypes.WORD), ("wScan", wintypes.WORD), ("dwFlags", wintypes.DWORD), ("time", wintypes.DWORD), ("dwExtraInfo", ULONG_PTR)]
-
-class HARDWAREINPUT(ctypes.Structure):
-    _fields_ = [("uMsg", wintypes.DWORD), ("wParamL", wintypes.WORD), ("wParamH", wintypes.WORD)]
-
-class INPUT_I(ctypes.Union):
-    _fields_ = [("mi", MOUSEINPUT), ("ki", KEYBDINPUT), ("hi", HARDWAREINPUT)]
-
-class INPUT(ctypes.Structure):
-    _fields_ = [("type", wintypes.DWORD), ("ii", INPUT_I)]
-
 _user32_sigs = [
     ("GetSystemMetrics", [wintypes.INT], wintypes.INT),
     ("GetDC", [wintypes.HWND], wintypes.HDC),
@@ -141,20 +115,7 @@ def cursor_pos_normalized(screen_w: int, screen_h: int) -> Tuple[int, int, int,
         yn = 1000
     return cx, cy, xn, yn
 
-def norm_to_screen_px(xn: float, yn: float, screen_w: int, screen_h: int) -> Tuple[int, int]:
-    if xn < 0.0:
-        xn = 0.0
-    elif xn > 1000.0:
-        xn = 1000.0
-    if yn < 0.0:
-        yn = 0.0
-    elif yn > 1000.0:
-        yn = 1000.0
-    x = int(round((xn / 1000.0) * (screen_w - 1)))
-    y = int(round((yn / 1000.0) * (screen_h - 1)))
-    return x, y
-
-def draw_cursor_on_dc(hdc_mem: int, screen_w: int, screen_h: int, dst_w: int, dst_h: int) -> bool:
+def draw_cursor_on_dc(hdc_mem: int, screen_w: int, screen_h: int, dst_w: int, dst_h: int, src_x: int = 0, src_y: int = 0) -> bool:
     ci = CURSORINFO()
     ci.cbSize = ctypes.sizeof(CURSORINFO)
     if not user32.GetCursorInfo(ctypes.byref(ci)):
@@ -165,8 +126,8 @@ def draw_cursor_on_dc(hdc_mem: int, screen_w: int, screen_h: int, dst_w: int, ds
     if not user32.GetIconInfo(ci.hCursor, ctypes.byref(ii)):
         return False
     try:
-        cur_x = int(ci.ptScreenPos.x) - int(ii.xHotspot)
-        cur_y = int(ci.ptScreenPos.y) - int(ii.yHotspot)
+        cur_x = int(ci.ptScreenPos.x) - int(ii.xHotspot) - src_x
+        cur_y = int(ci.ptScreenPos.y) - int(ii.yHotspot) - src_y
         dx = int(round(cur_x * (dst_w / float(screen_w))))
         dy = int(round(cur_y * (dst_h / float(screen_h))))
         return bool(user32.DrawIconEx(hdc_mem, dx, dy, ci.hCursor, 0, 0, 0, None, DI_NORMAL))
@@ -176,33 +137,7 @@ def draw_cursor_on_dc(hdc_mem: int, screen_w: int, screen_h: int, dst_w: int, ds
         if ii.hbmColor:
             gdi32.DeleteObject(ii.hbmColor)
 
-def encode_rgb_to_png(rgb: bytes, w: int, h: int) -> bytes:
-    sig = b"\x89PNG\r\n\x1a\n"
-    ihdr = struct.pack(">IIBBBBB", w, h, 8, 2, 0, 0, 0)
-    def chunk(t: bytes, d: bytes) -> bytes:
-        return struct.pack(">I", len(d)) + t + d + struct.pack(">I", zlib.crc32(t + d) & 0xFFFFFFFF)
-    row = w * 3
-    stride = row + 1
-    raw = bytearray(stride * h)
-    for y in range(h):
-        base = y * stride
-        raw[base] = 0
-        off = y * row
-        raw[base + 1:base + 1 + row] = rgb[off:off + row]
-    comp = zlib.compress(bytes(raw), 6)
-    return sig + chunk(b"IHDR", ihdr) + chunk(b"IDAT", comp) + chunk(b"IEND", b"")
-
-def bgra_to_rgb(bgra: bytes, w: int, h: int) -> bytes:
-    rgb = bytearray(w * h * 3)
-    j = 0
-    for i in range(0, len(bgra), 4):
-        rgb[j] = bgra[i + 2]
-        rgb[j + 1] = bgra[i + 1]
-        rgb[j + 2] = bgra[i]
-        j += 3
-    return bytes(rgb)
-
-def capture_screenshot_png(target_w: int, target_h: int) -> Tuple[bytes, int, int]:
+def _capture_with(target_w: int, target_h: int, consume: Callable[[Any], Any]) -> Tuple[Any, int, int]:
     screen_w, screen_h = get_screen_size()
     hdc_screen = user32.GetDC(None)
     if not hdc_screen:
@@ -237,9 +172,8 @@ def capture_screenshot_png(target_w: int, target_h: int) -> Tuple[bytes, int, in
             raise RuntimeError("StretchBlt failed")
         draw_cursor_on_dc(hdc_mem, screen_w, screen_h, target_w, target_h)
         size = target_w * target_h * 4
-        bgra = ctypes.string_at(bits, size)
-        rgb = bgra_to_rgb(bgra, target_w, target_h)
-        return encode_rgb_to_png(rgb, target_w, target_h), screen_w, screen_h
+        bgra = (ctypes.c_ubyte * size).from_address(bits.value)
+        return consume(bgra), screen_w, screen_h
     finally:
         if hdc_mem and old:
             try:
@@ -261,6 +195,109 @@ def capture_screenshot_png(target_w: int, target_h: int) -> Tuple[bytes, int, in
         except:
             pass
 
+def capture_screenshot_png(target_w: int, target_h: int, png_preset: Any = "default", image_mode: str = "rgb", quantizer: str = "median_cut") -> Tuple[bytes, int, int]:
+    return _capture_with(target_w, target_h, lambda bgra: encode_bgra_to_png(bgra, target_w, target_h, png_preset, image_mode, quantizer))
+
+class CaptureSession(CaptureBackend):
+    def __init__(self) -> None:
+        self.screen_w = 0
+        self.screen_h = 0
+        self.target_w = 0
+        self.target_h = 0
+        self.hdc_screen = None
+        self.hdc_mem = None
+        self.hbmp = None
+        self.old = None
+        self.bits = ctypes.c_void_p()
+        self.view = None
+        self.rebuilds = 0
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return get_screen_size()
+
+    def _release(self) -> None:
+        if self.hdc_mem and self.old:
+            try:
+                gdi32.SelectObject(self.hdc_mem, self.old)
+            except:
+                pass
+        if self.hbmp:
+            try:
+                gdi32.DeleteObject(self.hbmp)
+            except:
+                pass
+        if self.hdc_mem:
+            try:
+                gdi32.DeleteDC(self.hdc_mem)
+            except:
+                pass
+        if self.hdc_screen:
+            try:
+                user32.ReleaseDC(None, self.hdc_screen)
+            except:
+                pass
+        self.hdc_screen = self.hdc_mem = self.hbmp = self.old = self.view = None
+        self.bits = ctypes.c_void_p()
+        self.screen_w = self.screen_h = self.target_w = self.target_h = 0
+
+    def _build(self, screen_w: int, screen_h: int, target_w: int, target_h: int) -> None:
+        self._release()
+        self.hdc_screen = user32.GetDC(None)
+        if not self.hdc_screen:
+            raise RuntimeError("GetDC failed")
+        try:
+            self.hdc_mem = gdi32.CreateCompatibleDC(self.hdc_screen)
+            if not self.hdc_mem:
+                raise RuntimeError("CreateCompatibleDC failed")
+            bmi = BITMAPINFO()
+            ctypes.memset(ctypes.byref(bmi), 0, ctypes.sizeof(bmi))
+            bmi.bmiHeader.biSize = ctypes.sizeof(BITMAPINFOHEADER)
+            bmi.bmiHeader.biWidth = target_w
+            bmi.bmiHeader.biHeight = -target_h
+            bmi.bmiHeader.biPlanes = 1
+            bmi.bmiHeader.biBitCount = 32
+            bmi.bmiHeader.biCompression = BI_RGB
+            self.hbmp = gdi32.CreateDIBSection(self.hdc_mem, ctypes.byref(bmi), DIB_RGB_COLORS, ctypes.byref(self.bits), 0, 0)
+            if not self.hbmp or not self.bits.value:
+                raise RuntimeError("CreateDIBSection failed")
+            self.old = gdi32.SelectObject(self.hdc_mem, self.hbmp)
+            if not self.old:
+                raise RuntimeError("SelectObject failed")
+            gdi32.SetStretchBltMode(self.hdc_mem, HALFTONE)
+            if hasattr(gdi32, "SetBrushOrgEx"):
+                pt = POINT()
+                gdi32.SetBrushOrgEx(self.hdc_mem, 0, 0, ctypes.byref(pt))
+        except:
+            self._release()
+            raise
+        self.screen_w, self.screen_h = screen_w, screen_h
+        self.target_w, self.target_h = target_w, target_h
+        self.view = memoryview((ctypes.c_ubyte * (target_w * target_h * 4)).from_address(self.bits.value)).cast("B")
+        self.rebuilds += 1
+
+    def grab(self, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        screen_w, screen_h = get_screen_size()
+        if (screen_w, screen_h, target_w, target_h) != (self.screen_w, self.screen_h, self.target_w, self.target_h):
+            self._build(screen_w, screen_h, target_w, target_h)
+        if not gdi32.StretchBlt(self.hdc_mem, 0, 0, target_w, target_h, self.hdc_screen, 0, 0, screen_w, screen_h, SRCCOPY):
+            raise RuntimeError("StretchBlt failed")
+        draw_cursor_on_dc(self.hdc_mem, screen_w, screen_h, target_w, target_h)
+        return self.view, screen_w, screen_h
+
+    def grab_region(self, x0: int, y0: int, x1: int, y1: int, target_w: int, target_h: int) -> Tuple[memoryview, int, int]:
+        screen_w, screen_h = get_screen_size()
+        if (screen_w, screen_h, target_w, target_h) != (self.screen_w, self.screen_h, self.target_w, self.target_h):
+            self._build(screen_w, screen_h, target_w, target_h)
+        x0, y0 = min(x0, screen_w - 1), min(y0, screen_h - 1)
+        x1, y1 = max(x0 + 1, min(x1, screen_w)), max(y0 + 1, min(y1, screen_h))
+        if not gdi32.StretchBlt(self.hdc_mem, 0, 0, target_w, target_h, self.hdc_screen, x0, y0, x1 - x0, y1 - y0, SRCCOPY):
+            raise RuntimeError("StretchBlt failed")
+        draw_cursor_on_dc(self.hdc_mem, x1 - x0, y1 - y0, target_w, target_h, x0, y0)
+        return self.view, screen_w, screen_h
+
+    def close(self) -> None:
+        self._release()
+
 def _send_inputs(*inps: INPUT) -> None:
     n = len(inps)
     if n <= 0:
@@ -274,12 +311,6 @@ def _mi(flags: int, data: int = 0, dx: int = 0, dy: int = 0) -> INPUT:
     i.ii.mi = MOUSEINPUT(dx, dy, data, flags, 0, 0)
     return i
 
-def _ki(scan: int, flags: int) -> INPUT:
-    i = INPUT()
-    i.type = INPUT_KEYBOARD
-    i.ii.ki = KEYBDINPUT(0, scan, flags, 0, 0)
-    return i
-
 def move_mouse_norm(xn: float, yn: float) -> Tuple[int, int]:
     screen_w, screen_h = get_screen_size()
     x, y = norm_to_screen_px(xn, yn, screen_w, screen_h)
@@ -292,8 +323,33 @@ def click_mouse() -> None:
 def scroll_down() -> None:
     _send_inputs(_mi(MOUSEEVENTF_WHEEL, (-120) & 0xFFFFFFFF))
 
+class SendInputBackend(InputBackend):
+    def __init__(self, max_batch_events: int = 64, chunk_pacing: float = 0.01) -> None:
+        self.max_batch_events = max_batch_events
+        self.chunk_pacing = chunk_pacing
+
+    def get_screen_size(self) -> Tuple[int, int]:
+        return get_screen_size()
+
+    def move_mouse_norm(self, xn: float, yn: float) -> Tuple[int, int]:
+        return move_mouse_norm(xn, yn)
+
+    def click_mouse(self) -> None:
+        click_mouse()
+
+    def scroll_down(self) -> None:
+        scroll_down()
+
+    def send_key_events(self, events: List[KeyEvent]) -> None:
+        n = len(events)
+        if n <= 0:
+            return
+        arr = build_input_array(events)
+        sent = user32.SendInput(n, arr, ctypes.sizeof(INPUT))
+        if sent != n:
+            raise ctypes.WinError(ctypes.get_last_error())
+
+_input_backend = SendInputBackend()
+
 def type_text(text: str) -> None:
-    for ch in text:
-        code = ord(ch)
-        _send_inputs(_ki(code, KEYEVENTF_UNICODE), _ki(code, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP))
-        time.sleep(0.005)
+    _input_backend.type_text(text)